@@ -5,14 +5,17 @@ import sys
 from agentscope.agent import ReActAgent
 from agentscope.formatter import DashScopeChatFormatter
 from agentscope.message import Msg, TextBlock
-from agentscope.model import DashScopeChatModel
 from agentscope.tool import Toolkit, ToolResponse, execute_shell_command
 from tools.exec_wrapper import execute_python_code_local
 from tools.audio_wrapper import dashscope_text_to_audio_local
+from tools.render_chart import render_chart
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 from config import Config
 from prompt import PROMPT
+from tools.tracing import traced_tool
+from tools.model_client import get_chat_model
+from tools.request_scope import ScopedMemory
 
 
 # 模块级单例：避免每次调用都创建 Toolkit / ReActAgent
@@ -24,25 +27,27 @@ def _get_output_agent():
     if _output_agent is None:
         _output_toolkit = Toolkit()
 
+        # 常用图表直接由声明式工具在进程内渲染
+        _output_toolkit.register_tool_function(
+            traced_tool(render_chart), preset_kwargs={'output_dir': Config['OUTPUT_DIR']}
+        )
         # 注册项目内的 execute_python_code_local，并传入 output_dir
         _output_toolkit.register_tool_function(
-            execute_python_code_local, preset_kwargs={'output_dir': Config['OUTPUT_DIR']}
+            traced_tool(execute_python_code_local), preset_kwargs={'output_dir': Config['OUTPUT_DIR']}
         )
-        _output_toolkit.register_tool_function(execute_shell_command)
+        _output_toolkit.register_tool_function(traced_tool(execute_shell_command))
         # 注册时使用预置参数
         _output_toolkit.register_tool_function(
-            dashscope_text_to_audio_local, preset_kwargs={'api_key': Config['API_KEY'], 'output_dir': Config['OUTPUT_DIR']}
+            traced_tool(dashscope_text_to_audio_local), preset_kwargs={'api_key': Config['API_KEY'], 'output_dir': Config['OUTPUT_DIR']}
         )
 
         _output_agent = ReActAgent(
             name="Watson",
             sys_prompt=PROMPT['agentic_output_sys_prompt'],
-            model=DashScopeChatModel(
-                api_key=Config['API_KEY'],
-                model_name=Config['MODEL'],
-            ),
+            model=get_chat_model('output'),
             formatter=DashScopeChatFormatter(),
             toolkit=_output_toolkit,
+            memory=ScopedMemory(),
         )
     return _output_agent
 
@@ -6,14 +6,17 @@ import json
 from agentscope.agent import ReActAgent
 from agentscope.formatter import DashScopeChatFormatter
 from agentscope.message import Msg
-from agentscope.model import DashScopeChatModel
 from agentscope.tool import Toolkit, ToolResponse
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 from config import Config
 from prompt import PROMPT
+from tools.tracing import traced_tool
+from tools.model_client import get_chat_model
+from tools.request_scope import ScopedMemory
 from tools.parse_sleep_db import read_sleep_db
 from tools.parse_heart_rate_db import read_heart_rate_db
+from tools.sql_query import sql_query
 
 
 # 模块级单例：避免每次调用都创建 Toolkit / ReActAgent
@@ -24,18 +27,17 @@ def _get_query_agent():
     global _query_toolkit, _query_agent
     if _query_agent is None:
         _query_toolkit = Toolkit()
-        _query_toolkit.register_tool_function(read_sleep_db)
-        _query_toolkit.register_tool_function(read_heart_rate_db)
+        _query_toolkit.register_tool_function(traced_tool(read_sleep_db))
+        _query_toolkit.register_tool_function(traced_tool(read_heart_rate_db))
+        _query_toolkit.register_tool_function(traced_tool(sql_query))
 
         _query_agent = ReActAgent(
             name="Tom",
             sys_prompt=PROMPT['agentic_query_sys_prompt'],
-            model=DashScopeChatModel(
-                api_key=Config['API_KEY'],
-                model_name=Config['MODEL'],
-            ),
+            model=get_chat_model('query'),
             formatter=DashScopeChatFormatter(),
             toolkit=_query_toolkit,
+            memory=ScopedMemory(),
         )
     return _query_agent
 
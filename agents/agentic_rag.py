@@ -6,12 +6,14 @@ import sys
 from agentscope.agent import ReActAgent
 from agentscope.formatter import DashScopeChatFormatter
 from agentscope.message import Msg
-from agentscope.model import DashScopeChatModel
 from agentscope.tool import Toolkit, ToolResponse
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 from config import Config
 from prompt import PROMPT
+from tools.tracing import traced_tool
+from tools.model_client import get_chat_model
+from tools.request_scope import ScopedMemory
 from tools.build_sleep_vdbs import get_sleep_knowledge
 from tools.build_heart_rate_vdbs import get_heart_rate_knowledge
 
@@ -24,18 +26,16 @@ def _get_rag_agent():
     global _rag_toolkit, _rag_agent
     if _rag_agent is None:
         _rag_toolkit = Toolkit()
-        _rag_toolkit.register_tool_function(get_sleep_knowledge)
-        _rag_toolkit.register_tool_function(get_heart_rate_knowledge)
+        _rag_toolkit.register_tool_function(traced_tool(get_sleep_knowledge))
+        _rag_toolkit.register_tool_function(traced_tool(get_heart_rate_knowledge))
 
         _rag_agent = ReActAgent(
             name="Jerry",
             sys_prompt=PROMPT['agentic_rag_sys_prompt'],
-            model=DashScopeChatModel(
-                api_key=Config['API_KEY'],
-                model_name=Config['MODEL'],
-            ),
+            model=get_chat_model('rag'),
             formatter=DashScopeChatFormatter(),
             toolkit=_rag_toolkit,
+            memory=ScopedMemory(),
         )
     return _rag_agent
 
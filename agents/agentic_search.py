@@ -6,12 +6,14 @@ import json
 from agentscope.agent import ReActAgent
 from agentscope.formatter import DashScopeChatFormatter
 from agentscope.message import Msg
-from agentscope.model import DashScopeChatModel
 from agentscope.tool import Toolkit, ToolResponse
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 from config import Config
 from prompt import PROMPT
+from tools.tracing import traced_tool
+from tools.model_client import get_chat_model
+from tools.request_scope import ScopedMemory
 from tools.web_search import web_search
 from tools.pubmed_search import pubmed_search
 
@@ -26,19 +28,17 @@ def _get_search_agent():
     if _search_agent is None:
         _search_toolkit = Toolkit()
         # 注册工具
-        _search_toolkit.register_tool_function(web_search)
-        _search_toolkit.register_tool_function(pubmed_search)
+        _search_toolkit.register_tool_function(traced_tool(web_search))
+        _search_toolkit.register_tool_function(traced_tool(pubmed_search))
 
         # 使用 DashScope 作为模型创建 ReAct 智能体（只创建一次）
         _search_agent = ReActAgent(
             name="Sherlock",
             sys_prompt=PROMPT['agentic_search_sys_prompt'],
-            model=DashScopeChatModel(
-                api_key=Config['API_KEY'],
-                model_name=Config['MODEL'],
-            ),
+            model=get_chat_model('search'),
             formatter=DashScopeChatFormatter(),
             toolkit=_search_toolkit,
+            memory=ScopedMemory(),
         )
     return _search_agent
 
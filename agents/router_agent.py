@@ -2,24 +2,31 @@ import asyncio
 import os
 import sys
 import json
+import time
 from typing import AsyncGenerator
 
 from agentscope.agent import ReActAgent
 from agentscope.formatter import DashScopeChatFormatter
-from agentscope.memory import InMemoryMemory
 from agentscope.message import Msg
-from agentscope.model import DashScopeChatModel
 from agentscope.tool import Toolkit, execute_python_code, execute_shell_command, dashscope_text_to_audio
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 from config import Config
 from prompt import PROMPT
+from tools.tracing import traced_tool
+from tools.model_client import get_chat_model
+from tools.output_store import link_artifacts
+from tools.request_scope import ScopedMemory, run_cancellable
 from .agentic_rag import agentic_rag
 from .agentic_query import agentic_query
 from .agentic_search import agentic_search
 from .agentic_output import agentic_output
 
 
+TYPING_INTERVAL = Config.get('TYPING_INTERVAL', 0.1)     # 逐段输出的打字间隔（秒），基准测试中设为 0
+STREAM_COALESCE_INTERVAL = Config.get('STREAM_COALESCE_INTERVAL', 0.05)  # 结构化事件的合并窗口（秒）
+
+
 # 模块级单例：避免每次请求都新建 Router Agent
 _router_toolkit = None
 _router_agent = None
@@ -28,20 +35,18 @@ def _get_router_agent():
     global _router_toolkit, _router_agent
     if _router_agent is None:
         _router_toolkit = Toolkit()
-        _router_toolkit.register_tool_function(agentic_rag)
-        _router_toolkit.register_tool_function(agentic_query)
-        _router_toolkit.register_tool_function(agentic_search)
-        _router_toolkit.register_tool_function(agentic_output)
+        _router_toolkit.register_tool_function(traced_tool(agentic_rag, kind='agent'))
+        _router_toolkit.register_tool_function(traced_tool(agentic_query, kind='agent'))
+        _router_toolkit.register_tool_function(traced_tool(agentic_search, kind='agent'))
+        _router_toolkit.register_tool_function(traced_tool(agentic_output, kind='agent'))
 
         _router_agent = ReActAgent(
             name="Alice",
             sys_prompt=PROMPT['router_sys_prompt'],
-            model=DashScopeChatModel(
-                model_name=Config['MODEL'],
-                api_key=Config['API_KEY'],
-            ),
+            model=get_chat_model('router', emit_deltas=True),
             formatter=DashScopeChatFormatter(),
             toolkit=_router_toolkit,
+            memory=ScopedMemory(),
         )
     return _router_agent
 
@@ -51,15 +56,74 @@ async def router_agent(user_input: str) -> AsyncGenerator[bytes, None]:
     router = _get_router_agent()
     msg_user = Msg("user", user_input, "user")
 
-    # 路由查询
-    msg_res = await router(msg_user)
+    # 路由查询；客户端断开时取消会传递到子智能体与工具
+    msg_res = await run_cancellable(router(msg_user))
 
     results: str = msg_res.get_content_blocks("text")[0]['text']
+    # 输出目录中的文件路径替换为浏览器可访问的地址
+    results = link_artifacts(results)
 
     chunk_size = 3
     for i in range(0, len(results), chunk_size):
         yield results[i:i+chunk_size].encode('utf-8')
         await asyncio.sleep(0)      # 让出控制权，防止阻塞事件循环
-        await asyncio.sleep(0.1)    # 可调打字间隔
+        await asyncio.sleep(TYPING_INTERVAL)    # 可调打字间隔
         
-    return
\ No newline at end of file
+    return
+
+
+def _final_text(msg_res: Msg) -> str:
+    blocks = msg_res.get_content_blocks("text")
+    return link_artifacts(blocks[0]['text']) if blocks else ''
+
+
+def _coalesce(events: list[dict], seen_artifacts: set[str]) -> list[dict]:
+    """合并相邻的 delta 事件，并去掉重复的文件地址（子智能体与其工具会报告同一个文件）。"""
+    merged = []
+    for event in events:
+        if event['type'] == 'artifact':
+            if event['url'] in seen_artifacts:
+                continue
+            seen_artifacts.add(event['url'])
+        if event['type'] == 'delta' and merged and merged[-1]['type'] == 'delta':
+            merged[-1] = {'type': 'delta', 'text': merged[-1]['text'] + event['text']}
+        else:
+            merged.append(event)
+    return merged
+
+
+async def router_events(user_input: str) -> AsyncGenerator[list[dict], None]:
+    """与 router_agent 相同的路由过程，但输出结构化事件（见 router/events.py）。
+
+    每次产出一批事件：收到第一个事件后等待 STREAM_COALESCE_INTERVAL，把窗口内的事件合并后一起返回，
+    减少分片数量。最后一批包含 final 事件。
+    """
+    router = _get_router_agent()
+    msg_user = Msg("user", user_input, "user")
+    start = time.time()
+
+    queue: asyncio.Queue[dict | None] = asyncio.Queue()
+    task = asyncio.create_task(run_cancellable(router(msg_user), sink=queue.put_nowait))
+    task.add_done_callback(lambda _: queue.put_nowait(None))   # 结束标记排在所有事件之后
+
+    seen_artifacts: set[str] = set()
+    try:
+        finished = False
+        while not finished:
+            batch = [await queue.get()]
+            if batch[0] is not None and STREAM_COALESCE_INTERVAL > 0:
+                await asyncio.sleep(STREAM_COALESCE_INTERVAL)
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+
+            finished = batch[-1] is None
+            events = _coalesce([e for e in batch if e is not None], seen_artifacts)
+            if finished:
+                text = _final_text(task.result())
+                events.append({'type': 'final', 'text': text, 'duration_ms': round((time.time() - start) * 1000, 1)})
+            if events:
+                yield events
+    finally:
+        # 生成器提前关闭（客户端断开）时取消路由任务，取消随请求作用域传递到子智能体与工具
+        if not task.done():
+            task.cancel()
@@ -7,4 +7,24 @@ app.config.from_object(Config)
 
 # 注册蓝图
 from router.chat import chat_bp
-app.register_blueprint(chat_bp, url_prefix='/')
\ No newline at end of file
+from router.health import health_bp, warm_up
+from router.report import report_bp
+from router.batch import batch_bp
+app.register_blueprint(chat_bp, url_prefix='/')
+app.register_blueprint(health_bp)
+app.register_blueprint(report_bp)
+app.register_blueprint(batch_bp)
+
+
+@app.before_serving
+async def start_warm_up():
+    # 不阻塞启动：服务开始监听后在后台预热智能体与向量库，进度见 /healthz
+    if Config.get('PREWARM', True):
+        app.add_background_task(warm_up)
+
+
+@app.after_serving
+async def close_model_client():
+    # 关闭模型调用共享的 HTTP 连接池
+    from tools.model_client import close_http_session
+    await close_http_session()
@@ -0,0 +1,115 @@
+"""组件级微基准：单独测量数据库解析、知识库检索、声明式作图与代码执行沙箱的耗时。
+
+知识库检索使用本地 Embedding 替身（可配置延迟），不消耗 API 额度。用法：
+    python benchmarks/bench_components.py --iterations 20
+    python benchmarks/bench_components.py --only exec_pool,exec_subprocess
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.mocks import MockSettings, install_mock_embeddings, setup_sandbox
+
+
+# 步数超过 1 万的次日夜间深睡时长：一条关联查询代替两张整表
+JOIN_SQL = (
+    "SELECT date(s.TIMESTAMP/1000,'unixepoch','localtime') AS night, s.DEEP_SLEEP_DURATION, d.STEPS "
+    "FROM XIAOMI_SLEEP_TIME_SAMPLE s JOIN XIAOMI_DAILY_SUMMARY_SAMPLE d "
+    "ON date(d.TIMESTAMP/1000,'unixepoch','localtime') = date(s.TIMESTAMP/1000,'unixepoch','localtime','-1 day') "
+    "WHERE d.STEPS > 10000"
+)
+
+PLOT_CODE = """
+import matplotlib.pyplot as plt
+plt.plot(range(30), [i * i for i in range(30)])
+plt.savefig('output/bench.png')
+"""
+
+
+def build_cases() -> dict:
+    """返回 {名称: 异步可调用}；导入放在这里，保证在 setup_sandbox 之后执行。"""
+    from tools.parse_sleep_db import load_sleep_df, read_sleep_db
+    from tools.parse_heart_rate_db import load_heart_rate_df, read_heart_rate_db
+    from tools.build_sleep_vdbs import get_sleep_knowledge
+    from tools.render_chart import render_chart
+    from tools.sql_query import sql_query
+    import tools.exec_wrapper as exec_wrapper
+
+    async def exec_with(pool_size: int):
+        exec_wrapper.EXEC_POOL_SIZE = pool_size
+        return await exec_wrapper.execute_python_code_local(PLOT_CODE, timeout=60)
+
+    return {
+        'load_sleep_df': lambda: asyncio.to_thread(load_sleep_df),
+        'load_heart_rate_df': lambda: asyncio.to_thread(load_heart_rate_df),
+        'read_sleep_db': read_sleep_db,
+        'read_heart_rate_db': read_heart_rate_db,
+        'sql_query': lambda: sql_query(JOIN_SQL),
+        'get_sleep_knowledge': lambda: get_sleep_knowledge('如何提高深睡比例'),
+        'render_chart': lambda: render_chart('{"chart": "sleep_stages", "last_n": 14}'),
+        'exec_pool': lambda: exec_with(2),
+        'exec_subprocess': lambda: exec_with(0),
+    }
+
+
+async def measure(fn, iterations: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        await fn()
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    ordered = sorted(durations)
+    return {
+        'n': iterations,
+        'mean_ms': round(statistics.mean(durations), 2),
+        'p50_ms': round(ordered[len(ordered) // 2], 2),
+        'p95_ms': round(ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))], 2),
+        'min_ms': round(ordered[0], 2),
+    }
+
+
+async def run(args) -> dict:
+    cases = build_cases()
+    selected = args.only.split(',') if args.only else list(cases)
+    results = {}
+    for name in selected:
+        try:
+            results[name] = await measure(cases[name], args.iterations, args.warmup)
+        except Exception as e:
+            results[name] = {'error': repr(e)}
+        print(f'{name:22s} {results[name]}')
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='组件级微基准')
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--only', help='只运行指定用例，逗号分隔')
+    parser.add_argument('--embedding-latency', type=float, default=MockSettings.embedding_latency)
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    settings = MockSettings(embedding_latency=args.embedding_latency)
+    with tempfile.TemporaryDirectory(prefix='bench_components_') as tmp:
+        setup_sandbox(tmp, settings)
+        install_mock_embeddings(settings)
+        results = asyncio.run(run(args))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""端到端基准：用本地替身代替 DashScope / 博查 / PubMed，在进程内启动 Hypercorn，
+以若干并发的模拟用户请求 `/stream`，统计延迟分位数、首字节时间（TTFB）与吞吐量。
+
+用法：
+    python benchmarks/bench_e2e.py --users 8 --requests 5
+    python benchmarks/bench_e2e.py --scenarios query,chart --llm-ttft 0.5 --json result.json
+    python benchmarks/bench_e2e.py --format sse     # 结构化事件模式
+
+依赖 httpx（仅基准测试需要）。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.mocks import SCENARIOS, MockSettings, install_mocks, setup_sandbox
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+async def one_request(client, url: str, scenario: str, session_id: str, fmt: str = 'text') -> dict:
+    message = f"{SCENARIOS[scenario]['router'][1]['demand']}"
+    start = time.perf_counter()
+    ttfb = None
+    size = 0
+    frames = 0
+    status = None
+    data = {'message': message, 'session_id': session_id}
+    if fmt != 'text':
+        data['format'] = fmt
+    try:
+        async with client.stream('POST', url, data=data) as response:
+            status = response.status_code
+            async for chunk in response.aiter_bytes():
+                if chunk and ttfb is None:
+                    ttfb = time.perf_counter() - start
+                size += len(chunk)
+                frames += 1
+    except Exception as e:
+        status = repr(e)
+    return {
+        'scenario': scenario,
+        'status': status,
+        'latency': time.perf_counter() - start,
+        'ttfb': ttfb,
+        'bytes': size,
+        'frames': frames,
+    }
+
+
+async def user(client, url: str, user_id: int, n: int, scenarios: list[str], rng: random.Random, fmt: str) -> list[dict]:
+    results = []
+    for _ in range(n):
+        results.append(await one_request(client, url, rng.choice(scenarios), f'bench{user_id}', fmt))
+    return results
+
+
+def summarize(results: list[dict], wall: float) -> dict:
+    ok = [r for r in results if r['status'] == 200]
+    summary = {
+        'requests': len(results),
+        'errors': len(results) - len(ok),
+        'wall_s': round(wall, 3),
+        'throughput_rps': round(len(ok) / wall, 3) if wall else None,
+        'frames_per_response': round(statistics.mean(r['frames'] for r in ok), 1) if ok else None,
+    }
+    for key in ('latency', 'ttfb'):
+        values = [r[key] for r in ok if r[key] is not None]
+        if values:
+            summary[key] = {
+                'p50_ms': round(percentile(values, 0.5) * 1000, 1),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 1),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+                'mean_ms': round(statistics.mean(values) * 1000, 1),
+            }
+    by_scenario = {}
+    for r in ok:
+        by_scenario.setdefault(r['scenario'], []).append(r['latency'])
+    summary['scenarios'] = {
+        name: {'count': len(v), 'p50_ms': round(percentile(v, 0.5) * 1000, 1)}
+        for name, v in sorted(by_scenario.items())
+    }
+    return summary
+
+
+async def run(args, settings: MockSettings) -> dict:
+    import httpx
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config as HypercornConfig
+
+    from app import app
+    from router.health import warm_up
+
+    # 先预热，避免把首次导入与构建智能体的耗时计入请求延迟
+    await warm_up()
+
+    config = HypercornConfig()
+    config.bind = [f'127.0.0.1:{args.port}']
+    config.accesslog = None
+    shutdown = asyncio.Event()
+    server = asyncio.create_task(serve(app, config, shutdown_trigger=shutdown.wait))
+    await asyncio.sleep(0.5)
+
+    url = f'http://127.0.0.1:{args.port}/stream'
+    scenarios = args.scenarios.split(',')
+    rng = random.Random(args.seed)
+    try:
+        async with httpx.AsyncClient(timeout=args.timeout) as client:
+            if args.warmup:
+                await asyncio.gather(*(one_request(client, url, s, f'warmup{i}', args.format) for i, s in enumerate(scenarios)))
+            start = time.perf_counter()
+            batches = await asyncio.gather(*(
+                user(client, url, i, args.requests, scenarios, random.Random(rng.random()), args.format)
+                for i in range(args.users)
+            ))
+            wall = time.perf_counter() - start
+            metrics = (await client.get(f'http://127.0.0.1:{args.port}/metrics')).json()
+    finally:
+        shutdown.set()
+        await server
+
+    results = [r for batch in batches for r in batch]
+    summary = summarize(results, wall)
+    summary['spans'] = metrics.get('spans', {})
+    return summary
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='/stream 端到端基准测试（使用本地替身）')
+    parser.add_argument('--users', type=int, default=4, help='并发用户数')
+    parser.add_argument('--requests', type=int, default=5, help='每个用户顺序发出的请求数')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='参与的场景，逗号分隔')
+    parser.add_argument('--format', choices=('text', 'sse', 'ndjson'), default='text', help='/stream 的响应格式')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-warmup', dest='warmup', action='store_false')
+    parser.add_argument('--llm-ttft', type=float, default=MockSettings.llm_ttft)
+    parser.add_argument('--llm-chunk-delay', type=float, default=MockSettings.llm_chunk_delay)
+    parser.add_argument('--embedding-latency', type=float, default=MockSettings.embedding_latency)
+    parser.add_argument('--search-latency', type=float, default=MockSettings.search_latency)
+    parser.add_argument('--pubmed-latency', type=float, default=MockSettings.pubmed_latency)
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        llm_ttft=args.llm_ttft,
+        llm_chunk_delay=args.llm_chunk_delay,
+        embedding_latency=args.embedding_latency,
+        search_latency=args.search_latency,
+        pubmed_latency=args.pubmed_latency,
+    )
+    with tempfile.TemporaryDirectory(prefix='bench_e2e_') as tmp:
+        setup_sandbox(tmp, settings)
+        search_server = install_mocks(settings)
+        try:
+            summary = asyncio.run(run(args, settings))
+        finally:
+            search_server.shutdown()
+
+    spans = summary.pop('spans')
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    print('\n各环节耗时（p50 / p95 ms）：')
+    for kind, entries in spans.items():
+        for name, s in entries.items():
+            print(f"  {kind:8s} {name:32s} n={s['count']:<5d} {s['p50_ms']} / {s['p95_ms']}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({**summary, 'spans': spans}, f, ensure_ascii=False, indent=2)
+    return 0 if summary['errors'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
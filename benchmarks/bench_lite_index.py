@@ -0,0 +1,196 @@
+"""lite 量化索引与嵌入式 Qdrant 的对比基准：召回率、检索延迟、打开耗时与常驻内存。
+
+以知识库集合中已有的向量为基础（不调用 Embedding API）：查询为随机选取的向量加高斯噪声，
+真值为 float32 精确余弦检索的 top-k。两种后端都在临时目录中由同一批点重建，不改动 data/vdbs。
+打开耗时与内存在独立子进程中测量（打开 + 首次检索），内存优先用 psutil 读取 RSS。用法：
+    python benchmarks/bench_lite_index.py
+    python benchmarks/bench_lite_index.py --synthetic 50000 --queries 100   # 追加合成点，测试 IVF
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, ROOT)
+from config import Config
+
+
+def load_points(vdbs_path: str, collection: str) -> list:
+    from tools.vector_store import EmbeddedStore
+
+    store = EmbeddedStore(os.path.abspath(vdbs_path), keep_open=0)
+    return list(store.iter_points(collection))
+
+
+def add_synthetic(points: list, n: int, seed: int = 0) -> list:
+    """在真实向量附近生成 n 个合成点（真实向量 + 噪声），payload 复用原点。"""
+    rng = np.random.default_rng(seed)
+    base = np.asarray([p.vector for p in points], dtype=np.float32)
+    picks = rng.integers(0, len(points), size=n)
+    noise = rng.normal(0, 0.03, size=(n, base.shape[1])).astype(np.float32)
+    vectors = base[picks] + noise
+    synthetic = [SimpleNamespace(id=f'synthetic-{i}', vector=vectors[i], payload=points[picks[i]].payload)
+                 for i in range(n)]
+    return points + synthetic
+
+
+def build_qdrant(points: list, path: str, collection: str) -> None:
+    import uuid
+
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import Distance, PointStruct, VectorParams
+
+    client = QdrantClient(path=path)
+    client.create_collection(collection, vectors_config=VectorParams(size=len(points[0].vector),
+                                                                      distance=Distance.COSINE))
+    batch = [PointStruct(id=uuid.uuid5(uuid.NAMESPACE_OID, str(p.id)).hex, vector=list(map(float, p.vector)),
+                         payload={**p.payload, 'bench_id': str(p.id)}) for p in points]
+    for i in range(0, len(batch), 256):
+        client.upsert(collection, points=batch[i:i + 256])
+    client.close()
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+def summarize(latencies: list[float], recalls: list[float]) -> dict:
+    return {
+        'recall': round(statistics.mean(recalls), 4),
+        'p50_ms': round(percentile(latencies, 0.5), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+    }
+
+
+def child(kind: str, path: str, collection: str, dim: int) -> None:
+    """子进程：打开后端并完成一次检索，输出耗时与内存增量。"""
+    try:
+        import psutil
+
+        def rss() -> float:
+            return psutil.Process().memory_info().rss / 2 ** 20
+    except ImportError:
+        import resource
+
+        def rss() -> float:   # 无 psutil 时退化为峰值 RSS（Linux 上单位为 KB）
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    import qdrant_client  # noqa: F401  两种后端都先导入依赖，只比较打开本身
+    from tools.lite_index import LiteIndex
+
+    query = np.random.default_rng(1).normal(size=dim).astype(np.float32)
+    before = rss()
+    start = time.perf_counter()
+    if kind == 'qdrant':
+        client = qdrant_client.QdrantClient(path=path)
+        opened = time.perf_counter()
+        client.query_points(collection, query=query.tolist(), limit=4, with_payload=True)
+    else:
+        index = LiteIndex(path)
+        opened = time.perf_counter()
+        [index.payload(row) for row, _ in index.search(query, 4)]
+    end = time.perf_counter()
+    print(json.dumps({
+        'open_ms': round((opened - start) * 1000, 2),
+        'open_and_search_ms': round((end - start) * 1000, 2),
+        'rss_mb': round(rss() - before, 1),
+    }))
+
+
+def measure_child(kind: str, path: str, collection: str, dim: int) -> dict:
+    out = subprocess.run([sys.executable, __file__, '--child', kind, '--child-path', path,
+                          '--collection', collection, '--dim', str(dim)],
+                         capture_output=True, text=True, check=True, cwd=ROOT)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='lite 量化索引基准')
+    parser.add_argument('--vdbs', default=Config['VDBS_PATH'])
+    parser.add_argument('--collection', default=Config['SLEEP_KNOWLEDGE_COLLECTION'])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=4)
+    parser.add_argument('--noise', type=float, default=0.05, help='查询向量相对噪声')
+    parser.add_argument('--synthetic', type=int, default=0, help='追加的合成点数')
+    parser.add_argument('--nlist', type=int, help='IVF 列表数（默认按点数自动决定）')
+    parser.add_argument('--nprobe', type=int, help='IVF 探查列表数（默认 LITE_IVF_NPROBE）')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--child-path', help=argparse.SUPPRESS)
+    parser.add_argument('--dim', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.child_path, args.collection, args.dim)
+        return 0
+
+    from qdrant_client import QdrantClient
+
+    from tools.lite_index import LiteIndex, build_index
+
+    points = load_points(args.vdbs, args.collection)
+    if args.synthetic:
+        points = add_synthetic(points, args.synthetic)
+    ids = [str(p.id) for p in points]
+    exact = np.asarray([p.vector for p in points], dtype=np.float32)
+    exact /= np.linalg.norm(exact, axis=1, keepdims=True)
+    dim = exact.shape[1]
+    print(f'{args.collection}: {len(points)} 个点，{dim} 维，{args.queries} 个查询，k={args.k}')
+
+    rng = np.random.default_rng(0)
+    queries = exact[rng.integers(0, len(exact), size=args.queries)]
+    queries = queries + rng.normal(0, args.noise / np.sqrt(dim), size=queries.shape).astype(np.float32)
+    truth = [set(np.argsort(-(exact @ q))[:args.k]) for q in queries]
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench_lite_') as tmp:
+        qdrant_path = os.path.join(tmp, 'qdrant')
+        build_qdrant(points, qdrant_path, args.collection)
+        row_of = {pid: i for i, pid in enumerate(ids)}      # 点 id → 真值中的行号
+
+        client = QdrantClient(path=qdrant_path)
+        latencies, recalls = [], []
+        for q, t in zip(queries, truth):
+            start = time.perf_counter()
+            hits = client.query_points(args.collection, query=q.tolist(), limit=args.k, with_payload=True).points
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len({row_of[h.payload['bench_id']] for h in hits} & t) / args.k)
+        client.close()
+        results['qdrant_embedded'] = {**summarize(latencies, recalls),
+                                      **measure_child('qdrant', qdrant_path, args.collection, dim)}
+
+        for dtype in ('int8', 'float16'):
+            directory = os.path.join(tmp, f'lite_{dtype}')
+            meta = build_index(points, directory, dtype=dtype, nlist=args.nlist)
+            index = LiteIndex(directory)
+            latencies, recalls = [], []
+            for q, t in zip(queries, truth):
+                start = time.perf_counter()
+                hits = [index.payload(row)['id'] for row, _ in index.search(q, args.k, nprobe=args.nprobe)]
+                latencies.append((time.perf_counter() - start) * 1000)
+                recalls.append(len({row_of[pid] for pid in hits} & t) / args.k)
+            index.close()
+            size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+            results[f'lite_{dtype}'] = {**summarize(latencies, recalls), 'nlist': meta['nlist'],
+                                        'disk_mb': round(size / 2 ** 20, 2),
+                                        **measure_child('lite', directory, args.collection, dim)}
+
+    for name, r in results.items():
+        print(f'{name:18s} {r}')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
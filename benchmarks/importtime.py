@@ -0,0 +1,88 @@
+"""导入耗时基准：在全新解释器中以 `-X importtime` 导入目标模块，汇总总耗时与最慢的依赖。
+
+用法：
+    python benchmarks/importtime.py                      # 默认测量 app 与各智能体模块
+    python benchmarks/importtime.py app tools.render_chart --top 15
+    python benchmarks/importtime.py --json benchmarks/results/importtime.json
+
+每个目标重复 --runs 次取中位数，避免单次磁盘缓存抖动影响结论。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+
+DEFAULT_TARGETS = [
+    'app',
+    'agents.router_agent',
+    'agents.agentic_rag',
+    'agents.agentic_query',
+    'agents.agentic_search',
+    'agents.agentic_output',
+]
+
+
+def measure(module: str) -> tuple[int, list[tuple[int, int, str]]]:
+    """返回 (总耗时微秒, [(累计耗时, 嵌套深度, 模块名), ...])。"""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{proc.stderr[-2000:]}')
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        # 输出中每多一层嵌套，模块名前多缩进两个空格
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((int(cumulative_us), depth, name.strip()))
+    total = sum(cum for cum, depth, _ in entries if depth == 0)
+    return total, entries
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='测量模块导入耗时')
+    parser.add_argument('targets', nargs='*', default=DEFAULT_TARGETS)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=10, help='列出累计耗时最高的依赖数量')
+    parser.add_argument('--json', help='把结果写入 JSON 文件，便于与历史结果对比')
+    args = parser.parse_args()
+
+    report = {}
+    for target in args.targets:
+        totals, last_entries = [], []
+        for _ in range(args.runs):
+            total, last_entries = measure(target)
+            totals.append(total)
+        median_ms = statistics.median(totals) / 1000
+        # 只统计目标模块的直接依赖，避免同一耗时被嵌套模块重复计入
+        direct = [e for e in last_entries if e[1] == 1]
+        slowest = sorted(direct, key=lambda e: e[0], reverse=True)[:args.top]
+        report[target] = {
+            'median_ms': round(median_ms, 1),
+            'runs_ms': [round(t / 1000, 1) for t in totals],
+            'slowest': [{'module': name, 'cumulative_ms': round(cum / 1000, 1)} for cum, _, name in slowest],
+        }
+
+        print(f'{target}: {median_ms:.1f} ms (median of {args.runs})')
+        for cum, _, name in slowest:
+            print(f'    {cum / 1000:8.1f} ms  {name}')
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'targets': report}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""基准测试用的本地替身：DashScope 对话模型、DashScope Embedding、博查搜索接口与 biomcp PubMed 检索。
+
+所有替身都是确定性的，延迟可配置，不消耗 API 额度也不依赖网络。用法：
+
+    from benchmarks.mocks import MockSettings, setup_sandbox, install_mocks
+    settings = MockSettings(llm_ttft=0.3)
+    setup_sandbox(tmp_dir, settings)   # 必须在导入 app / agents / tools 之前调用
+    install_mocks(settings)
+
+对话模型按"场景"脚本化：用户消息中的 `[query]` / `[rag]` / `[search]` / `[chart]` 标记决定路由智能体调用哪个子智能体，
+子智能体再调用对应的工具，拿到工具结果后直接给出固定的文本回答。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, ROOT)
+from config import Config
+
+
+@dataclass
+class MockSettings:
+    llm_ttft: float = 0.3            # 模型首包延迟（秒）
+    llm_chunk_delay: float = 0.02    # 流式分片间隔（秒）
+    llm_chunks: int = 5              # 每次回答的流式分片数
+    embedding_latency: float = 0.05  # 每次 embedding 请求的延迟（秒）
+    embedding_dim: int = 1024        # 与 text-embedding-v3 一致，可直接检索已有的知识库
+    search_latency: float = 0.2      # 博查搜索接口延迟（秒）
+    pubmed_latency: float = 0.4      # PubMed 检索延迟（秒）
+
+
+# 场景脚本：路由智能体调用的子智能体，以及子智能体依次调用的工具
+SCENARIOS = {
+    'query': {
+        'router': ('agentic_query', {'demand': '查询我最近的睡眠数据 [query]'}),
+        'tools': [('read_sleep_db', {})],
+    },
+    'rag': {
+        'router': ('agentic_rag', {'demand': '如何提高深睡比例 [rag]'}),
+        'tools': [('get_sleep_knowledge', {'demands': '如何提高深睡比例'})],
+    },
+    'search': {
+        'router': ('agentic_search', {'demand': '失眠的最新研究进展 [search]'}),
+        'tools': [('web_search', {'demand': '失眠 最新研究'}), ('pubmed_search', {'diseases': 'insomnia'})],
+    },
+    'chart': {
+        'router': ('agentic_output', {'demand': '绘制最近 7 天的睡眠分期图 [chart]'}),
+        'tools': [('render_chart', {'spec': '{"chart": "sleep_stages", "last_n": 7}'})],
+    },
+}
+ROUTER_TOOLS = {'agentic_query', 'agentic_rag', 'agentic_search', 'agentic_output'}
+ANSWER = '根据检索到的数据，您最近一周的平均睡眠时长约为七小时，深睡比例正常，建议保持规律作息。'
+
+_SCENARIO_RE = re.compile(r'\[(\w+)\]')
+
+
+def setup_sandbox(directory: str, settings: MockSettings) -> None:
+    """把输出、缓存、追踪与向量库路径指向临时目录（复制一份现有向量库），避免基准测试污染真实数据。
+
+    工具模块在导入时读取 Config 作为默认参数，因此必须在导入 app / agents / tools 之前调用。
+    """
+    os.makedirs(directory, exist_ok=True)
+    vdbs_path = os.path.join(directory, 'vdbs')
+    if os.path.isdir(Config['VDBS_PATH']) and not os.path.exists(vdbs_path):
+        shutil.copytree(Config['VDBS_PATH'], vdbs_path, ignore=shutil.ignore_patterns('.lock'))
+    Config.update({
+        'OUTPUT_DIR': os.path.join(directory, 'output'),
+        'VDBS_PATH': vdbs_path,
+        'PUBMED_CACHE_PATH': os.path.join(directory, 'pubmed_cache.sqlite'),
+        'TRACE_PATH': os.path.join(directory, 'spans.jsonl'),
+        'EXEC_LOG_PATH': os.path.join(directory, 'exec_runs.jsonl'),
+        'DATA_HANDLE_DIR': os.path.join(directory, 'data_handles'),
+        'TYPING_INTERVAL': 0,
+        'PREWARM': False,
+        'API_KEY': 'mock',
+    })
+
+
+# ---------------------------------------------------------------- 对话模型
+
+def _latest_user_text(messages: list[dict]) -> str:
+    for msg in reversed(messages):
+        if msg.get('role') == 'user':
+            content = msg.get('content')
+            if isinstance(content, list):
+                return ' '.join(c.get('text', '') for c in content if isinstance(c, dict))
+            return str(content or '')
+    return ''
+
+
+def _plan(messages: list[dict], tools: list[dict] | None) -> list[dict]:
+    """根据可用工具与对话状态决定本轮的输出内容块。"""
+    from agentscope.message import TextBlock, ToolUseBlock
+
+    if messages and messages[-1].get('role') == 'tool':
+        return [TextBlock(type='text', text=ANSWER)]
+
+    tool_names = {t['function']['name'] for t in tools or []}
+    match = _SCENARIO_RE.search(_latest_user_text(messages))
+    scenario = SCENARIOS.get(match.group(1) if match else 'query', SCENARIOS['query'])
+
+    if tool_names & ROUTER_TOOLS:
+        calls = [scenario['router']]
+    else:
+        calls = [call for call in scenario['tools'] if call[0] in tool_names]
+    if not calls:
+        return [TextBlock(type='text', text=ANSWER)]
+    return [
+        ToolUseBlock(type='tool_use', id=f'call_{time.time_ns()}_{i}', name=name, input=dict(args))
+        for i, (name, args) in enumerate(calls)
+    ]
+
+
+def make_mock_chat_call(settings: MockSettings):
+    """生成替换 DashScopeChatModel.__call__ 的函数，流式 / 非流式与原实现一致。"""
+    from agentscope.model import ChatResponse
+    from agentscope.model._model_usage import ChatUsage
+
+    async def __call__(self, messages, tools=None, tool_choice=None, structured_model=None, **kwargs):
+        start = time.time()
+        blocks = _plan(messages, tools)
+        input_tokens = len(json.dumps(messages, ensure_ascii=False)) // 2
+        await asyncio.sleep(settings.llm_ttft)
+
+        def usage(output_chars: int) -> ChatUsage:
+            return ChatUsage(input_tokens=input_tokens, output_tokens=output_chars // 2, time=time.time() - start)
+
+        if not self.stream:
+            return ChatResponse(content=blocks, usage=usage(len(json.dumps(blocks, ensure_ascii=False))))
+
+        async def generate():
+            # 与 DashScope 流式接口一致：每个分片都是截至当前的累积内容
+            text_blocks = [b for b in blocks if b['type'] == 'text']
+            if not text_blocks:
+                yield ChatResponse(content=blocks, usage=usage(len(json.dumps(blocks, ensure_ascii=False))))
+                return
+            text = text_blocks[0]['text']
+            step = max(1, len(text) // settings.llm_chunks)
+            for end in range(step, len(text) + step, step):
+                await asyncio.sleep(settings.llm_chunk_delay)
+                partial = text[:end]
+                yield ChatResponse(content=[{'type': 'text', 'text': partial}], usage=usage(len(partial)))
+
+        return generate()
+
+    return __call__
+
+
+# ---------------------------------------------------------------- Embedding
+
+def _vector(text: str, dim: int) -> list[float]:
+    import numpy as np
+
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vec = np.random.default_rng(seed).standard_normal(dim).astype('float32')
+    return (vec / np.linalg.norm(vec)).tolist()
+
+
+def install_mock_embeddings(settings: MockSettings) -> None:
+    from langchain_dashscope import DashScopeEmbeddings
+
+    def embed_documents(self, texts):
+        time.sleep(settings.embedding_latency)
+        return [_vector(t, settings.embedding_dim) for t in texts]
+
+    def embed_query(self, text):
+        time.sleep(settings.embedding_latency)
+        return _vector(text, settings.embedding_dim)
+
+    DashScopeEmbeddings.embed_documents = embed_documents
+    DashScopeEmbeddings.embed_query = embed_query
+
+
+# ---------------------------------------------------------------- 博查搜索
+
+def start_mock_search_server(settings: MockSettings) -> ThreadingHTTPServer:
+    """在本地随机端口启动博查 web-search 接口替身，并把 BOCHA_BASE_URL 指向它。"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            query = json.loads(self.rfile.read(length) or b'{}').get('query', '')
+            time.sleep(settings.search_latency)
+            pages = [
+                {'name': f'{query} 相关结果 {i}', 'url': f'https://example.com/{i}', 'summary': f'关于 {query} 的模拟摘要 {i}。' * 5}
+                for i in range(10)
+            ]
+            body = json.dumps({'data': {'webPages': {'value': pages}}}, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    Config['BOCHA_BASE_URL'] = f'http://127.0.0.1:{server.server_address[1]}/v1/web-search'
+    return server
+
+
+# ---------------------------------------------------------------- PubMed
+
+def install_mock_pubmed(settings: MockSettings) -> None:
+    import biomcp.articles.search as biomcp_search
+
+    async def search_articles(request, output_json=True, limit=20):
+        await asyncio.sleep(settings.pubmed_latency)
+        topic = ' '.join(request.diseases + request.keywords)
+        seed = int(hashlib.sha256(topic.encode('utf-8')).hexdigest()[:6], 16)
+        articles = [
+            {
+                'pmid': str(seed + i),
+                'title': f'A study of {topic} ({i})',
+                'journal': 'Journal of Mock Medicine',
+                'abstract': f'This mock abstract discusses {topic}. ' * 30,
+            }
+            for i in range(limit)
+        ]
+        return json.dumps(articles)
+
+    biomcp_search.search_articles = search_articles
+
+
+def install_mocks(settings: MockSettings) -> ThreadingHTTPServer:
+    """安装全部替身，返回搜索接口替身服务器（调用方负责 shutdown）。"""
+    from agentscope.model import DashScopeChatModel
+
+    DashScopeChatModel.__call__ = make_mock_chat_call(settings)
+    install_mock_embeddings(settings)
+    install_mock_pubmed(settings)
+    return start_mock_search_server(settings)
@@ -10,19 +10,20 @@ import urllib.request
 import webbrowser
 import sys
 
-from app import app
-
 HOST = '127.0.0.1'
 PORT = 5000
 URL = f'http://{HOST}:{PORT}/'
 
 
 def start_server():
+    # 只在服务子进程中导入应用，启动器主进程无需加载任何依赖
+    from app import app
+
     # 禁用 reloader，适合打包成 exe
     app.run(host=HOST, port=PORT, use_reloader=False)
 
 
-def wait_for_service(timeout=15.0, interval=0.1):
+def wait_for_service(timeout=15.0, interval=0.05):
     """轮询直到服务返回 200"""
     waited = 0.0
     while waited < timeout:
@@ -0,0 +1,144 @@
+"""/stream 的准入控制：全局并发上限、单会话并发上限与有界等待队列。
+
+超出并发上限的请求进入 FIFO 队列，响应立即返回（响应头 `X-Queue-Position` 给出排队位置），
+轮到时才开始运行智能体；队列已满或同一会话已有请求在处理时直接返回 429，
+这样过载时延迟平稳上升，而不是所有请求一起变慢。
+"""
+import asyncio
+import os
+import sys
+from collections import Counter, deque
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+
+
+ADMISSION_MAX_ACTIVE = Config.get('ADMISSION_MAX_ACTIVE', 8)          # 同时运行的请求数
+ADMISSION_MAX_QUEUE = Config.get('ADMISSION_MAX_QUEUE', 32)           # 等待队列长度
+ADMISSION_PER_SESSION = Config.get('ADMISSION_PER_SESSION', 1)        # 单个会话同时处理（含排队）的请求数
+ADMISSION_QUEUE_TIMEOUT = Config.get('ADMISSION_QUEUE_TIMEOUT', 60)   # 排队等待上限（秒）
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """一次准入：`position` 为进入时的排队位置（0 表示立即运行）。
+
+    `await ticket.wait()` 等待轮到自己（超时抛出 asyncio.TimeoutError），处理结束后调用 `close()` 释放；
+    也可以写成 `async with ticket:`。
+    """
+
+    def __init__(self, controller: 'AdmissionController', session_id: str, waiter: asyncio.Future | None, position: int):
+        self._controller = controller
+        self.session_id = session_id
+        self._waiter = waiter
+        self.position = position
+        self._holding = waiter is None
+        self._closed = False
+
+    async def wait(self) -> None:
+        if not self._holding:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._waiter), ADMISSION_QUEUE_TIMEOUT)
+            except BaseException:
+                self._holding = self._controller._abandon(self._waiter)
+                self.close()
+                raise
+            self._holding = True
+
+    async def __aenter__(self) -> 'Ticket':
+        await self.wait()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """释放槽位与会话计数；可重复调用。仍在排队时撤销排队（槽位恰好已分配时一并释放）。"""
+        if self._closed:
+            return
+        self._closed = True
+        if not self._holding and self._waiter is not None:
+            self._holding = self._controller._abandon(self._waiter)
+        self._controller._finish(self.session_id, self._holding)
+        self._holding = False
+
+
+class AdmissionController:
+    def __init__(self, max_active: int = ADMISSION_MAX_ACTIVE, max_queue: int = ADMISSION_MAX_QUEUE,
+                 per_session: int = ADMISSION_PER_SESSION):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.per_session = per_session
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._sessions: Counter = Counter()
+        self.rejected = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def enter(self, session_id: str | None) -> Ticket:
+        """同步判断是否接收请求；拒绝时抛出 Rejected。"""
+        session_id = session_id or ''
+        if session_id and self._sessions[session_id] >= self.per_session:
+            self.rejected += 1
+            raise Rejected('当前会话已有请求正在处理，请等待上一条回答完成。', retry_after=2)
+
+        if self.active < self.max_active and not self._waiters:
+            self.active += 1
+            self._sessions[session_id] += 1
+            return Ticket(self, session_id, None, 0)
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Rejected('服务繁忙，请稍后重试。', retry_after=5)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._sessions[session_id] += 1
+        return Ticket(self, session_id, waiter, len(self._waiters))
+
+    def _wake_next(self) -> None:
+        while self._waiters and self.active < self.max_active:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+    def _abandon(self, waiter: asyncio.Future) -> bool:
+        """排队的请求超时或被取消；若槽位恰好已分配给它，返回 True 由调用方释放。"""
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            return False
+        if waiter.done() and not waiter.cancelled():
+            return True
+        waiter.cancel()
+        return False
+
+    def _finish(self, session_id: str, holding: bool) -> None:
+        self._sessions[session_id] -= 1
+        if self._sessions[session_id] <= 0:
+            del self._sessions[session_id]
+        if holding:
+            self.active -= 1
+            self._wake_next()
+
+    def snapshot(self) -> dict:
+        return {
+            'active': self.active,
+            'queued': self.queued,
+            'max_active': self.max_active,
+            'max_queue': self.max_queue,
+            'rejected': self.rejected,
+        }
+
+
+# 模块级单例：每个工作进程一个准入控制器
+admission = AdmissionController()
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+
+from quart import Blueprint, Response, jsonify, request
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+from router.admission import Rejected, admission
+from router.health import stream_started, stream_finished
+
+batch_bp = Blueprint('batch', __name__)
+
+BATCH_MAX_CONCURRENCY = Config.get('BATCH_MAX_CONCURRENCY', 16)   # 请求参数 concurrency 的上限
+BATCH_MAX_QUESTIONS = Config.get('BATCH_MAX_QUESTIONS', 1000)     # 单次请求的问题数上限
+BATCH_MAX_TIMEOUT = Config.get('BATCH_MAX_TIMEOUT', 600)          # 请求参数 timeout（单题超时，秒）的上限
+
+
+@asynccontextmanager
+async def _admitted():
+    """每个问题与 /stream 请求共用准入控制，占用一个运行槽位；队列已满或排队超时时稍后重试。"""
+    while True:
+        try:
+            ticket = admission.enter(None)
+        except Rejected as e:
+            await asyncio.sleep(e.retry_after)
+            continue
+        try:
+            await ticket.wait()     # 超时或被取消时 wait() 已释放票据
+        except asyncio.TimeoutError:
+            continue
+        break
+    try:
+        yield
+    finally:
+        ticket.close()
+
+
+@batch_bp.route('/batch', methods=['POST'])
+async def batch():
+    # 请求体为问题 JSONL（格式见 tools/batch_answer.py），按完成顺序以 NDJSON 返回结果，最后一行为汇总
+    from tools.batch_answer import BATCH_CONCURRENCY, BATCH_TIMEOUT, answer_batch, parse_questions, summarize
+
+    body = (await request.get_data()).decode('utf-8', errors='replace')
+    try:
+        items = parse_questions(body.splitlines())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not items:
+        return jsonify({'error': 'no questions'}), 400
+    if len(items) > BATCH_MAX_QUESTIONS:
+        return jsonify({'error': f'too many questions (max {BATCH_MAX_QUESTIONS})'}), 413
+    concurrency = min(request.args.get('concurrency', BATCH_CONCURRENCY, type=int), BATCH_MAX_CONCURRENCY)
+    timeout = min(request.args.get('timeout', BATCH_TIMEOUT, type=float), BATCH_MAX_TIMEOUT)
+
+    async def generate():
+        stream_started()
+        results = []
+        start = time.perf_counter()
+        try:
+            async for result in answer_batch(items, concurrency, timeout, admit=_admitted):
+                results.append(result)
+                yield (json.dumps(result, ensure_ascii=False, default=str) + '\n').encode('utf-8')
+            summary = summarize(results, time.perf_counter() - start)
+            yield (json.dumps({'summary': summary}, ensure_ascii=False) + '\n').encode('utf-8')
+        finally:
+            stream_finished()
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={'Cache-Control': 'no-cache'})
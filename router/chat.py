@@ -1,5 +1,9 @@
-from quart import Blueprint, render_template, request, Response
-from agents.router_agent import router_agent
+from quart import Blueprint, render_template, request, Response, send_file
+from tools.output_store import resolve_output_path, set_session, valid_session
+from router.health import stream_started, stream_finished
+from router.admission import Rejected, admission
+from router.events import FORMATS, encode_batch, negotiate
+import asyncio
 import time
 
 chat_bp = Blueprint('chat', __name__)
@@ -10,10 +14,109 @@ async def index():
 
 @chat_bp.route('/stream', methods=['POST'])
 async def stream_chat():
-    user_input = (await request.form).get('message')
+    form = await request.form
+    user_input = form.get('message')
+    session_id = form.get('session_id')
+    # format=sse / ndjson（或 Accept 头）返回结构化事件，否则沿用纯文本流
+    fmt = negotiate(form.get('format'), request.headers.get('Accept'))
+
+    # 准入控制：超出上限时排队，队列已满或本会话已有请求在处理时直接返回 429
+    try:
+        ticket = admission.enter(session_id)
+    except Rejected as e:
+        body = encode_batch([{'type': 'error', 'message': e.reason}], fmt) if fmt else e.reason
+        return Response(
+            body,
+            status=429,
+            mimetype=FORMATS[fmt][0] if fmt else 'text/plain; charset=utf-8',
+            headers={'Retry-After': str(e.retry_after)},
+        )
+
+    # 智能体及其依赖（agentscope、langchain、pandas 等）在首次请求或后台预热时才导入
+    from agents.router_agent import router_agent, router_events
+    from tools.tracing import span
+
+    async def event_body():
+        try:
+            async for events in router_events(user_input):
+                yield encode_batch(events, fmt)
+        except Exception as e:
+            yield encode_batch([{'type': 'error', 'message': f'{type(e).__name__}: {e}'}], fmt)
+            raise
+
+    def busy(message: str) -> bytes:
+        return encode_batch([{'type': 'error', 'message': message}], fmt) if fmt else message.encode('utf-8')
+
+    async def generate():
+        # 票据在生成器的任何退出路径上都要释放：排队时被关闭、排队超时或处理结束（close() 可重复调用）
+        try:
+            # 在响应生成器内设置会话，工具调用会继承该上下文，把输出文件写入会话子目录
+            set_session(session_id)
+            if fmt and ticket.position:
+                yield encode_batch([{'type': 'queued', 'position': ticket.position}], fmt)
+            try:
+                await ticket.wait()
+            except asyncio.TimeoutError:
+                yield busy('服务繁忙，排队超时，请稍后重试。')
+                return
+            stream_started()
+            try:
+                # 整个请求作为根 span，路由与子智能体的模型调用、工具调用都挂在其下
+                with span('/stream', 'request', session_id=session_id or '', input_chars=len(user_input or ''),
+                          format=fmt or 'text') as s:
+                    sent = 0
+                    async for chunk in (event_body() if fmt else router_agent(user_input)):
+                        if not sent:
+                            s.set(ttfb_ms=round(s.duration_ms, 2))
+                        sent += len(chunk)
+                        yield chunk
+                    if fmt:
+                        yield encode_batch([{'type': 'done', 'duration_ms': round(s.duration_ms, 1)}], fmt)
+                    s.set(response_bytes=sent)
+            finally:
+                stream_finished()
+        finally:
+            ticket.close()
+
+    headers = {'Cache-Control': 'no-cache', 'X-Queue-Position': str(ticket.position)}
+    if fmt == 'sse':
+        headers['X-Accel-Buffering'] = 'no'     # 关闭反向代理缓冲，事件即时到达
+    response = Response(
+        generate(),                        # 直接传异步生成器
+        mimetype=FORMATS[fmt][0] if fmt else 'text/plain; charset=utf-8',
+        headers=headers,
+    )
+    # 浏览器随后请求 /output/sessions/<会话>/ 下的图片、音频时凭该 Cookie 校验会话
+    if valid_session(session_id):
+        response.set_cookie('session_id', session_id, httponly=True, samesite='Lax')
+    return response
+
+@chat_bp.route('/output/<path:filename>')
+async def output_file(filename):
+    # 只提供调用方自己会话目录（查询参数或 Cookie 中的 session_id）与 reports/ 下的产物文件
+    session_id = request.args.get('session_id') or request.cookies.get('session_id')
+    path = resolve_output_path(filename, session_id)
+    if path is None:
+        return 'file not found', 404
+
+    # conditional=True 时根据 If-None-Match / Range 返回 304 或 206
+    response = await send_file(path, conditional=True, cache_timeout=3600)
+    # 直接打开 SVG 等文件时不执行其中的脚本
+    response.headers['Content-Security-Policy'] = "default-src 'none'; img-src 'self'; style-src 'unsafe-inline'; sandbox"
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+@chat_bp.route('/audio/stream/<stream_id>')
+async def audio_stream(stream_id):
+    # 语音合成进行中即可开始播放，合成结束后短时间内仍可访问
+    from tools.audio_wrapper import get_audio_stream
+
+    stream = get_audio_stream(stream_id)
+    if stream is None:
+        return 'audio stream not found', 404
 
     return Response(
-        router_agent(user_input),          # 直接传异步生成器
-        mimetype='text/plain; charset=utf-8',
+        stream.iter_chunks(),
+        mimetype=stream.media_type,
         headers={'Cache-Control': 'no-cache'},
-    )
\ No newline at end of file
+    )
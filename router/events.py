@@ -0,0 +1,44 @@
+"""`/stream` 结构化事件的编码：SSE（text/event-stream）与 NDJSON（application/x-ndjson）。
+
+事件类型：
+- `queued`      排队中，`position` 为排队位置
+- `delta`       路由智能体的增量文本（服务端按时间窗口合并）
+- `tool_start`  / `tool_end`  子智能体与工具的开始、结束，`tool_end` 带 `duration_ms` 与 `error`
+- `artifact`    生成的图片 / 音频地址，`media` 为 image / audio / file，语音推流带 `stream: true`
+- `final`       最终回答（输出文件路径已替换为访问地址）
+- `error`       处理失败
+- `done`        响应结束，带总耗时 `duration_ms`
+"""
+import json
+
+
+def encode_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def encode_ndjson(event: dict) -> str:
+    return json.dumps(event, ensure_ascii=False) + '\n'
+
+
+FORMATS = {
+    'sse': ('text/event-stream', encode_sse),
+    'ndjson': ('application/x-ndjson', encode_ndjson),
+}
+
+
+def negotiate(requested: str | None, accept: str | None) -> str | None:
+    """表单字段 `format` 优先，其次看 Accept 头；都没有时返回 None，沿用纯文本流。"""
+    if requested in FORMATS:
+        return requested
+    accept = accept or ''
+    if 'text/event-stream' in accept:
+        return 'sse'
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    return None
+
+
+def encode_batch(events: list[dict], fmt: str) -> bytes:
+    """一批事件编码为一个分片，一次写出。"""
+    encode = FORMATS[fmt][1]
+    return ''.join(encode(event) for event in events).encode('utf-8')
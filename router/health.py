@@ -0,0 +1,156 @@
+import asyncio
+import importlib
+import os
+import sys
+import time
+
+from quart import Blueprint, jsonify
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+
+health_bp = Blueprint('health', __name__)
+
+# 进程内的预热状态：starting -> warming -> ready / degraded（有组件预热失败，/healthz 仍返回 503）
+_state = {
+    'status': 'starting',
+    'components': {},
+    'started_at': time.time(),
+    'ready_at': None,
+}
+_inflight_streams = 0
+
+# 工具模块在首次调用时才导入的重依赖，预热时提前导入
+PREWARM_MODULES = [
+    'pandas',
+    'matplotlib.figure',
+    'matplotlib.backends.backend_agg',
+    'langchain_text_splitters',
+    'qdrant_client',
+    'langchain_dashscope',
+    'pypdf',
+    'biomcp.articles.search',
+]
+
+
+def stream_started() -> None:
+    global _inflight_streams
+    _inflight_streams += 1
+
+
+def stream_finished() -> None:
+    global _inflight_streams
+    _inflight_streams -= 1
+
+
+def _warm_agents() -> str:
+    """构建路由智能体与各子智能体（导入 agentscope、dashscope、langchain 等依赖）。"""
+    try:
+        from agents.router_agent import _get_router_agent
+        from agents.agentic_rag import _get_rag_agent
+        from agents.agentic_query import _get_query_agent
+        from agents.agentic_search import _get_search_agent
+        from agents.agentic_output import _get_output_agent
+
+        for getter in (_get_router_agent, _get_rag_agent, _get_query_agent, _get_search_agent, _get_output_agent):
+            getter()
+        return 'ok'
+    except Exception as e:
+        return f'error: {e!r}'
+
+
+def _warm_modules() -> str:
+    failed = []
+    for name in PREWARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            failed.append(name)
+    return f"error: {', '.join(failed)}" if failed else 'ok'
+
+
+def _warm_vector_stores() -> dict[str, str]:
+    """连接向量库后端并确认各知识库集合存在。"""
+    from tools.vector_store import get_vector_store
+    from tools.build_literature_vdbs import LITERATURE_KNOWLEDGE_COLLECTION
+
+    collections = [
+        Config['SLEEP_KNOWLEDGE_COLLECTION'],
+        Config['HEART_RATE_KNOWLEDGE_COLLECTION'],
+        LITERATURE_KNOWLEDGE_COLLECTION,
+    ]
+
+    error = None
+    for attempt in range(5):
+        try:
+            store = get_vector_store()
+            return {name: 'ok' if store.collection_exists(name) else 'missing' for name in collections}
+        except Exception as e:
+            # Qdrant 服务可能尚未就绪，或嵌入式存储的文件锁等待超时，稍后重试
+            error = e
+            time.sleep(0.2 * (attempt + 1))
+    return {name: f'error: {error!r}' for name in collections}
+
+
+def _warm_exec_pool() -> str:
+    """创建沙箱进程池：worker 在后台启动并导入 matplotlib / pandas，首次作图不再等待进程启动。"""
+    from tools.exec_pool import EXEC_POOL_SIZE, get_exec_pool
+
+    if EXEC_POOL_SIZE <= 0:
+        return 'disabled'
+    try:
+        get_exec_pool()
+        return 'ok'
+    except Exception as e:
+        return f'error: {e!r}'
+
+
+def _failed(result) -> bool:
+    """组件结果中是否有失败项；知识库集合尚未构建（missing）不算失败。"""
+    if isinstance(result, dict):
+        return any(_failed(v) for v in result.values())
+    return str(result).startswith('error')
+
+
+async def warm_up() -> None:
+    """服务开始监听后在后台预热，所有组件成功后 /healthz 返回 200，否则状态为 degraded 并继续返回 503。"""
+    _state['status'] = 'warming'
+    # 最先创建进程池，worker 的导入与下面的预热并行进行
+    _state['components']['exec_pool'] = await asyncio.to_thread(_warm_exec_pool)
+    _state['components']['agents'] = await asyncio.to_thread(_warm_agents)
+    _state['components']['modules'] = await asyncio.to_thread(_warm_modules)
+    _state['components']['vector_stores'] = await asyncio.to_thread(_warm_vector_stores)
+    if _failed(_state['components']):
+        _state['status'] = 'degraded'
+        return
+    _state['status'] = 'ready'
+    _state['ready_at'] = time.time()
+
+
+@health_bp.route('/metrics')
+async def metrics():
+    # 本进程内各类 span（request / agent / tool / llm）的调用次数、耗时分位数与 token 用量
+    from tools.tracing import metrics_summary
+    from tools.limits import limits_snapshot
+    from tools.model_client import models_snapshot
+    from router.admission import admission
+
+    return jsonify({
+        'pid': os.getpid(),
+        'inflight_streams': _inflight_streams,
+        'admission': admission.snapshot(),
+        'limits': limits_snapshot(),
+        'models': models_snapshot(),
+        'spans': metrics_summary(),
+    })
+
+
+@health_bp.route('/healthz')
+async def healthz():
+    # 预热完成前或有组件失败（degraded）时返回 503，负载均衡器不把流量分给本进程
+    body = {
+        **_state,
+        'pid': os.getpid(),
+        'inflight_streams': _inflight_streams,
+    }
+    return jsonify(body), 200 if _state['status'] == 'ready' else 503
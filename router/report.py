@@ -0,0 +1,20 @@
+from quart import Blueprint, jsonify, request
+
+report_bp = Blueprint('report', __name__)
+
+
+@report_bp.route('/report')
+async def get_report():
+    # 读取夜间批量生成的每日摘要（tools/daily_report.py），不调用模型
+    from tools.daily_report import load_report
+
+    user_id = request.args.get('user_id', type=int)
+    if user_id is None:
+        return jsonify({'error': 'user_id is required'}), 400
+    try:
+        report = load_report(user_id, request.args.get('date'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if report is None:
+        return jsonify({'error': 'report not found'}), 404
+    return jsonify(report)
@@ -0,0 +1,72 @@
+# serve.py
+# 生产环境入口：以多进程方式在 Hypercorn（默认）或 Uvicorn 下运行 Quart 应用
+#   python serve.py --workers 4 --port 5000
+#   python serve.py --server uvicorn
+# 收到 SIGTERM / Ctrl+C 后停止接受新连接，并在 graceful-timeout 秒内等待进行中的 /stream 响应结束。
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from config import Config
+
+logger = logging.getLogger('serve')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='以生产模式运行 Quart 应用')
+    parser.add_argument('--host', default=Config.get('SERVE_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=Config.get('SERVE_PORT', 5000))
+    parser.add_argument('--workers', type=int, default=Config.get('SERVE_WORKERS', os.cpu_count() or 1),
+                        help='工作进程数，默认等于 CPU 核数')
+    parser.add_argument('--server', choices=('hypercorn', 'uvicorn'), default=Config.get('SERVE_BACKEND', 'hypercorn'))
+    parser.add_argument('--graceful-timeout', type=float, default=Config.get('SERVE_GRACEFUL_TIMEOUT', 60),
+                        help='关闭时等待进行中请求完成的秒数')
+    return parser.parse_args()
+
+
+def run_hypercorn(args) -> int:
+    from hypercorn.config import Config as HypercornConfig
+    from hypercorn.run import run
+
+    config = HypercornConfig()
+    config.application_path = 'app:app'
+    config.bind = [f'{args.host}:{args.port}']
+    config.workers = args.workers
+    config.graceful_timeout = args.graceful_timeout
+    config.accesslog = '-'
+    return run(config)
+
+
+def run_uvicorn(args) -> int:
+    import uvicorn
+
+    uvicorn.run(
+        'app:app',
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        lifespan='on',
+        timeout_graceful_shutdown=int(args.graceful_timeout),
+    )
+    return 0
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    args = parse_args()
+    from tools.vector_store import VDBS_BACKEND
+
+    if args.workers > 1 and VDBS_BACKEND == 'embedded':
+        # 嵌入式 Qdrant 以文件锁独占 VDBS_PATH，多个进程的知识库检索只能排队执行
+        logger.warning('workers=%d 且使用嵌入式 Qdrant（VDBS_PATH），知识库检索将在进程间串行；'
+                       '多进程部署请设置 VDBS_URL 使用 Qdrant 服务', args.workers)
+    logger.info('starting %s on %s:%d with %d workers', args.server, args.host, args.port, args.workers)
+    if args.server == 'uvicorn':
+        return run_uvicorn(args)
+    return run_hypercorn(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,116 +1,377 @@
 # -*- coding: utf-8 -*-
 """本地封装：将 DashScope 文本转音频并保存到项目的 output 目录。
 
-此函数与 agentscope 中的 `dashscope_text_to_audio` 功能等价，但在生成
-音频后会把二进制音频写入到 `output_dir`（默认为 `Config['OUTPUT_DIR']`），
-并在返回的 ToolResponse 中加入一个 `TextBlock`，包含已保存的文件绝对路径。
+此函数与 agentscope 中的 `dashscope_text_to_audio` 功能等价，但合成过程不会阻塞事件循环：
+长文本按句切分为若干批次，在后台线程中并发合成；每个批次的音频帧一到达就写入磁盘上的分片文件，
+同时推送到内存中的音频流（浏览器可通过 `/audio/stream/<stream_id>` 边合成边播放），
+全部完成后按顺序拼接为最终文件。返回给 LLM 的 ToolResponse 只包含文件路径，不再携带 base64 音频。
+
+合成结果按 (文本, 模型, 采样率, 格式) 的哈希保存在 output 目录下的 tts_cache 中，相同内容再次合成时直接返回缓存文件；
+缓存目录不对外提供，返回前把文件链接到当前会话的输出目录。
+默认输出 16 kHz 的 mp3；安装了 ffmpeg 时还可输出 opus。
 """
-import base64
+import asyncio
+import hashlib
+import json
 import os
-from typing import Literal, Any
+import re
+import shutil
+import struct
+import subprocess
+from typing import AsyncGenerator
 
 import shortuuid
 
-from agentscope.message import AudioBlock, TextBlock
+from agentscope.message import TextBlock
 from agentscope.tool._response import ToolResponse
 
 import sys
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 from config import Config
+from tools.output_store import output_root, schedule_sweep, session_output_dir
+from tools.limits import limit
+from tools.request_scope import emit
+
+
+TTS_BATCH_CHARS = Config.get('TTS_BATCH_CHARS', 200)        # 单个合成批次的最大字符数
+TTS_CONCURRENCY = Config.get('TTS_CONCURRENCY', 4)          # 单次调用内并发合成的批次数
+TTS_BROWSER_STREAM = Config.get('TTS_BROWSER_STREAM', True) # 是否在内存中缓冲音频流供浏览器边合成边播放
+TTS_STREAM_RETENTION = 60                                   # 合成结束后音频流在内存中保留的秒数
+TTS_STREAM_IDLE_TIMEOUT = 60                                # 推流时等待新音频帧的上限（秒），超时即结束响应
+TTS_FORMAT = Config.get('TTS_FORMAT', 'mp3')                # 默认输出格式：wav / mp3 / opus
+TTS_SAMPLE_RATE = Config.get('TTS_SAMPLE_RATE', 16000)      # 语音用 16 kHz 已足够清晰
+TTS_OPUS_BITRATE = Config.get('TTS_OPUS_BITRATE', '24k')
+
+TTS_FORMATS = ('wav', 'mp3', 'opus')
+
+_SENTENCE_END = re.compile(r'(?<=[。！？!?；;\n])')
+
+
+def _split_sentences(text: str, max_chars: int = TTS_BATCH_CHARS) -> list[str]:
+    """按句号等标点切分文本，并把相邻短句合并为不超过 max_chars 的批次。"""
+    batches: list[str] = []
+    current = ''
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        # 超长的单句按字符数硬切
+        while len(sentence) > max_chars:
+            if current:
+                batches.append(current)
+                current = ''
+            batches.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if len(current) + len(sentence) > max_chars:
+            batches.append(current)
+            current = sentence
+        else:
+            current += sentence
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _wav_header(sample_rate: int, data_size: int) -> bytes:
+    """16 bit 单声道 PCM 的 WAV 文件头；流式输出时 data_size 未知，使用最大值。"""
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', min(36 + data_size, 0xFFFFFFFF), b'WAVE',
+        b'fmt ', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b'data', data_size,
+    )
+
+
+def tts_cache_key(text: str, model: str, sample_rate: int, audio_format: str) -> str:
+    payload = json.dumps([text, model, sample_rate, audio_format], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AudioStream:
+    """一次合成任务的音频分片缓冲：合成线程写入，多个 HTTP 消费者按批次顺序读取。"""
+
+    def __init__(self, n_parts: int, media_type: str, header: bytes, loop: asyncio.AbstractEventLoop):
+        self.media_type = media_type
+        self._header = header
+        self._parts: list[list[bytes]] = [[] for _ in range(n_parts)]
+        self._done = [False] * n_parts
+        self._failed = False
+        self._loop = loop
+        self._changed = asyncio.Event()
+
+    def push(self, idx: int, chunk: bytes) -> None:
+        """可在任意线程调用。"""
+        self._loop.call_soon_threadsafe(self._append, idx, chunk)
+
+    def _append(self, idx: int, chunk: bytes) -> None:
+        self._parts[idx].append(chunk)
+        self._changed.set()
+
+    def finish_part(self, idx: int) -> None:
+        self._done[idx] = True
+        self._changed.set()
+
+    def fail(self) -> None:
+        self._failed = True
+        self._changed.set()
+
+    @property
+    def finished(self) -> bool:
+        return self._failed or all(self._done)
+
+    async def iter_chunks(self) -> AsyncGenerator[bytes, None]:
+        if self._header:
+            yield self._header
+        for idx in range(len(self._parts)):
+            sent = 0
+            while True:
+                chunks = self._parts[idx]
+                while sent < len(chunks):
+                    yield chunks[sent]
+                    sent += 1
+                if self._done[idx] or self._failed:
+                    if self._failed and not self._done[idx]:
+                        return
+                    break
+                self._changed.clear()
+                if sent < len(self._parts[idx]) or self._done[idx] or self._failed:
+                    continue
+                try:
+                    await asyncio.wait_for(self._changed.wait(), TTS_STREAM_IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    return
+
+
+# 模块级注册表：stream_id -> AudioStream
+_audio_streams: dict[str, AudioStream] = {}
+
+def get_audio_stream(stream_id: str) -> AudioStream | None:
+    return _audio_streams.get(stream_id)
+
+
+def _synthesize_part(text: str, part_path: str, api_key: str, model: str, sample_rate: int, fmt: str, on_chunk) -> None:
+    """在后台线程中合成一个批次，音频帧到达即写入分片文件并回调 on_chunk；失败时抛出 RuntimeError。"""
+    from dashscope.audio.tts import ResultCallback, SpeechSynthesizer
+
+    class _Callback(ResultCallback):
+        def __init__(self, f):
+            self.f = f
+            self.error = None
+
+        def on_event(self, result):
+            frame = result.get_audio_frame()
+            if frame:
+                self.f.write(frame)
+                on_chunk(frame)
 
+        def on_error(self, response):
+            self.error = getattr(response, 'message', None) or str(response)
 
-def dashscope_text_to_audio_local(
+    with open(part_path, 'wb') as f:
+        callback = _Callback(f)
+        SpeechSynthesizer.call(
+            model=model,
+            text=text,
+            callback=callback,
+            api_key=api_key,
+            sample_rate=sample_rate,
+            format=fmt,
+        )
+    if callback.error:
+        raise RuntimeError(callback.error)
+    if os.path.getsize(part_path) == 0:
+        raise RuntimeError("Failed to generate audio")
+
+
+def _assemble(part_paths: list[str], file_path: str, header_fn) -> str:
+    """按顺序拼接分片文件，写入临时文件并原子替换为最终文件。"""
+    data_size = sum(os.path.getsize(p) for p in part_paths)
+    # Write to a temporary file first, flush and fsync, then
+    # atomically replace to avoid partial files or readers seeing
+    # an incompletely written file (helps on Windows when AV is
+    # scanning newly created files).
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as out:
+        if header_fn is not None:
+            out.write(header_fn(data_size))
+        for p in part_paths:
+            with open(p, 'rb') as f:
+                while True:
+                    block = f.read(1 << 16)
+                    if not block:
+                        break
+                    out.write(block)
+        try:
+            out.flush()
+            os.fsync(out.fileno())
+        except Exception:
+            # fsync may fail on some filesystems; ignore but proceed
+            pass
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def _transcode_opus(wav_path: str, file_path: str) -> str:
+    """使用 ffmpeg 把 wav 转为 opus，同样先写临时文件再原子替换。"""
+    tmp_path = file_path + '.tmp'
+    subprocess.run(
+        ['ffmpeg', '-y', '-loglevel', 'error', '-i', wav_path,
+         '-c:a', 'libopus', '-b:a', TTS_OPUS_BITRATE, '-f', 'ogg', tmp_path],
+        check=True, capture_output=True,
+    )
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def _publish(cache_path: str, out_dir: str) -> str:
+    """把缓存文件硬链接（不支持时复制）到当前会话的输出目录，返回链接后的路径。"""
+    dest = os.path.join(session_output_dir(out_dir), os.path.basename(cache_path))
+    if not os.path.exists(dest):
+        try:
+            os.link(cache_path, dest)
+        except OSError:
+            shutil.copy2(cache_path, dest)
+    return dest
+
+
+def _remove_files(paths: list[str]) -> None:
+    for p in paths:
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+async def dashscope_text_to_audio_local(
     text: str,
     api_key: str,
     model: str = "sambert-zhichu-v1",
-    sample_rate: int = 48000,
+    sample_rate: int = TTS_SAMPLE_RATE,
+    audio_format: str = TTS_FORMAT,
     output_dir: str | None = None,
 ) -> ToolResponse:
-    """将文本合成为音频，并把生成的音频保存到 output_dir。
+    """将文本合成为音频，并把生成的音频保存到 output_dir。相同文本再次合成时直接返回已缓存的文件。
+
+    Args:
+        text (str):
+            需要转换为语音的文本。
+        api_key (str):
+            DashScope API Key，已默认配置，调用工具时不需要提供。
+        model (str):
+            语音合成模型，默认 "sambert-zhichu-v1"。
+        sample_rate (int):
+            采样率，默认 16000。
+        audio_format (str):
+            输出格式，可选 "mp3"（默认）、"wav" 或 "opus"。
+        output_dir (str | None):
+            音频保存目录，已默认配置，调用工具时不需要提供。
 
-    返回值为 ToolResponse，内容包含原始的 AudioBlock（base64）以及一个
-    TextBlock，用来告知已保存文件的绝对路径。
+    Returns:
+        ToolResponse: 包含一个 TextBlock，告知已保存文件的绝对路径（合成时还附带可边合成边播放的音频流地址）。
     """
+    text = (text or '').strip()
+    batches = _split_sentences(text)
+    if not batches:
+        return ToolResponse([
+            TextBlock(type="text", text="Error: Failed to generate audio"),
+        ])
+    if audio_format not in TTS_FORMATS:
+        return ToolResponse([
+            TextBlock(type="text", text=f"Error: Unsupported audio format {audio_format}, choose from {', '.join(TTS_FORMATS)}"),
+        ])
+    if audio_format == 'opus' and shutil.which('ffmpeg') is None:
+        audio_format = 'mp3'
+
+    # ensure output dir
+    out_dir = output_dir or Config.get('OUTPUT_DIR') or os.path.abspath('./output')
+    cache_dir = os.path.join(output_root(), 'tts_cache')
     try:
-        import dashscope
+        os.makedirs(cache_dir, exist_ok=True)
+    except Exception:
+        cache_dir = os.path.abspath('.')
 
-        dashscope.api_key = api_key
+    key = tts_cache_key(text, model, sample_rate, audio_format)
+    file_path = os.path.join(cache_dir, f"tts_{key[:32]}.{audio_format}")
+    if os.path.exists(file_path):
+        # 刷新修改时间，供按时间淘汰的清理逻辑识别为最近使用
+        os.utime(file_path)
+        saved = await asyncio.to_thread(_publish, file_path, out_dir)
+        return ToolResponse(content=[
+            TextBlock(type="text", text=f"<saved_audio>{os.path.abspath(saved)}</saved_audio>"),
+        ])
 
-        res = dashscope.audio.tts.SpeechSynthesizer.call(
-            model=model,
-            text=text,
-            sample_rate=sample_rate,
-            format="wav",
-        )
+    stream_id = shortuuid.uuid()
+    part_paths = [os.path.join(cache_dir, f".tts_{stream_id}_{i}.part") for i in range(len(batches))]
+    temp_paths = list(part_paths)
 
-        audio_data = res.get_audio_data()
+    # mp3 帧可直接拼接；wav/opus 向 DashScope 请求裸 PCM，文件头在拼接/推流时自行生成
+    if audio_format == 'mp3':
+        request_format, media_type, header_fn = 'mp3', 'audio/mpeg', None
+    else:
+        request_format, media_type = 'pcm', 'audio/wav'
+        header_fn = lambda size: _wav_header(sample_rate, size)
+    loop = asyncio.get_running_loop()
+    stream = None
+    if TTS_BROWSER_STREAM:
+        stream = AudioStream(len(batches), media_type, header_fn(0xFFFFFFFF - 36) if header_fn else b'', loop)
+        _audio_streams[stream_id] = stream
+        # SSE 模式下立即把推流地址发给前端，不必等整段合成完成
+        emit('artifact', url=f'/audio/stream/{stream_id}', media='audio', stream=True)
 
-        if audio_data is not None:
-            audio_base64 = base64.b64encode(audio_data).decode("utf-8")
+    semaphore = asyncio.Semaphore(TTS_CONCURRENCY)
+    aborted = asyncio.Event()   # 某一批失败或请求被取消后，尚未开始的批次不再调用 DashScope
+    threads = []                # 已开始的合成线程：取消无法中断，删除分片前要等它们写完
 
-            # ensure output dir
-            out_dir = output_dir or Config.get('OUTPUT_DIR') or os.path.abspath('./output')
+    async def _run(idx: int, batch: str) -> None:
+        on_chunk = (lambda chunk: stream.push(idx, chunk)) if stream else (lambda chunk: None)
+        # 单次调用内的并发与全进程的 tts 并发上限同时生效
+        async with semaphore, limit('tts'):
+            if aborted.is_set():
+                return
+            part = asyncio.ensure_future(asyncio.to_thread(
+                _synthesize_part, batch, part_paths[idx], api_key, model, sample_rate, request_format, on_chunk))
+            threads.append(part)
             try:
-                os.makedirs(out_dir, exist_ok=True)
-            except Exception:
-                out_dir = os.path.abspath('.')
+                await asyncio.shield(part)
+            except BaseException:
+                # 在释放信号量之前标记，排队的批次被唤醒后不会再开始合成
+                aborted.set()
+                raise
+        if stream:
+            stream.finish_part(idx)
 
-            filename = f"tts_{shortuuid.uuid()}.wav"
-            file_path = os.path.join(out_dir, filename)
-            try:
-                # Write to a temporary file first, flush and fsync, then
-                # atomically replace to avoid partial files or readers seeing
-                # an incompletely written file (helps on Windows when AV is
-                # scanning newly created files).
-                tmp_path = file_path + '.tmp'
-                with open(tmp_path, 'wb') as f:
-                    f.write(audio_data)
-                    try:
-                        f.flush()
-                        os.fsync(f.fileno())
-                    except Exception:
-                        # fsync may fail on some filesystems; ignore but proceed
-                        pass
-                try:
-                    # os.replace is atomic on most OSes and will overwrite if exists
-                    os.replace(tmp_path, file_path)
-                except Exception:
-                    # fallback: try move
-                    try:
-                        os.rename(tmp_path, file_path)
-                    except Exception:
-                        # If saving fails, still return base64 data
-                        file_path = None
-            except Exception:
-                # If saving fails, still return base64 data
-                file_path = None
-
-            blocks = []
-            blocks.append(
-                AudioBlock(
-                    type="audio",
-                    source={
-                        "type": "base64",
-                        "media_type": "audio/wav",
-                        "data": audio_base64,
-                    },
-                )
-            )
-
-            if file_path:
-                blocks.append(
-                    TextBlock(
-                        type="text",
-                        text=f"<saved_audio>{os.path.abspath(file_path)}</saved_audio>",
-                    )
-                )
-
-            return ToolResponse(content=blocks)
+    tasks = [asyncio.ensure_future(_run(i, b)) for i, b in enumerate(batches)]
+    try:
+        await asyncio.gather(*tasks)
+        if audio_format == 'opus':
+            wav_path = os.path.join(cache_dir, f".tts_{stream_id}.wav")
+            temp_paths.append(wav_path)
+            await asyncio.to_thread(_assemble, part_paths, wav_path, header_fn)
+            await asyncio.to_thread(_transcode_opus, wav_path, file_path)
         else:
-            return ToolResponse([
-                TextBlock(type="text", text="Error: Failed to generate audio"),
-            ])
+            await asyncio.to_thread(_assemble, part_paths, file_path, header_fn)
+        saved = await asyncio.to_thread(_publish, file_path, out_dir)
     except Exception as e:
         return ToolResponse([
             TextBlock(type="text", text=f"Failed to generate audio: {str(e)}"),
         ])
+    finally:
+        # 任一批失败或请求被取消时停止其余批次，并等所有批次结束后再删除分片
+        aborted.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if threads:
+            await asyncio.wait(threads)
+        # 合成失败或请求被取消（CancelledError）时结束推流，正在播放的客户端不会一直等待
+        if stream and not stream.finished:
+            stream.fail()
+        await asyncio.to_thread(_remove_files, temp_paths)
+        if stream:
+            loop.call_later(TTS_STREAM_RETENTION, _audio_streams.pop, stream_id, None)
+    schedule_sweep()
+
+    text_out = f"<saved_audio>{os.path.abspath(saved)}</saved_audio>"
+    if stream:
+        text_out += f"<audio_stream>/audio/stream/{stream_id}</audio_stream>"
+    return ToolResponse(content=[TextBlock(type="text", text=text_out)])
@@ -0,0 +1,212 @@
+"""批量问答：把 JSONL 中的问题逐个交给路由智能体，用于提示词 / 检索改动的回归评测与批量回答。
+
+    python tools/batch_answer.py questions.jsonl -o answers.jsonl --concurrency 8 --timeout 120
+    python tools/batch_answer.py questions.jsonl -o answers.jsonl --resume      # 跳过输出中已完成的问题
+
+输入每行一个 JSON：`{"id": "q1", "question": "...", "user_id": 1}`，只有 question（或 message）必填；
+也可以是纯文本行。user_id 会作为上下文告诉智能体当前用户。生成的文件放到本次批量运行独有的随机会话目录
+`output/sessions/batch-<随机 ID>-user-<ID>/`（结果中的 session_id），与 /stream 客户端的会话互不可见。
+
+每个问题在独立的请求作用域中运行（记忆互不可见，不写入共用的对话记忆），超过 timeout 秒时取消。
+输出按完成顺序每行一个 JSON：答案、状态（ok / timeout / error）、总耗时，以及各阶段（子智能体、工具、模型调用）
+的耗时与 token 用量。服务端的 `POST /batch` 使用同一实现，以 NDJSON 流式返回。
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+from typing import AsyncContextManager, AsyncGenerator, Callable, Iterable
+
+import shortuuid
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+
+
+BATCH_CONCURRENCY = Config.get('BATCH_CONCURRENCY', 8)     # 同时处理的问题数（模型调用另受 LLM_CONCURRENCY 限制）
+BATCH_TIMEOUT = Config.get('BATCH_TIMEOUT', 180)            # 单个问题的超时（秒）
+
+
+def parse_questions(lines: Iterable[str]) -> list[dict]:
+    """解析 JSONL 输入；没有 id 的问题按行号编号。格式错误时抛出 ValueError。"""
+    items = []
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('{'):
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f'第 {lineno} 行不是合法的 JSON: {e}') from None
+        else:
+            item = {'question': line}
+        question = item.get('question') or item.get('message')
+        if not isinstance(question, str) or not question.strip():
+            raise ValueError(f'第 {lineno} 行缺少 question')
+        items.append({**item, 'id': str(item.get('id', lineno)), 'question': question})
+    return items
+
+
+def _stages(spans: list, root) -> tuple[list[dict], dict]:
+    """把请求内结束的 span 整理为按开始时间排序的阶段列表，以及按类型汇总的次数、耗时与 token。"""
+    stages, totals = [], {}
+    for s in sorted(spans, key=lambda s: s.start):
+        if s is root:
+            continue
+        stage = {
+            'kind': s.kind,
+            'name': s.name,
+            'start_ms': round((s.start - root.start) * 1000, 1),
+            'duration_ms': round(s.duration_ms, 1),
+        }
+        for key in ('agent', 'ttft_ms', 'queue_ms', 'input_tokens', 'output_tokens'):
+            if key in s.attributes:
+                stage[key] = s.attributes[key]
+        if s.error:
+            stage['error'] = s.error
+        stages.append(stage)
+
+        total = totals.setdefault(s.kind, {'count': 0, 'duration_ms': 0.0})
+        total['count'] += 1
+        total['duration_ms'] = round(total['duration_ms'] + s.duration_ms, 1)
+        if s.kind == 'llm':
+            total['input_tokens'] = total.get('input_tokens', 0) + (s.attributes.get('input_tokens') or 0)
+            total['output_tokens'] = total.get('output_tokens', 0) + (s.attributes.get('output_tokens') or 0)
+    return stages, totals
+
+
+async def answer_one(item: dict, timeout: float = BATCH_TIMEOUT, run_id: str | None = None) -> dict:
+    """回答一个问题并返回结果记录；超时与异常记录在 status / error 中，不向上抛出。
+
+    run_id 为本次批量运行的随机 ID，用于生成不可猜测的会话目录。
+    """
+    from agentscope.message import Msg
+
+    from agents.router_agent import _final_text, _get_router_agent
+    from tools.output_store import set_session
+    from tools.request_scope import run_cancellable
+    from tools.tracing import collect_spans, span
+
+    user_id = item.get('user_id')
+    message = item['question'] if user_id is None else f"（当前用户 ID：{user_id}）{item['question']}"
+    run_id = run_id or shortuuid.uuid()
+    session_id = item.get('session_id') or (f'batch-{run_id}-user-{user_id}' if user_id is not None else f'batch-{run_id}')
+    set_session(session_id)
+
+    result = {'id': item['id'], 'user_id': user_id, 'question': item['question'], 'answer': None, 'status': 'ok',
+              'session_id': session_id}
+    router = _get_router_agent()
+    with collect_spans() as spans:
+        with span('/batch', 'request', question_id=item['id'], input_chars=len(message)) as root:
+            try:
+                msg = await asyncio.wait_for(run_cancellable(router(Msg('user', message, 'user')), isolated=True), timeout)
+                result['answer'] = _final_text(msg)
+            except asyncio.TimeoutError:
+                result.update(status='timeout', error=f'超过 {timeout} 秒未完成')
+            except Exception as e:
+                result.update(status='error', error=f'{type(e).__name__}: {e}')
+            root.set(status=result['status'])
+    result['duration_ms'] = round(root.duration_ms, 1)
+    result['stages'], result['totals'] = _stages(spans, root)
+    return result
+
+
+async def answer_batch(items: list[dict], concurrency: int = BATCH_CONCURRENCY, timeout: float = BATCH_TIMEOUT,
+                       admit: Callable[[], AsyncContextManager] | None = None) -> AsyncGenerator[dict, None]:
+    """并发回答多个问题，按完成顺序产出结果；生成器提前关闭时取消未完成的问题。
+
+    admit 为每个问题开始前进入的异步上下文（服务端用它占用准入控制的运行槽位），等待时间不计入超时。
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    run_id = shortuuid.uuid()
+
+    async def run(index: int, item: dict) -> dict:
+        async with semaphore, (admit() if admit else contextlib.nullcontext()):
+            return {'index': index, **await answer_one(item, timeout, run_id)}
+
+    tasks = [asyncio.ensure_future(run(i, item)) for i, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def summarize(results: list[dict], wall_s: float) -> dict:
+    durations = sorted(r['duration_ms'] for r in results)
+    statuses = {}
+    for r in results:
+        statuses[r['status']] = statuses.get(r['status'], 0) + 1
+    summary = {'questions': len(results), 'wall_s': round(wall_s, 1), **statuses}
+    if durations:
+        summary.update(
+            mean_ms=round(statistics.mean(durations), 1),
+            p50_ms=durations[len(durations) // 2],
+            p95_ms=durations[min(len(durations) - 1, round(0.95 * (len(durations) - 1)))],
+            output_tokens=sum(r['totals'].get('llm', {}).get('output_tokens', 0) for r in results),
+        )
+    return summary
+
+
+def _done_ids(path: str) -> set[str]:
+    done = set()
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('status') == 'ok':
+                    done.add(str(record.get('id')))
+    return done
+
+
+async def run_file(input_path: str, output_path: str, concurrency: int, timeout: float, resume: bool) -> dict:
+    from tools.model_client import close_http_session
+
+    with open(input_path, 'r', encoding='utf-8') as f:
+        items = parse_questions(f)
+    if resume:
+        done = _done_ids(output_path)
+        items = [item for item in items if item['id'] not in done]
+    print(f'{len(items)} 个问题，并发 {concurrency}，超时 {timeout}s')
+
+    results = []
+    start = time.perf_counter()
+    try:
+        with open(output_path, 'a' if resume else 'w', encoding='utf-8') as out:
+            async for result in answer_batch(items, concurrency, timeout):
+                out.write(json.dumps(result, ensure_ascii=False, default=str) + '\n')
+                out.flush()
+                results.append(result)
+                print(f"[{len(results)}/{len(items)}] {result['id']} {result['status']} {result['duration_ms'] / 1000:.1f}s")
+    finally:
+        await close_http_session()
+    return summarize(results, time.perf_counter() - start)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='批量问答（回归评测 / 批量回答）')
+    parser.add_argument('input', help='问题 JSONL 文件')
+    parser.add_argument('-o', '--output', help='结果 JSONL 文件（默认 <输入>.answers.jsonl）')
+    parser.add_argument('--concurrency', type=int, default=BATCH_CONCURRENCY, help='同时处理的问题数')
+    parser.add_argument('--timeout', type=float, default=BATCH_TIMEOUT, help='单个问题的超时（秒）')
+    parser.add_argument('--resume', action='store_true', help='追加写入输出文件，跳过其中已成功的问题')
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.input)[0] + '.answers.jsonl'
+    summary = asyncio.run(run_file(args.input, output, args.concurrency, args.timeout, args.resume))
+    print(json.dumps(summary, ensure_ascii=False))
+    print(f'结果已写入 {output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
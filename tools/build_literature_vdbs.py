@@ -0,0 +1,87 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from config import Config
+from tools.vdbs_utils import load_index, get_embeddings, save_index, split_text
+
+
+LITERATURE_KNOWLEDGE_COLLECTION = Config.get('LITERATURE_KNOWLEDGE_COLLECTION', 'literature_knowledge')
+
+
+def ingest_pubmed_articles(articles: list[dict],
+                           vdbs_path: str = Config['VDBS_PATH'],
+                           collection_name: str = LITERATURE_KNOWLEDGE_COLLECTION) -> int:
+    """把 PubMed 文章（标题 + 摘要）切分后写入文献知识库，已入库的 PMID 会被跳过。
+
+    Returns:
+        int: 本次新入库的文章数。
+    """
+    from tools.vector_store import get_vector_store, ingest_lock
+
+    # 只读后端（lite）不在服务进程中写入，文献在下次导出索引前仅联网检索
+    if get_vector_store(vdbs_path).read_only:
+        return 0
+    with ingest_lock(vdbs_path):
+        index_file = os.path.join(vdbs_path, 'indexed_pmids.json')
+        indexed = load_index(index_file)
+
+        new_articles = [a for a in articles if a.get('abstract') and str(a['pmid']) not in indexed]
+        if not new_articles:
+            return 0
+
+        docs = []
+        for a in new_articles:
+            pmid = str(a['pmid'])
+            text = f"{a.get('title', '')}\n{a['abstract']}"
+            docs.extend(split_text(text, {
+                'source': f"PMID:{pmid}",
+                'pmid': pmid,
+                'title': a.get('title', ''),
+                'journal': a.get('journal', ''),
+            }))
+
+        get_vector_store(vdbs_path).add_documents(collection_name, docs)
+
+        indexed.update(str(a['pmid']) for a in new_articles)
+        save_index(index_file, indexed)
+        return len(new_articles)
+
+
+def search_local_literature(query: str,
+                            k: int = 8,
+                            vdbs_path: str = Config['VDBS_PATH'],
+                            collection_name: str = LITERATURE_KNOWLEDGE_COLLECTION) -> list[tuple[dict, float]]:
+    """在本地文献知识库中检索，按文章聚合片段，返回 [(文章信息, 最高相似度), ...]（降序）。
+
+    文献库尚未建立时返回空列表。
+    """
+    from tools.vector_store import get_vector_store
+
+    if not os.path.exists(os.path.join(vdbs_path, 'indexed_pmids.json')):
+        return []
+    vector = get_embeddings().embed_query(query)
+    try:
+        results = get_vector_store(vdbs_path).search(collection_name, vector, k)
+    except Exception:
+        return []
+
+    articles: dict[str, tuple[dict, float]] = {}
+    for doc, score in results:
+        meta = doc.metadata or {}
+        pmid = meta.get('pmid')
+        if not pmid:
+            continue
+        if pmid in articles:
+            article, best = articles[pmid]
+            article['snippets'].append(doc.page_content)
+            articles[pmid] = (article, max(best, score))
+        else:
+            articles[pmid] = ({
+                'pmid': pmid,
+                'title': meta.get('title', ''),
+                'journal': meta.get('journal', ''),
+                'snippets': [doc.page_content],
+            }, score)
+
+    return sorted(articles.values(), key=lambda item: item[1], reverse=True)
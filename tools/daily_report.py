@@ -0,0 +1,326 @@
+"""每日健康摘要的批量生成：在夜间低峰期为健康数据库中的每个用户预先生成报告，早上直接读取。
+
+    python tools/daily_report.py                        # 以今天为报告日期，为所有用户生成
+    python tools/daily_report.py --date 2026-10-18 --users 1,2 --tts
+
+每个用户的报告包含昨晚的睡眠、前一天的步数与心率，以及与此前 `REPORT_BASELINE_DAYS` 天均值的比较；
+指标由现有的数据库解析函数计算，摘要文本由模型生成（`AGENT_MODELS['report']`，同时最多
+`REPORT_CONCURRENCY` 个用户在调用模型），模型调用失败时退回固定模板。可选生成图表与语音
+（`REPORT_CHARTS` / `REPORT_TTS`），文件写入 `output/reports/<日期>/`。
+
+报告保存为 `REPORT_DIR/<日期>/user_<ID>.json`，由 `GET /report?user_id=<ID>[&date=<日期>]` 读取。
+用 cron / 任务计划程序在夜间运行本脚本即可；超过 `REPORT_RETENTION_DAYS` 天的报告在每次运行后删除。
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING
+
+_ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, _ROOT)
+from config import Config
+from prompt import PROMPT
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+REPORT_DIR = Config.get('REPORT_DIR') or os.path.join(_ROOT, 'data', 'reports')
+REPORT_CONCURRENCY = Config.get('REPORT_CONCURRENCY', 4)        # 同时生成摘要的用户数
+REPORT_BASELINE_DAYS = Config.get('REPORT_BASELINE_DAYS', 14)   # 基线均值的统计天数
+REPORT_CHARTS = Config.get('REPORT_CHARTS', True)               # 是否生成睡眠分期 / 步数 / 静息心率图表
+REPORT_TTS = Config.get('REPORT_TTS', False)                    # 是否把摘要合成为语音
+REPORT_RETENTION_DAYS = Config.get('REPORT_RETENTION_DAYS', 30)
+
+REPORT_AGENT = 'report'
+CHART_DAYS = 14
+
+SLEEP_METRICS = {
+    'TOTAL_DURATION': '总睡眠（分钟）',
+    'DEEP_SLEEP_DURATION': '深睡（分钟）',
+    'LIGHT_SLEEP_DURATION': '浅睡（分钟）',
+    'REM_SLEEP_DURATION': '快速眼动（分钟）',
+    'AWAKE_DURATION': '清醒（分钟）',
+}
+DAILY_METRICS = {
+    'STEPS': '步数',
+    'HR_RESTING': '静息心率',
+    'HR_AVG': '平均心率',
+    'HR_MAX': '最大心率',
+    'HR_MIN': '最小心率',
+}
+
+_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+# ---------------------------------------------------------------- 指标
+
+def _by_day(df: "pd.DataFrame", column: str) -> "pd.DataFrame":
+    """按日期列排序并添加 DAY 列（datetime.date），无法解析的行丢弃。"""
+    import pandas as pd
+
+    df = df.copy()
+    df['DAY'] = pd.to_datetime(df[column], errors='coerce').dt.date
+    return df.dropna(subset=['DAY']).sort_values('DAY')
+
+
+def _compare(record: "pd.Series", history: "pd.DataFrame", fields: dict[str, str]) -> dict:
+    out = {}
+    for col, label in fields.items():
+        if col not in record or record[col] is None or record[col] != record[col]:
+            continue
+        value = float(record[col])
+        base = history[col].dropna().astype(float) if col in history else []
+        entry = {'label': label, 'value': round(value, 1)}
+        if len(base):
+            mean = float(base.mean())
+            entry.update(baseline=round(mean, 1), delta=round(value - mean, 1),
+                         delta_pct=round((value - mean) / mean * 100, 1) if mean else None)
+        out[col] = entry
+    return out
+
+
+def _latest(df: "pd.DataFrame", before: date) -> tuple["pd.Series | None", "pd.DataFrame"]:
+    """返回 DAY <= before 的最后一条记录，以及它之前 REPORT_BASELINE_DAYS 天内的记录。"""
+    df = df[df['DAY'] <= before]
+    if df.empty:
+        return None, df
+    record = df.iloc[-1]
+    start = record['DAY'] - timedelta(days=REPORT_BASELINE_DAYS)
+    return record, df[(df['DAY'] >= start) & (df['DAY'] < record['DAY'])]
+
+
+def compute_metrics(sleep: "pd.DataFrame", daily: "pd.DataFrame", user_id: int, day: date) -> dict | None:
+    """计算一个用户在报告日期 day 的指标：醒来日期不晚于 day 的最近一晚睡眠，day 之前最近一天的汇总。
+
+    sleep / daily 为 `_by_day` 处理过的全量数据；该用户没有任何记录时返回 None。
+    """
+    night, night_history = _latest(sleep[sleep['USER_ID'] == user_id], day)
+    summary, summary_history = _latest(daily[daily['USER_ID'] == user_id], day - timedelta(days=1))
+    if night is None and summary is None:
+        return None
+    metrics = {'user_id': user_id, 'date': day.isoformat(), 'baseline_days': REPORT_BASELINE_DAYS}
+    if night is not None:
+        metrics['sleep'] = {
+            'night': night['DAY'].isoformat(),
+            'bedtime': night.get('SLEEP_TIME'),
+            'wakeup': night.get('WAKEUP_TIME'),
+            'metrics': _compare(night, night_history, SLEEP_METRICS),
+        }
+    if summary is not None:
+        metrics['activity'] = {
+            'day': summary['DAY'].isoformat(),
+            'metrics': _compare(summary, summary_history, DAILY_METRICS),
+        }
+    return metrics
+
+
+def load_metrics(day: date, users: list[int] | None = None) -> dict[int, dict]:
+    """读取睡眠与日常汇总表，返回 {用户 ID: 指标}；数据库或表不存在时抛出 LookupError。"""
+    from tools.parse_heart_rate_db import load_heart_rate_df
+    from tools.parse_sleep_db import load_sleep_df
+
+    sleep = _by_day(load_sleep_df(), 'WAKEUP_TIME')
+    daily = _by_day(load_heart_rate_df(), 'TIMESTAMP')
+    if users is None:
+        users = sorted({int(u) for u in sleep['USER_ID'].dropna()} | {int(u) for u in daily['USER_ID'].dropna()})
+    result = {}
+    for user_id in users:
+        metrics = compute_metrics(sleep, daily, user_id, day)
+        if metrics is not None:
+            result[user_id] = metrics
+    return result
+
+
+# ---------------------------------------------------------------- 摘要
+
+def _describe(entry: dict) -> str:
+    text = f"{entry['label']} {entry['value']:g}"
+    if entry.get('delta_pct') is not None:
+        text += f"（较基线 {entry['delta_pct']:+g}%）"
+    return text
+
+
+def fallback_summary(metrics: dict) -> str:
+    """模型不可用时的模板摘要。"""
+    parts = []
+    if 'sleep' in metrics:
+        parts.append(f"{metrics['sleep']['night']} 夜间睡眠：" + '，'.join(_describe(e) for e in metrics['sleep']['metrics'].values()))
+    if 'activity' in metrics:
+        parts.append(f"{metrics['activity']['day']} 日常活动：" + '，'.join(_describe(e) for e in metrics['activity']['metrics'].values()))
+    return '。\n'.join(parts) + '。'
+
+
+async def summarize(model, metrics: dict) -> str:
+    from agentscope.formatter import DashScopeChatFormatter
+    from agentscope.message import Msg
+
+    messages = await DashScopeChatFormatter().format([
+        Msg('system', PROMPT['daily_report_sys_prompt'], 'system'),
+        Msg('user', json.dumps(metrics, ensure_ascii=False, default=str), 'user'),
+    ])
+    res = await model(messages)
+    text = ''.join(b.get('text', '') for b in res.content if b.get('type') == 'text').strip()
+    if not text:
+        raise ValueError('模型返回了空摘要')
+    return text
+
+
+async def render_assets(user_id: int, day: date, summary: str, charts: bool, tts: bool) -> dict:
+    """生成图表与语音，返回 {'charts': [地址], 'audio': 地址或 None}；失败的项目跳过。"""
+    from tools.output_store import find_artifacts, output_root
+
+    out_dir = os.path.join(output_root(), 'reports', day.isoformat())
+    os.makedirs(out_dir, exist_ok=True)
+    assets = {'charts': [], 'audio': None}
+    if charts:
+        from tools.render_chart import render_chart
+
+        for chart in ('sleep_stages', 'steps', 'resting_hr'):
+            spec = {'chart': chart, 'user_id': user_id, 'end': day.isoformat(), 'last_n': CHART_DAYS,
+                    'filename': f'user_{user_id}_{chart}.png'}
+            res = await render_chart(json.dumps(spec), output_dir=out_dir)
+            assets['charts'].extend(find_artifacts(res.content[0]['text']))
+    if tts:
+        from tools.audio_wrapper import dashscope_text_to_audio_local
+
+        res = await dashscope_text_to_audio_local(summary, api_key=Config['API_KEY'], output_dir=out_dir)
+        urls = find_artifacts(res.content[0]['text'])
+        assets['audio'] = urls[0] if urls else None
+    return assets
+
+
+# ---------------------------------------------------------------- 存储
+
+def report_path(user_id: int, day: date | str) -> str:
+    day = day if isinstance(day, str) else day.isoformat()
+    return os.path.join(REPORT_DIR, day, f'user_{int(user_id)}.json')
+
+
+def save_report(report: dict) -> str:
+    path = report_path(report['user_id'], report['date'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def load_report(user_id: int, day: str | None = None) -> dict | None:
+    """读取指定日期（默认最近一天）的报告；已被输出目录清理删除的图表 / 语音地址会被去掉。"""
+    from tools.output_store import resolve_output_path
+
+    if day is None:
+        if not os.path.isdir(REPORT_DIR):
+            return None
+        days = sorted((d for d in os.listdir(REPORT_DIR) if _DATE_RE.match(d)), reverse=True)
+        day = next((d for d in days if os.path.exists(report_path(user_id, d))), None)
+        if day is None:
+            return None
+    elif not _DATE_RE.match(day):
+        raise ValueError(f'日期格式应为 YYYY-MM-DD: {day}')
+    try:
+        with open(report_path(user_id, day), 'r', encoding='utf-8') as f:
+            report = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    def exists(url):
+        return url and resolve_output_path(url[len('/output/'):]) is not None
+
+    report['charts'] = [u for u in report.get('charts', []) if exists(u)]
+    report['audio'] = report.get('audio') if exists(report.get('audio')) else None
+    return report
+
+
+def prune_reports(keep_days: int = REPORT_RETENTION_DAYS, today: date | None = None) -> int:
+    if not os.path.isdir(REPORT_DIR):
+        return 0
+    cutoff = ((today or date.today()) - timedelta(days=keep_days)).isoformat()
+    removed = 0
+    for name in os.listdir(REPORT_DIR):
+        if _DATE_RE.match(name) and name < cutoff:
+            shutil.rmtree(os.path.join(REPORT_DIR, name), ignore_errors=True)
+            removed += 1
+    return removed
+
+
+# ---------------------------------------------------------------- 批量生成
+
+async def generate_reports(day: date, users: list[int] | None = None, concurrency: int = REPORT_CONCURRENCY,
+                           charts: bool = REPORT_CHARTS, tts: bool = REPORT_TTS) -> list[dict]:
+    """为每个用户生成并保存报告，返回报告列表；单个用户失败不影响其他用户。"""
+    from tools.model_client import get_chat_model, model_settings
+    from tools.tracing import span
+
+    all_metrics = await asyncio.to_thread(load_metrics, day, users)
+    model = get_chat_model(REPORT_AGENT, stream=False)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(user_id: int, metrics: dict) -> dict:
+        async with semaphore:
+            with span('daily_report', 'request', user_id=user_id, date=day.isoformat()) as s:
+                report = {
+                    'user_id': user_id,
+                    'date': day.isoformat(),
+                    'model': model_settings(REPORT_AGENT)['model'],
+                    'status': 'ok',
+                    'metrics': metrics,
+                }
+                try:
+                    report['summary'] = await summarize(model, metrics)
+                except Exception as e:
+                    report.update(status='fallback', error=f'{type(e).__name__}: {e}', summary=fallback_summary(metrics))
+                try:
+                    report.update(await render_assets(user_id, day, report['summary'], charts, tts))
+                except Exception as e:
+                    report.setdefault('error', f'{type(e).__name__}: {e}')
+                report['generated_at'] = datetime.now().isoformat(timespec='seconds')
+                await asyncio.to_thread(save_report, report)
+                s.set(status=report['status'])
+                return report
+
+    return await asyncio.gather(*(run(u, m) for u, m in all_metrics.items()))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='批量生成每日健康摘要')
+    parser.add_argument('--date', help='报告日期 YYYY-MM-DD（默认今天）')
+    parser.add_argument('--users', help='只为指定用户生成，逗号分隔的用户 ID')
+    parser.add_argument('--concurrency', type=int, default=REPORT_CONCURRENCY, help='同时生成摘要的用户数')
+    parser.add_argument('--charts', action=argparse.BooleanOptionalAction, default=REPORT_CHARTS, help='生成图表')
+    parser.add_argument('--tts', action=argparse.BooleanOptionalAction, default=REPORT_TTS, help='把摘要合成为语音')
+    args = parser.parse_args()
+
+    day = date.fromisoformat(args.date) if args.date else date.today()
+    users = [int(u) for u in args.users.split(',')] if args.users else None
+    start = time.perf_counter()
+    async def run() -> list[dict]:
+        from tools.model_client import close_http_session
+
+        try:
+            return await generate_reports(day, users, args.concurrency, args.charts, args.tts)
+        finally:
+            await close_http_session()
+
+    try:
+        reports = asyncio.run(run())
+    except LookupError as e:
+        print(e)
+        return 1
+    for r in reports:
+        print(f"user {r['user_id']:<6} {r['status']:9s} 图表 {len(r.get('charts', []))} 个"
+              + (f"  {r['error']}" if r.get('error') else ''))
+    print(f'{day}: {len(reports)} 份报告，用时 {time.perf_counter() - start:.1f}s，清理过期报告 {prune_reports(today=day)} 天')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
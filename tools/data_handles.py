@@ -0,0 +1,93 @@
+"""查询结果句柄：把查询工具得到的 DataFrame 落盘到 data/cache/data_handles，供作图沙箱按名称直接加载。
+
+数据以 Arrow IPC（Feather）格式保存，读取时可内存映射；未安装 pyarrow 时退回 pickle。
+句柄文件包含原始健康数据，不放在通过 `/output/` 对外提供的输出目录中。
+这样大段时间序列无需经过 LLM 复制成代码即可传到作图步骤。
+"""
+import os
+import re
+import sys
+import time
+from typing import TYPE_CHECKING
+
+import shortuuid
+
+_ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, _ROOT)
+from config import Config
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+DATA_HANDLE_TTL = Config.get('DATA_HANDLE_TTL', 24 * 3600)   # 句柄文件保留时长（秒）
+DATA_PREVIEW_ROWS = Config.get('DATA_PREVIEW_ROWS', 10)       # 已登记句柄的结果集只返回首尾各这么多行
+
+_HANDLE_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_EXTENSIONS = ('.arrow', '.pkl')
+
+
+def handle_dir() -> str:
+    return Config.get('DATA_HANDLE_DIR') or os.path.join(_ROOT, 'data', 'cache', 'data_handles')
+
+
+def _cleanup_expired(directory: str) -> None:
+    now = time.time()
+    for fname in os.listdir(directory):
+        path = os.path.join(directory, fname)
+        try:
+            if now - os.path.getmtime(path) > DATA_HANDLE_TTL:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def register_frame(df: "pd.DataFrame", prefix: str) -> str:
+    """保存 DataFrame 并返回句柄名；句柄名同时是合法的 Python 标识符，可直接作为变量名。"""
+    directory = handle_dir()
+    os.makedirs(directory, exist_ok=True)
+    _cleanup_expired(directory)
+
+    handle = f"{prefix}_{shortuuid.uuid()[:8]}"
+    df = df.reset_index(drop=True)
+    try:
+        # 不压缩，读取时才能直接内存映射
+        df.to_feather(os.path.join(directory, handle + '.arrow'), compression='uncompressed')
+    except ImportError:
+        df.to_pickle(os.path.join(directory, handle + '.pkl'))
+    return handle
+
+
+def preview_frame(df: "pd.DataFrame", handle: str, rows: int = DATA_PREVIEW_ROWS) -> str:
+    """已登记为句柄的结果集返回给模型的文本：首尾若干行与数值列统计，完整数据通过句柄读取。"""
+    if len(df) <= 2 * rows:
+        return df.to_string()
+    parts = [
+        f"前 {rows} 行:\n{df.head(rows).to_string()}",
+        f"后 {rows} 行:\n{df.tail(rows).to_string()}",
+    ]
+    numeric = df.select_dtypes('number')
+    if not numeric.empty:
+        parts.append(f"数值列统计:\n{numeric.describe().round(2).to_string()}")
+    parts.append(f"（共 {len(df)} 行，此处只列出首尾 {rows} 行；完整数据请把数据句柄 {handle} 传给代码执行工具的 data_handles 参数读取）")
+    return '\n\n'.join(parts)
+
+
+def resolve_handle(handle: str) -> str:
+    """返回句柄对应的文件路径；句柄不合法或已过期时抛出 LookupError。"""
+    if not _HANDLE_RE.match(handle or ''):
+        raise LookupError(f"非法的数据句柄: {handle}")
+    for ext in _EXTENSIONS:
+        path = os.path.join(handle_dir(), handle + ext)
+        if os.path.exists(path):
+            return path
+    raise LookupError(f"数据句柄不存在或已过期: {handle}")
+
+
+def load_frame(path: str) -> "pd.DataFrame":
+    import pandas as pd
+
+    if path.endswith('.arrow'):
+        from pyarrow import feather
+        return feather.read_table(path, memory_map=True).to_pandas()
+    return pd.read_pickle(path)
@@ -0,0 +1,450 @@
+"""预热的 Python 执行进程池。
+
+每个 worker 进程启动时预先导入 matplotlib（Agg 后端）、numpy、pandas 并注册中文字体，
+之后通过 Pipe 接收代码，在独立的命名空间和工作目录中执行，避免每次作图都重新启动解释器。
+worker 执行满 `EXEC_POOL_MAX_JOBS` 次、超时、异常退出或所属请求被取消后会被回收并在后台补充新的进程；
+补充失败时记录日志并退避重试。等待空闲 worker 超过 `EXEC_POOL_WAIT` 秒时抛出 PoolUnavailable，
+调用方改用一次性子进程执行。阻塞等待在进程池专用的线程池中进行，不占用默认的 to_thread 线程。
+
+沙箱的资源上限（进程池与独立子进程两种模式共用）：
+    - 标准输出 / 错误各保留开头与结尾共 `EXEC_OUTPUT_MAX_BYTES`，中间部分只计数并以截断标记代替；
+    - 地址空间 `EXEC_MEMORY_LIMIT_MB`、单个任务的 CPU 时间 `EXEC_CPU_LIMIT` 秒、写入文件大小 `EXEC_FILE_LIMIT_MB`
+      （POSIX 上通过 rlimit 限制，Windows 上不生效）；
+    - 执行进程位于独立的进程组中，超时或取消时连同它启动的子进程一起结束。
+"""
+import asyncio
+import builtins
+import concurrent.futures
+import contextlib
+import contextvars
+import io
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import traceback
+from typing import NamedTuple
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+
+
+EXEC_POOL_SIZE = Config.get('EXEC_POOL_SIZE', 2)            # 常驻 worker 数，0 表示禁用进程池
+EXEC_POOL_MAX_JOBS = Config.get('EXEC_POOL_MAX_JOBS', 20)   # 单个 worker 最多执行的任务数
+EXEC_POOL_WAIT = Config.get('EXEC_POOL_WAIT', 30)           # 等待空闲 worker 的上限（秒），超时后改用一次性子进程
+EXEC_POOL_SPAWN_BACKOFF = 30                                # 启动 worker 失败后重试间隔的上限（秒）
+EXEC_OUTPUT_MAX_BYTES = Config.get('EXEC_OUTPUT_MAX_BYTES', 16 * 1024)  # 每个输出流返回给模型的上限（进程池模式按字符计）
+EXEC_MEMORY_LIMIT_MB = Config.get('EXEC_MEMORY_LIMIT_MB', 2048)         # 执行进程的地址空间上限，0 为不限制
+EXEC_CPU_LIMIT = Config.get('EXEC_CPU_LIMIT', 120)                      # 单个任务的 CPU 时间上限（秒），0 为不限制
+EXEC_FILE_LIMIT_MB = Config.get('EXEC_FILE_LIMIT_MB', 256)              # 单个写入文件的大小上限，0 为不限制
+
+FONT_CANDIDATES = [
+    r"C:\Windows\Fonts\msyh.ttc",
+    r"C:\Windows\Fonts\msyh.ttf",
+    r"C:\Windows\Fonts\simhei.ttf",
+    r"C:\Windows\Fonts\simsun.ttc",
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolUnavailable(RuntimeError):
+    """在 EXEC_POOL_WAIT 秒内没有可用的 worker（worker 启动失败或全部忙碌），或 worker 在返回结果前意外退出。"""
+
+
+class ExecResult(NamedTuple):
+    returncode: int
+    stdout: str
+    stderr: str
+    output_bytes: int = 0       # 截断前两个输出流的总长度
+    truncated: bool = False
+    timed_out: bool = False
+
+
+class OutputCap(io.TextIOBase):
+    """有上限的输出缓冲：保留开头与结尾各一半，中间超出的部分只计数。
+
+    既可作为 redirect_stdout 的目标（写入 str），也可累积子进程管道读到的 bytes。
+    """
+
+    encoding = 'utf-8'
+
+    def __init__(self, limit: int = EXEC_OUTPUT_MAX_BYTES):
+        super().__init__()
+        self.total = 0
+        self._head_limit = limit // 2
+        self._tail_limit = limit - self._head_limit
+        self._head = []
+        self._head_len = 0
+        self._tail = []
+        self._tail_len = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data):
+        size = len(data)
+        self.total += size
+        room = self._head_limit - self._head_len
+        if room > 0:
+            self._head.append(data[:room])
+            self._head_len += min(room, size)
+            data = data[room:]
+        if data:
+            self._tail.append(data)
+            self._tail_len += len(data)
+            # 摊还裁剪：累积到两倍上限再合并，避免大量小写入时反复拷贝
+            if self._tail_len > 2 * self._tail_limit:
+                tail = data[:0].join(self._tail)[-self._tail_limit:]
+                self._tail, self._tail_len = [tail], len(tail)
+        return size
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > self._head_limit + self._tail_limit
+
+    def getvalue(self) -> str:
+        if not self._head:
+            return ''
+        empty = self._head[0][:0]
+        head = empty.join(self._head)
+        tail = empty.join(self._tail)[-self._tail_limit:] if self._tail_limit else empty
+        omitted = self.total - len(head) - len(tail)
+        if isinstance(head, bytes):
+            head = head.decode('utf-8', errors='replace')
+            tail = tail.decode('utf-8', errors='replace')
+        if omitted <= 0:
+            return head + tail
+        return f"{head}\n...[输出过长，已省略中间 {omitted} 字节]...\n{tail}"
+
+
+def set_resource_limits(cpu_seconds: float = EXEC_CPU_LIMIT) -> None:
+    """在执行进程内设置地址空间、CPU 时间与写入文件大小上限（POSIX）。
+
+    CPU 上限以当前已用时间为起点，预热的 worker 在每个任务开始前调用，超出时进程收到 SIGXCPU 结束。
+    """
+    if resource is None:
+        return
+
+    def lower(limit, value):
+        soft, hard = resource.getrlimit(limit)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        resource.setrlimit(limit, (value, hard))
+
+    if EXEC_MEMORY_LIMIT_MB:
+        lower(resource.RLIMIT_AS, EXEC_MEMORY_LIMIT_MB * 1024 ** 2)
+    if EXEC_FILE_LIMIT_MB:
+        lower(resource.RLIMIT_FSIZE, EXEC_FILE_LIMIT_MB * 1024 ** 2)
+    if cpu_seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        lower(resource.RLIMIT_CPU, int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1)
+
+
+def resource_limits_prefix(cpu_seconds: float = EXEC_CPU_LIMIT) -> str:
+    """生成在脚本最开头设置资源上限的代码（POSIX），供一次性子进程使用。
+
+    服务进程是多线程的，fork 之后、exec 之前运行 Python 代码（preexec_fn）可能在其他线程持有的锁上死锁，
+    所以由子进程自己在执行任何其他代码之前设置上限。
+    """
+    if resource is None:
+        return ''
+    lines = [
+        'import resource as _resource',
+        'def _lower(limit, value):',
+        '    soft, hard = _resource.getrlimit(limit)',
+        '    if hard != _resource.RLIM_INFINITY:',
+        '        value = min(value, hard)',
+        '    _resource.setrlimit(limit, (value, hard))',
+    ]
+    if EXEC_MEMORY_LIMIT_MB:
+        lines.append(f'_lower(_resource.RLIMIT_AS, {int(EXEC_MEMORY_LIMIT_MB * 1024 ** 2)})')
+    if EXEC_FILE_LIMIT_MB:
+        lines.append(f'_lower(_resource.RLIMIT_FSIZE, {int(EXEC_FILE_LIMIT_MB * 1024 ** 2)})')
+    if cpu_seconds:
+        lines.append(f'_lower(_resource.RLIMIT_CPU, {int(cpu_seconds) + 1})')
+    lines.append('del _lower, _resource')
+    return '\n'.join(lines) + '\n'
+
+
+def kill_process_group(pid: int) -> None:
+    """结束以 pid 为组长的进程组（进程用 setsid 或 start_new_session 启动）；进程组不存在时忽略。"""
+    if os.name != 'posix':
+        return
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def signal_message(returncode: int | None) -> str | None:
+    """资源上限导致进程被信号结束时的说明。"""
+    if os.name != 'posix' or returncode is None:
+        return None
+    if returncode == -signal.SIGXCPU:
+        return f"ResourceError: CPU time limit exceeded ({EXEC_CPU_LIMIT} seconds)."
+    if returncode == -signal.SIGXFSZ:
+        return f"ResourceError: output file size limit exceeded ({EXEC_FILE_LIMIT_MB} MB)."
+    return None
+
+
+def register_chinese_font() -> None:
+    """尝试注册常见中文字体并设为默认无衬线字体（尽量静默失败）。"""
+    import matplotlib
+    import matplotlib.font_manager as fm
+
+    candidates = [Config['CHINESE_FONT_PATH']] if Config.get('CHINESE_FONT_PATH') else []
+    for _p in candidates + FONT_CANDIDATES:
+        try:
+            if os.path.exists(_p):
+                fm.fontManager.addfont(_p)
+                fp = fm.FontProperties(fname=_p)
+                matplotlib.rcParams['font.sans-serif'] = [fp.get_name()]
+                matplotlib.rcParams['axes.unicode_minus'] = False
+                break
+        except Exception:
+            pass
+
+
+def _configure_matplotlib():
+    """设置 matplotlib 无头后端并注册中文字体。"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    plt.ioff()
+    register_chinese_font()
+    return matplotlib, plt
+
+
+def _worker_main(conn) -> None:
+    """worker 进程入口：预热后循环接收 (code, cwd, frames)，返回 (returncode, stdout, stderr, 输出总长度, 是否截断)。
+
+    frames 为 {变量名: 数据句柄文件路径}，执行前加载为同名 DataFrame 注入命名空间。
+    """
+    if hasattr(os, 'setsid'):
+        os.setsid()     # 独立进程组：回收 worker 时连同用户代码启动的子进程一起结束
+    set_resource_limits(cpu_seconds=0)
+    matplotlib, plt = _configure_matplotlib()
+    import numpy  # noqa: F401  预热导入
+    import pandas  # noqa: F401  预热导入
+    from tools.data_handles import load_frame
+
+    base_rc = matplotlib.rcParams.copy()
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+
+        code, cwd, frames = job
+        set_resource_limits()
+        stdout, stderr = OutputCap(), OutputCap()
+        returncode = 0
+        old_cwd = os.getcwd()
+        namespace = {
+            '__name__': '__main__',
+            '__file__': os.path.join(cwd, '__main__.py'),
+            '__builtins__': builtins,
+        }
+        try:
+            os.chdir(cwd)
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                try:
+                    data_frames = {name: load_frame(path) for name, path in frames.items()}
+                    namespace['DATA_HANDLES'] = data_frames
+                    namespace.update(data_frames)
+                    exec(compile(code, '<user_code>', 'exec'), namespace)
+                except SystemExit as e:
+                    if e.code is None or isinstance(e.code, int):
+                        returncode = e.code or 0
+                    else:
+                        print(e.code, file=sys.stderr)
+                        returncode = 1
+                except BaseException:
+                    # 跳过 worker 自身的栈帧，只保留用户代码的回溯
+                    etype, value, tb = sys.exc_info()
+                    traceback.print_exception(etype, value, tb.tb_next)
+                    returncode = 1
+        finally:
+            # 清理上一次任务遗留的图像与全局样式
+            plt.close('all')
+            matplotlib.rcParams.update(base_rc)
+            os.chdir(old_cwd)
+
+        try:
+            conn.send((returncode, stdout.getvalue(), stderr.getvalue(),
+                       stdout.total + stderr.total, stdout.truncated or stderr.truncated))
+        except (EOFError, OSError):
+            break
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    def kill(self) -> None:
+        if self.process.pid is not None:
+            kill_process_group(self.process.pid)
+        if self.process.is_alive():
+            self.process.kill()
+
+    def close(self) -> None:
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        self.kill()
+        self.process.join(timeout=5)
+
+
+class _Job:
+    """一次执行任务；取消时结束正在运行它的 worker，阻塞等待的线程随即收到 EOFError 并回收该 worker。"""
+
+    def __init__(self):
+        self.worker: _Worker | None = None
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def attach(self, worker: _Worker) -> bool:
+        with self._lock:
+            if self.cancelled:
+                return False
+            self.worker = worker
+            return True
+
+    def detach(self) -> None:
+        """worker 归还进程池前调用，之后的取消不再影响它。"""
+        with self._lock:
+            self.worker = None
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            if self.worker is not None:
+                self.worker.kill()
+
+
+class ExecPool:
+    """线程安全的预热进程池；阻塞等待在线程中完成，对事件循环无依赖。"""
+
+    def __init__(self, size: int = EXEC_POOL_SIZE, max_jobs: int = EXEC_POOL_MAX_JOBS, wait: float = EXEC_POOL_WAIT):
+        from tools.limits import RESOURCE_LIMITS
+
+        self._ctx = multiprocessing.get_context('spawn')
+        self._size = size
+        self._max_jobs = max_jobs
+        self._wait = wait
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        # 同时等待 worker 的调用数受 sandbox 并发上限约束，线程数与之相同即可
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(RESOURCE_LIMITS['sandbox'], 1), thread_name_prefix='exec_pool')
+        self.spawn_failures = 0
+        for _ in range(size):
+            self._spawn_async()
+
+    def _spawn(self) -> None:
+        """启动一个 worker，失败时按指数退避一直重试（其间沙箱调用等待超时后改用一次性子进程）。"""
+        delay = 0.5
+        while True:
+            try:
+                self._idle.put(_Worker(self._ctx))
+                return
+            except Exception:
+                self.spawn_failures += 1
+                logger.exception('启动执行 worker 失败，%.1f 秒后重试', delay)
+                time.sleep(delay)
+                delay = min(delay * 2, EXEC_POOL_SPAWN_BACKOFF)
+
+    def _spawn_async(self) -> None:
+        """在后台线程中启动新的 worker，避免调用方等待进程创建。"""
+        threading.Thread(target=self._spawn, daemon=True).start()
+
+    def _retire(self, worker: _Worker) -> None:
+        worker.close()
+        self._spawn_async()
+
+    def _acquire(self) -> _Worker:
+        """取出一个存活的空闲 worker；超过等待上限时抛出 PoolUnavailable。"""
+        deadline = time.monotonic() + self._wait
+        while True:
+            try:
+                worker = self._idle.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                raise PoolUnavailable(f'{self._wait} 秒内没有可用的执行 worker') from None
+            if worker.process.is_alive():
+                return worker
+            # 空闲期间意外退出的 worker
+            self._retire(worker)
+
+    def run_sync(self, code: str, cwd: str, timeout: float, frames: dict[str, str] | None = None,
+                 job: _Job | None = None) -> ExecResult:
+        worker = self._acquire()
+        if job is not None and not job.attach(worker):
+            # 排队等待 worker 期间任务已被取消
+            self._idle.put(worker)
+            return ExecResult(-1, '', 'CancelledError: execution cancelled.')
+        try:
+            worker.conn.send((code, cwd, frames or {}))
+            if not worker.conn.poll(timeout):
+                self._retire(worker)
+                return ExecResult(-1, '', f"TimeoutError: code execution exceeded {timeout} seconds.", timed_out=True)
+            result = ExecResult(*worker.conn.recv())
+        except (EOFError, OSError) as e:
+            self._retire(worker)
+            worker.process.join(timeout=1)
+            message = signal_message(worker.process.exitcode)
+            if job is not None and job.cancelled:
+                return ExecResult(-1, '', 'CancelledError: execution cancelled.')
+            if message:
+                return ExecResult(1, '', message)
+            # worker 在返回结果前意外退出（被外部结束、崩溃或用户代码直接退出进程）：与没有可用 worker 一样，
+            # 由调用方改用一次性子进程重新执行
+            raise PoolUnavailable(f'执行 worker 意外退出 ({e!r})') from e
+        finally:
+            if job is not None:
+                job.detach()
+
+        worker.jobs += 1
+        if worker.jobs >= self._max_jobs or not worker.process.is_alive():
+            self._retire(worker)
+        else:
+            self._idle.put(worker)
+        return result
+
+    async def run(self, code: str, cwd: str, timeout: float, frames: dict[str, str] | None = None) -> ExecResult:
+        job = _Job()
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        try:
+            return await loop.run_in_executor(self._executor, ctx.run, self.run_sync, code, cwd, timeout, frames, job)
+        except asyncio.CancelledError:
+            job.cancel()
+            raise
+
+
+# 模块级单例：首次使用时创建进程池
+_exec_pool = None
+_exec_pool_lock = threading.Lock()
+
+def get_exec_pool() -> ExecPool:
+    global _exec_pool
+    with _exec_pool_lock:
+        if _exec_pool is None:
+            _exec_pool = ExecPool()
+    return _exec_pool
@@ -1,8 +1,11 @@
 import asyncio
+import hashlib
+import json
 import os
 import sys
 import tempfile
 import shutil
+import time
 from typing import Any
 
 import shortuuid
@@ -13,23 +16,158 @@ from agentscope.tool._response import ToolResponse
 # Make sure project root is importable
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 from config import Config
+from tools.exec_pool import (EXEC_POOL_SIZE, ExecResult, OutputCap, PoolUnavailable, get_exec_pool,
+                             kill_process_group, resource_limits_prefix, signal_message)
+from tools.data_handles import resolve_handle
+from tools.output_store import current_session, get_exec_logger, schedule_sweep, session_output_dir
+from tools.limits import limit
+from tools.tracing import current_span
 
 
-async def execute_python_code_local(code: str, timeout: float = 300, **kwargs: Any) -> ToolResponse:
+async def _drain(stream: asyncio.StreamReader, cap: OutputCap) -> None:
+    """边执行边读取管道：超出上限的部分只计数，子进程不会因管道写满而阻塞。"""
+    while chunk := await stream.read(64 * 1024):
+        cap.write(chunk)
+
+
+def _kill(proc: asyncio.subprocess.Process) -> None:
+    kill_process_group(proc.pid)
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+
+
+async def _run_in_subprocess(script: str, temp_file: str, temp_dir: str, timeout: float) -> ExecResult:
+    """把脚本写入临时文件并在独立子进程（独立进程组，带资源上限）中执行。"""
+    # 写入临时执行脚本（资源上限 + 前缀 + 用户代码），不再添加任何自动打印或额外保存操作
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        f.write(resource_limits_prefix() + script)
+
+    posix = os.name == 'posix'
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable,
+        '-u',
+        temp_file,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=temp_dir,
+        env={**os.environ, 'PYTHONIOENCODING': 'utf-8'},
+        start_new_session=posix,
+    )
+
+    stdout, stderr = OutputCap(), OutputCap()
+    timed_out = False
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(_drain(proc.stdout, stdout), _drain(proc.stderr, stderr), proc.wait()),
+            timeout=timeout,
+        )
+    except asyncio.TimeoutError:
+        timed_out = True
+    except asyncio.CancelledError:
+        # 请求被取消（客户端断开）时结束整个进程组，不让它继续占用沙箱
+        _kill(proc)
+        await proc.wait()
+        raise
+    finally:
+        # 脚本退出后仍在后台运行的子进程同样结束
+        kill_process_group(proc.pid)
+
+    stderr_str = stderr.getvalue()
+    if timed_out:
+        _kill(proc)
+        await proc.wait()
+        stderr_str += f"\nTimeoutError: code execution exceeded {timeout} seconds."
+        returncode = -1
+    else:
+        returncode = proc.returncode
+        message = signal_message(returncode)
+        if message:
+            stderr_str += '\n' + message
+    return ExecResult(
+        returncode,
+        stdout.getvalue(),
+        stderr_str.strip('\n'),
+        output_bytes=stdout.total + stderr.total,
+        truncated=stdout.truncated or stderr.truncated,
+        timed_out=timed_out,
+    )
+
+
+def _log_run(run_id: str, mode: str, code: str, result: ExecResult, duration_ms: float,
+             files: list[str], stdout: str, stderr: str) -> None:
+    """每次执行写入一行 JSON 日志；输出已截断，日志大小与返回给模型的内容同样有上限。"""
+    record = {
+        'run_id': run_id,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'session': current_session.get(),
+        'mode': mode,
+        'returncode': result.returncode,
+        'timed_out': result.timed_out,
+        'duration_ms': round(duration_ms, 1),
+        'output_bytes': result.output_bytes,
+        'truncated': result.truncated,
+        'code_sha1': hashlib.sha1(code.encode('utf-8')).hexdigest(),
+        'code_chars': len(code),
+        'files': files,
+        'stdout': stdout,
+        'stderr': stderr,
+    }
+    get_exec_logger().info(json.dumps(record, ensure_ascii=False))
+
+
+def _handles_prefix(frames: dict[str, str]) -> str:
+    """生成在独立子进程中加载数据句柄的前缀代码。"""
+    if not frames:
+        return ''
+    return f"""import pandas as _pd
+def _load_handle(path):
+    if path.endswith('.arrow'):
+        from pyarrow import feather
+        return feather.read_table(path, memory_map=True).to_pandas()
+    return _pd.read_pickle(path)
+DATA_HANDLES = {{name: _load_handle(path) for name, path in {frames!r}.items()}}
+globals().update(DATA_HANDLES)
+"""
+
+
+async def execute_python_code_local(code: str, timeout: float = 300, data_handles: list[str] | None = None, **kwargs: Any) -> ToolResponse:
     """在临时脚本中执行用户提供的 Python 代码并将生成的非 .py 文件移动到持久化输出目录。
 
     精简版本：不打印调试信息（避免无关输出），保留 matplotlib 后端和中文字体处理、子进程执行、
-    输出文件搬迁与清理逻辑。
+    输出文件搬迁与清理逻辑。启用进程池（EXEC_POOL_SIZE > 0）时代码在预热的 worker 中执行，
+    否则为每次调用启动独立的子进程。
+
+    Args:
+        code (str):
+            要执行的 Python 代码，图片等输出文件需保存到相对路径 'output/...'。
+        timeout (float):
+            执行超时时间（秒）。
+        data_handles (list[str] | None):
+            查询工具返回的数据句柄列表（<data_handle> 标记中的名称）。执行前会把每个句柄加载为同名的
+            pandas DataFrame 变量（同时汇总在字典 DATA_HANDLES 中），代码中直接使用即可，无需手动写入数据。
     """
 
     output_dir = kwargs.get('output_dir') or Config.get('OUTPUT_DIR')
     try:
-        os.makedirs(output_dir, exist_ok=True)
+        output_dir = session_output_dir(output_dir)
     except Exception:
         output_dir = os.path.abspath('.')
 
+    try:
+        frames = {h: resolve_handle(h) for h in (data_handles or [])}
+    except LookupError as e:
+        return ToolResponse(
+            content=[
+                TextBlock(type='text', text=f"<returncode>1</returncode><stdout></stdout><stderr>{e}</stderr>"),
+            ],
+        )
+
+    run_id = shortuuid.uuid()
     temp_dir = tempfile.mkdtemp()
-    temp_file = os.path.join(temp_dir, f"tmp_{shortuuid.uuid()}.py")
+    temp_file = os.path.join(temp_dir, f"tmp_{run_id}.py")
 
     # 设置 matplotlib 无头后端并尝试注册常见中文字体（尽量静默失败）
     prefix = r"""import matplotlib
@@ -64,69 +202,32 @@ for _p in font_candidates:
         pass
 """
 
-    # 写入临时执行脚本（仅前缀 + 用户代码），不再添加任何自动打印或额外保存操作
-    with open(temp_file, 'w', encoding='utf-8') as f:
-        f.write(prefix + '\n' + code)
-
     # Ensure 'output' exists in temp so user code can write to it
     try:
         os.makedirs(os.path.join(temp_dir, 'output'), exist_ok=True)
     except Exception:
         pass
 
-    proc = await asyncio.create_subprocess_exec(
-        sys.executable,
-        '-u',
-        temp_file,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-        cwd=temp_dir,
-    )
-
-    stdout_str = ''
-    stderr_str = ''
-    returncode = None
-
+    # 同时运行的沙箱数量受 sandbox 并发上限约束，其余调用在此排队
+    mode = 'pool' if EXEC_POOL_SIZE > 0 else 'subprocess'
     try:
-        # 等待并获取输出，超时会抛出 asyncio.TimeoutError
-        stdout_bytes, stderr_bytes = await asyncio.wait_for(proc.communicate(), timeout=timeout)
-
-        def safe_decode(bs: bytes) -> str:
-            if not bs:
-                return ''
-            for enc in ('gbk', 'utf-8'):
+        async with limit('sandbox'):
+            start = time.perf_counter()
+            result = None
+            if EXEC_POOL_SIZE > 0:
                 try:
-                    return bs.decode(enc)
-                except Exception:
-                    continue
-            return bs.decode('utf-8', errors='replace')
-
-        stdout_str = safe_decode(stdout_bytes)
-        stderr_str = safe_decode(stderr_bytes)
-        returncode = proc.returncode
-
-        # 简单持久化日志，便于打包后排查（不打印到控制台）
-        try:
-            log_file = os.path.join(output_dir, 'exec_subproc_output.log')
-            with open(log_file, 'a', encoding='utf-8') as _lf:
-                from datetime import datetime
-
-                _lf.write('--- EXEC SUBPROC OUTPUT %s ---\n' % datetime.now().isoformat())
-                _lf.write(f'returncode={returncode}\n')
-                _lf.write('[STDOUT]\n')
-                _lf.write(stdout_str + '\n')
-                _lf.write('[STDERR]\n')
-                _lf.write(stderr_str + '\n')
-        except Exception:
-            pass
-
-    except asyncio.TimeoutError:
-        returncode = -1
-        stderr_str = f"TimeoutError: code execution exceeded {timeout} seconds."
-        try:
-            proc.terminate()
-        except Exception:
-            pass
+                    result = await get_exec_pool().run(code, temp_dir, timeout, frames)
+                except PoolUnavailable:
+                    # worker 启动失败、长时间全部占用或执行中意外退出，退回一次性子进程
+                    mode = 'subprocess'
+            if result is None:
+                script = prefix + _handles_prefix(frames) + '\n' + code
+                result = await _run_in_subprocess(script, temp_file, temp_dir, timeout)
+            duration_ms = (time.perf_counter() - start) * 1000
+    except asyncio.CancelledError:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    returncode, stdout_str, stderr_str = result.returncode, result.stdout, result.stderr
 
     # 将 temp_dir 中的非 .py 文件移动到 output_dir
     moved_files = []
@@ -184,6 +285,7 @@ for _p in font_candidates:
                 pass
 
     if moved_files:
+        schedule_sweep()
         stdout_str = (stdout_str or '') + "\n<saved_files>" + ",".join(moved_files) + "</saved_files>"
     if move_errors:
         err_lines = [f"MOVE_ERROR src={s} dest={d} err={m}" for (s, d, m) in move_errors]
@@ -195,6 +297,16 @@ for _p in font_candidates:
         msg = "[ERROR] 未检测到任何输出文件。请确认脚本将文件保存到相对路径 'output/...'。"
         stderr_str = (stderr_str or '') + ('\n' + msg if stderr_str else msg)
 
+    # 结构化执行日志，便于打包后排查（不打印到控制台），按大小滚动避免无限增长
+    try:
+        _log_run(run_id, mode, code, result, duration_ms, moved_files, result.stdout, stderr_str)
+    except Exception:
+        pass
+    s = current_span()
+    if s is not None:
+        s.set(exec_mode=mode, exec_returncode=returncode, exec_output_bytes=result.output_bytes,
+              exec_truncated=result.truncated)
+
     return ToolResponse(
         content=[
             TextBlock(
@@ -0,0 +1,232 @@
+"""健康数据存储：把 Gadgetbridge / 小米手环的原始导出库增量合并到带索引的本地时间序列库。
+
+    python tools/health_store.py                            # 从 DB_PATH 导入新数据
+    python tools/health_store.py export/Gadgetbridge.db     # 合并另一份导出（例如新手机上的导出）
+    python tools/health_store.py --samples                  # 同时导入分钟级活动 / 睡眠阶段样本
+    python tools/health_store.py --full                     # 忽略高水位，重新读取整张表
+
+存储库（`HEALTH_DB_PATH`）中的表与导出库同名同列，主键为 (DEVICE_ID, USER_ID, TIMESTAMP)，
+另有 (USER_ID, TIMESTAMP) 索引；导入按主键 upsert，同一份导出重复导入结果不变。
+每张表按 (导出库路径, 设备) 记录高水位（已导入的最大时间戳），同一份导出再次导入时只读取高水位之前
+`IMPORT_OVERLAP_DAYS` 天以后的行——设备同步时会改写当天的日汇总和前一晚的睡眠记录，重叠窗口保证这些行被更新。
+第一次导入的导出库（例如另一部手机上的导出）或其中新出现的设备从头读取；早于高水位而未读取的行数会在输出中列出，
+需要时用 --full 重新读取。
+每张表的写入与高水位更新在同一个事务中完成；存储库使用 WAL，导入时查询工具仍可读取。
+
+存储库存在时，睡眠 / 心率读取、SQL 查询与作图工具都从存储库读取，否则仍读取 `DB_PATH` 原始导出。
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+
+
+HEALTH_DB_PATH = Config.get('HEALTH_DB_PATH', os.path.join(os.path.dirname(Config['DB_PATH']), 'health.db'))
+IMPORT_SAMPLES = Config.get('IMPORT_SAMPLES', False)        # 是否导入分钟级样本表（行数多，查询工具默认不读取）
+IMPORT_BATCH_SIZE = Config.get('IMPORT_BATCH_SIZE', 5000)   # 每次 executemany 的行数
+IMPORT_OVERLAP_DAYS = Config.get('IMPORT_OVERLAP_DAYS', 2)  # 增量导入时在高水位之前重新读取的天数
+
+KEY_COLUMNS = ('DEVICE_ID', 'USER_ID', 'TIMESTAMP')
+STATE_TABLE = '_IMPORT_STATE'
+
+# 表名 → (时间戳单位对应的每秒刻度, 是否为分钟级样本表)
+TABLES = {
+    'XIAOMI_SLEEP_TIME_SAMPLE': (1000, False),
+    'XIAOMI_DAILY_SUMMARY_SAMPLE': (1000, False),
+    'XIAOMI_ACTIVITY_SAMPLE': (1, True),        # 每分钟一条：步数、心率、强度、压力、血氧，时间戳单位为秒
+    'XIAOMI_SLEEP_STAGE_SAMPLE': (1000, True),  # 睡眠阶段变化
+}
+
+
+def health_db_path() -> str:
+    """查询工具应读取的数据库：存储库存在时为存储库，否则为原始导出。"""
+    return HEALTH_DB_PATH if os.path.exists(HEALTH_DB_PATH) else Config['DB_PATH']
+
+
+def connect_store(path: str = HEALTH_DB_PATH) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    state_columns = {name for name, _ in _columns(conn, STATE_TABLE)}
+    if state_columns and 'DEVICE_ID' not in state_columns:
+        # 旧版只按表记录的高水位：丢弃后下次导入从头读取（upsert 保证结果不变）
+        conn.execute(f'DROP TABLE {STATE_TABLE}')
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS {STATE_TABLE} ('
+        'TABLE_NAME TEXT NOT NULL, SOURCE TEXT NOT NULL, DEVICE_ID INTEGER NOT NULL, HIGH_WATER INTEGER, '
+        'ROW_COUNT INTEGER, IMPORTED_AT REAL, PRIMARY KEY (TABLE_NAME, SOURCE, DEVICE_ID))'
+    )
+    return conn
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> list[tuple[str, str]]:
+    """返回 [(列名, 声明类型)]；表不存在时为空列表。"""
+    return [(row[1], row[2]) for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def _ensure_table(store: sqlite3.Connection, table: str, source_columns: list[tuple[str, str]]) -> None:
+    """按导出库的列顺序建表；导出库新增的列（设备固件升级后常见）追加到已有表。"""
+    existing = {name for name, _ in _columns(store, table)}
+    if not existing:
+        decls = ', '.join(f'{name} {decl or ""}'.strip() + (' NOT NULL' if name in KEY_COLUMNS else '')
+                          for name, decl in source_columns)
+        store.execute(f'CREATE TABLE {table} ({decls}, PRIMARY KEY ({", ".join(KEY_COLUMNS)})) WITHOUT ROWID')
+        store.execute(f'CREATE INDEX IF NOT EXISTS IDX_{table}_USER_TIME ON {table} (USER_ID, TIMESTAMP)')
+        return
+    for name, decl in source_columns:
+        if name not in existing:
+            store.execute(f'ALTER TABLE {table} ADD COLUMN {name} {decl or ""}'.strip())
+
+
+def _high_waters(store: sqlite3.Connection, table: str, source_path: str) -> dict[int, int]:
+    """该导出库中各设备的 {DEVICE_ID: 高水位}；没有导入过的导出库为空。"""
+    return dict(store.execute(f'SELECT DEVICE_ID, HIGH_WATER FROM {STATE_TABLE} WHERE TABLE_NAME = ? AND SOURCE = ?',
+                              (table, source_path)))
+
+
+def import_table(source: sqlite3.Connection, store: sqlite3.Connection, table: str, source_path: str = '',
+                 full: bool = False, batch_size: int = IMPORT_BATCH_SIZE) -> dict | None:
+    """把一张表中各设备高水位以后的行 upsert 到存储库，返回统计；导出库中没有这张表时返回 None。
+
+    统计中 skipped 为早于高水位（减去重叠窗口）而没有读取的行数。
+    """
+    ticks_per_second, _ = TABLES[table]
+    source_columns = _columns(source, table)
+    names = [name for name, _ in source_columns]
+    if not source_columns:
+        return None
+    if not set(KEY_COLUMNS) <= set(names):
+        raise ValueError(f'{table} 缺少主键列 {", ".join(KEY_COLUMNS)}')
+
+    start = time.perf_counter()
+    high_waters = {} if full else _high_waters(store, table, source_path)
+    overlap = IMPORT_OVERLAP_DAYS * 86400 * ticks_per_second
+    devices = [row[0] for row in source.execute(f'SELECT DISTINCT DEVICE_ID FROM {table}')]
+
+    column_list = ', '.join(names)
+    updates = ', '.join(f'{n} = excluded.{n}' for n in names if n not in KEY_COLUMNS)
+    upsert = (f'INSERT INTO {table} ({column_list}) VALUES ({", ".join("?" * len(names))}) '
+              f'ON CONFLICT ({", ".join(KEY_COLUMNS)}) DO '
+              + (f'UPDATE SET {updates}' if updates else 'NOTHING'))
+    ts_index = names.index('TIMESTAMP')
+
+    rows = skipped = 0
+    new_highs = {}
+    store.execute('BEGIN IMMEDIATE')
+    try:
+        _ensure_table(store, table, source_columns)
+        for device in devices:
+            high_water = high_waters.get(device)
+            query = f'SELECT {column_list} FROM {table} WHERE DEVICE_ID = ?'
+            params = (device,)
+            if high_water is not None:
+                since = high_water - overlap
+                query += ' AND TIMESTAMP > ?'
+                params = (device, since)
+                skipped += source.execute(f'SELECT COUNT(*) FROM {table} WHERE DEVICE_ID = ? AND TIMESTAMP <= ?',
+                                          (device, since)).fetchone()[0]
+            new_high = high_water
+            cursor = source.execute(query, params)
+            while batch := cursor.fetchmany(batch_size):
+                store.executemany(upsert, batch)
+                rows += len(batch)
+                batch_high = max(row[ts_index] for row in batch)
+                new_high = batch_high if new_high is None else max(new_high, batch_high)
+            new_highs[device] = new_high
+
+        now = time.time()
+        for device, high in new_highs.items():
+            count = store.execute(f'SELECT COUNT(*) FROM {table} WHERE DEVICE_ID = ?', (device,)).fetchone()[0]
+            store.execute(
+                f'INSERT OR REPLACE INTO {STATE_TABLE} VALUES (?, ?, ?, ?, ?, ?)',
+                (table, source_path, device, high, count, now),
+            )
+        row_count = store.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        store.execute('COMMIT')
+    except BaseException:
+        store.execute('ROLLBACK')
+        raise
+    highs = [h for h in new_highs.values() if h is not None]
+    return {
+        'read': rows,
+        'skipped': skipped,
+        'rows': row_count,
+        'devices': len(devices),
+        'new_devices': sum(1 for d in devices if d not in high_waters),
+        'high_water': max(highs) if highs else None,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def import_export(source_path: str | None = None, store_path: str = HEALTH_DB_PATH,
+                  samples: bool = IMPORT_SAMPLES, full: bool = False) -> dict[str, dict]:
+    """把一份导出库合并到存储库，返回 {表名: 统计}；导出库中不存在的表会被跳过。"""
+    source_path = source_path or Config['DB_PATH']
+    if not os.path.exists(source_path):
+        raise LookupError(f"数据库文件不存在: {source_path}")
+    if os.path.abspath(source_path) == os.path.abspath(store_path):
+        raise ValueError('导出库与存储库是同一个文件')
+
+    source = sqlite3.connect(Path(source_path).resolve().as_uri() + '?mode=ro', uri=True)
+    store = connect_store(store_path)
+    stats = {}
+    try:
+        for table, (_, is_sample) in TABLES.items():
+            if is_sample and not samples:
+                continue
+            result = import_table(source, store, table, os.path.abspath(source_path), full=full)
+            if result is not None:
+                stats[table] = result
+        store.execute('PRAGMA optimize')
+    finally:
+        source.close()
+        store.close()
+    return stats
+
+
+def import_state(store_path: str = HEALTH_DB_PATH) -> list[dict]:
+    """各表各设备的高水位、行数与最近导入时间。"""
+    if not os.path.exists(store_path):
+        return []
+    conn = sqlite3.connect(Path(store_path).resolve().as_uri() + '?mode=ro', uri=True)
+    try:
+        conn.row_factory = sqlite3.Row
+        return [dict(row) for row in conn.execute(f'SELECT * FROM {STATE_TABLE} ORDER BY TABLE_NAME, SOURCE, DEVICE_ID')]
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='把手环导出库增量合并到本地健康数据存储库')
+    parser.add_argument('source', nargs='?', default=Config['DB_PATH'], help='导出库路径（默认 DB_PATH）')
+    parser.add_argument('--store', default=HEALTH_DB_PATH, help='存储库路径（默认 HEALTH_DB_PATH）')
+    parser.add_argument('--samples', action='store_true', default=IMPORT_SAMPLES, help='同时导入分钟级样本表')
+    parser.add_argument('--full', action='store_true', help='忽略高水位，重新读取整张表')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        stats = import_export(args.source, args.store, samples=args.samples, full=args.full)
+    except (LookupError, ValueError) as e:
+        print(e)
+        return 1
+    for table, s in stats.items():
+        line = (f"{table}: {s['devices']} 个设备（新设备 {s['new_devices']} 个），读取 {s['read']} 行，"
+                f"共 {s['rows']} 行，高水位 {s['high_water']}，{s['seconds']}s")
+        if s['skipped']:
+            line += f"；跳过 {s['skipped']} 行早于高水位的旧数据（该导出库已导入过，如需重新读取请加 --full）"
+        print(line)
+    print(f'导入完成，耗时 {time.perf_counter() - start:.2f}s，存储库 {args.store}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""知识库离线入库：在部署或更新 PDF 后运行，写入统一经过入库锁，可与正在运行的服务同时执行。
+
+    python tools/ingest.py                              # 入库睡眠、心率 PDF 目录中的新文件
+    python tools/ingest.py --only sleep
+    python tools/ingest.py --migrate-from data/vdbs     # 把嵌入式存储中的集合复制到当前后端（如 Qdrant 服务）
+    python tools/ingest.py --export-lite                # 导出 lite 量化索引（--dtype int8 / float16）
+
+多进程部署时先运行本脚本，再设置 `VDBS_INGEST_ON_QUERY = False`，检索路径就不会再触发入库。
+`VDBS_BACKEND = 'lite'` 时新文件写入来源后端（嵌入式存储或 Qdrant 服务），随后自动重新导出索引。
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+from tools.lite_index import LITE_INDEX_DTYPE, build_index, collection_dir
+from tools.vdbs_utils import sync_pdf_collection
+from tools.vector_store import VDBS_BACKEND, EmbeddedStore, get_source_store, get_vector_store, ingest_lock
+
+
+PDF_COLLECTIONS = {
+    'sleep': (Config['SLEEP_PDF_PATH'], Config['SLEEP_KNOWLEDGE_COLLECTION']),
+    'heart_rate': (Config['HEART_RATE_PDF_PATH'], Config['HEART_RATE_KNOWLEDGE_COLLECTION']),
+}
+
+
+def migrate(source_path: str, batch: int = 256) -> dict[str, int]:
+    """把 source_path 嵌入式存储中的所有集合复制到当前后端，返回 {集合名: 点数}。"""
+    from qdrant_client.models import PointStruct
+
+    source = EmbeddedStore(os.path.abspath(source_path))
+    target = get_source_store()
+    if isinstance(target, EmbeddedStore) and target.path == source.path:
+        raise SystemExit('源目录与当前后端相同，无需迁移')
+
+    with source.client() as client:
+        collections = {c.name: client.get_collection(c.name).config.params.vectors
+                       for c in client.get_collections().collections}
+
+    copied = {}
+    with ingest_lock():
+        for name, vectors_config in collections.items():
+            with target.client() as client:
+                if not client.collection_exists(name):
+                    client.create_collection(name, vectors_config=vectors_config)
+            points = [PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in source.iter_points(name)]
+            with target.client() as client:
+                for i in range(0, len(points), batch):
+                    client.upsert(name, points=points[i:i + batch])
+            copied[name] = len(points)
+    return copied
+
+
+def export_lite(names: list[str] | None = None, dtype: str = LITE_INDEX_DTYPE,
+                nlist: int | None = None) -> dict[str, dict]:
+    """把来源后端中的集合导出为 lite 量化索引，返回 {集合名: 索引元数据}。"""
+    source = get_source_store()
+    if names is None:
+        with source.client() as client:
+            names = [c.name for c in client.get_collections().collections]
+
+    exported = {}
+    # 持有入库锁，导出的索引与索引文件（indexed_files.json 等）保持一致
+    with ingest_lock():
+        for name in names:
+            exported[name] = build_index(source.iter_points(name), collection_dir(name), dtype=dtype,
+                                         nlist=nlist, source=source.backend)
+    return exported
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='知识库离线入库 / 迁移')
+    parser.add_argument('--only', help=f"只处理指定知识库，逗号分隔（{', '.join(PDF_COLLECTIONS)}）")
+    parser.add_argument('--migrate-from', help='嵌入式 Qdrant 存储目录，复制其中的集合到当前后端')
+    parser.add_argument('--export-lite', action='store_true', help='导出 lite 量化索引（默认导出全部集合）')
+    parser.add_argument('--dtype', default=LITE_INDEX_DTYPE, choices=['int8', 'float16'], help='lite 索引的量化类型')
+    parser.add_argument('--nlist', type=int, help='lite 索引的 IVF 列表数（默认按点数自动决定，0 为暴力检索）')
+    args = parser.parse_args()
+
+    store = get_vector_store()
+    print(f'backend: {store.backend}')
+    if args.migrate_from:
+        for name, count in migrate(args.migrate_from).items():
+            print(f'{name:28s} 复制 {count} 个点')
+        return 0
+    if args.export_lite:
+        names = [PDF_COLLECTIONS[n][1] if n in PDF_COLLECTIONS else n for n in args.only.split(',')] if args.only else None
+        _print_exported(export_lite(names, args.dtype, args.nlist))
+        return 0
+
+    names = args.only.split(',') if args.only else list(PDF_COLLECTIONS)
+    for name in names:
+        pdf_dir, collection = PDF_COLLECTIONS[name]
+        start = time.perf_counter()
+        added = sync_pdf_collection(pdf_dir, Config['VDBS_PATH'], collection)
+        print(f'{collection:28s} 新入库 {added} 个文件，用时 {time.perf_counter() - start:.1f}s')
+        if added and VDBS_BACKEND == 'lite':
+            _print_exported(export_lite([collection]))
+    return 0
+
+
+def _print_exported(exported: dict[str, dict]) -> None:
+    for name, meta in exported.items():
+        print(f"{name:28s} 导出 {meta['count']} 个点（{meta['dtype']}，nlist={meta['nlist']}）")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""昂贵资源的进程级并发上限：LLM 调用、Python 沙箱、语音合成各自使用独立的信号量。
+
+即使请求已经通过准入控制，多个子智能体仍可能同时调用同一种资源；按资源限流可以让
+过载时排队发生在资源前，而不是让所有调用一起变慢或触发上游限流。
+"""
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+
+
+RESOURCE_LIMITS = {
+    'llm': Config.get('LLM_CONCURRENCY', 8),
+    'sandbox': Config.get('SANDBOX_CONCURRENCY', max(Config.get('EXEC_POOL_SIZE', 2), 1)),
+    'tts': Config.get('TTS_GLOBAL_CONCURRENCY', 4),
+}
+
+
+class _Limiter:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.semaphore = asyncio.Semaphore(capacity)
+        self.waiting = 0
+
+    @property
+    def in_use(self) -> int:
+        return self.capacity - self.semaphore._value
+
+
+_limiters: dict[str, _Limiter] = {}
+
+def _get(name: str) -> _Limiter:
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limiter = _limiters[name] = _Limiter(RESOURCE_LIMITS[name])
+    return limiter
+
+
+async def acquire(name: str) -> None:
+    limiter = _get(name)
+    limiter.waiting += 1
+    try:
+        await limiter.semaphore.acquire()
+    finally:
+        limiter.waiting -= 1
+
+
+def release(name: str) -> None:
+    _get(name).semaphore.release()
+
+
+@asynccontextmanager
+async def limit(name: str):
+    """`async with limit('sandbox'): ...`"""
+    await acquire(name)
+    try:
+        yield
+    finally:
+        release(name)
+
+
+def limits_snapshot() -> dict:
+    return {
+        name: {'capacity': l.capacity, 'in_use': l.in_use, 'waiting': l.waiting}
+        for name, l in _limiters.items()
+    }
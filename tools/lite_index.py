@@ -0,0 +1,208 @@
+"""轻量向量索引：int8 / float16 量化向量保存在内存映射的 NumPy 文件中，适合桌面版与小规模部署。
+
+目录结构（每个集合一个目录）：
+    meta.json       维度、点数、量化类型、IVF 参数、来源
+    vectors.npy     归一化后量化的向量（N × D，int8 或 float16），按 IVF 列表排序
+    scales.npy      int8 量化的逐向量缩放系数（float32）
+    centroids.npy   IVF 聚类中心（点数不少于 LITE_IVF_MIN_POINTS 时生成）
+    lists.npy       各 IVF 列表在 vectors 中的起止位置
+    payloads.jsonl  每行一个 {"id", "page_content", "metadata"}，与 vectors 行号对应
+    offsets.npy     payloads.jsonl 中每行的字节偏移
+
+打开索引只读取元数据并建立内存映射，不加载向量；检索为分块的向量化暴力搜索，点数较多时先按 IVF
+聚类中心筛选 `LITE_IVF_NPROBE` 个列表。索引只读，由 `python tools/ingest.py --export-lite` 从
+嵌入式存储或 Qdrant 服务导出，多个进程可以同时打开。
+"""
+import json
+import mmap
+import os
+import shutil
+import sys
+import time
+from typing import Iterable
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+
+
+LITE_INDEX_PATH = Config.get('LITE_INDEX_PATH')                       # 默认为 <VDBS_PATH>/lite
+LITE_INDEX_DTYPE = Config.get('LITE_INDEX_DTYPE', 'int8')              # int8 / float16
+LITE_IVF_MIN_POINTS = Config.get('LITE_IVF_MIN_POINTS', 10000)         # 少于该点数时不建 IVF，直接暴力检索
+LITE_IVF_NPROBE = Config.get('LITE_IVF_NPROBE', 16)                     # 检索时探查的 IVF 列表数
+BLOCK_ROWS = 8192           # 分块计算，避免把整个 int8 矩阵一次性转换为 float32
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _quantize(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    if dtype == 'float16':
+        return vectors.astype(np.float16), None
+    if dtype == 'int8':
+        # 逐向量对称量化：v ≈ q * scale，q ∈ [-127, 127]
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        q = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return q, scales.astype(np.float32)
+    raise ValueError(f'unsupported dtype: {dtype!r}')
+
+
+def _kmeans(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """球面 k-means（余弦相似度），在最多 50000 个样本上训练，返回归一化的聚类中心。"""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(len(vectors), 50000), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = sample[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = _normalize(centroids)
+    return centroids.astype(np.float32)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), BLOCK_ROWS):
+        out[start:start + BLOCK_ROWS] = np.argmax(vectors[start:start + BLOCK_ROWS] @ centroids.T, axis=1)
+    return out
+
+
+def build_index(points: Iterable, directory: str, dtype: str = LITE_INDEX_DTYPE,
+                nlist: int | None = None, source: str = '') -> dict:
+    """从 Qdrant 点（需含 id、vector、payload）构建索引并原子地替换 directory。
+
+    nlist 为 None 时按点数自动决定：少于 LITE_IVF_MIN_POINTS 不建 IVF，否则取 2·√N。
+    """
+    ids, vectors, payloads = [], [], []
+    for p in points:
+        ids.append(str(p.id))
+        vectors.append(p.vector)
+        payloads.append(p.payload or {})
+    if not vectors:
+        raise ValueError('collection is empty')
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+
+    if nlist is None:
+        nlist = int(2 * np.sqrt(len(vectors))) if len(vectors) >= LITE_IVF_MIN_POINTS else 0
+    centroids = None
+    order = np.arange(len(vectors))
+    lists = np.array([0, len(vectors)], dtype=np.int64)
+    if nlist > 1:
+        centroids = _kmeans(vectors, nlist)
+        assign = _assign(vectors, centroids)
+        order = np.argsort(assign, kind='stable')
+        lists = np.searchsorted(assign[order], np.arange(nlist + 1)).astype(np.int64)
+    vectors = vectors[order]
+
+    tmp = directory.rstrip('/\\') + f'.tmp{os.getpid()}'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    quantized, scales = _quantize(vectors, dtype)
+    np.save(os.path.join(tmp, 'vectors.npy'), quantized)
+    if scales is not None:
+        np.save(os.path.join(tmp, 'scales.npy'), scales)
+    if centroids is not None:
+        np.save(os.path.join(tmp, 'centroids.npy'), centroids)
+    np.save(os.path.join(tmp, 'lists.npy'), lists)
+
+    offsets = [0]
+    with open(os.path.join(tmp, 'payloads.jsonl'), 'wb') as f:
+        for i in order:
+            line = json.dumps({'id': ids[i], **payloads[i]}, ensure_ascii=False).encode('utf-8') + b'\n'
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(os.path.join(tmp, 'offsets.npy'), np.asarray(offsets, dtype=np.int64))
+
+    meta = {
+        'count': len(vectors),
+        'dim': int(vectors.shape[1]),
+        'dtype': dtype,
+        'metric': 'cosine',
+        'nlist': int(nlist) if centroids is not None else 0,
+        'source': source,
+        'built_at': time.time(),
+    }
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    # 先把旧目录移开再换入新目录，已打开旧索引的进程仍持有旧文件的映射
+    old = directory.rstrip('/\\') + f'.old{os.getpid()}'
+    if os.path.exists(directory):
+        os.replace(directory, old)
+    os.replace(tmp, directory)
+    shutil.rmtree(old, ignore_errors=True)
+    return meta
+
+
+class LiteIndex:
+    """只读索引；打开时只建立内存映射，多个线程可以同时检索。"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.mtime = os.path.getmtime(os.path.join(directory, 'meta.json'))
+        self.vectors = np.load(os.path.join(directory, 'vectors.npy'), mmap_mode='r')
+        scales = os.path.join(directory, 'scales.npy')
+        self.scales = np.load(scales, mmap_mode='r') if os.path.exists(scales) else None
+        centroids = os.path.join(directory, 'centroids.npy')
+        self.centroids = np.load(centroids) if os.path.exists(centroids) else None
+        self.lists = np.load(os.path.join(directory, 'lists.npy'))
+        self.offsets = np.load(os.path.join(directory, 'offsets.npy'), mmap_mode='r')
+        with open(os.path.join(directory, 'payloads.jsonl'), 'rb') as f:
+            self._payloads = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return self.meta['count']
+
+    def _score_rows(self, q: np.ndarray, start: int, end: int) -> np.ndarray:
+        scores = np.empty(end - start, dtype=np.float32)
+        for s in range(start, end, BLOCK_ROWS):
+            e = min(s + BLOCK_ROWS, end)
+            block = self.vectors[s:e].astype(np.float32) @ q
+            if self.scales is not None:
+                block *= self.scales[s:e]
+            scores[s - start:e - start] = block
+        return scores
+
+    def search(self, vector, k: int = 4, nprobe: int | None = None) -> list[tuple[int, float]]:
+        """返回 [(行号, 余弦相似度), ...]，按相似度降序。"""
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+
+        if self.centroids is not None:
+            probe = min(nprobe or LITE_IVF_NPROBE, len(self.centroids))
+            lists = np.argpartition(-(self.centroids @ q), probe - 1)[:probe]
+            ranges = [(int(self.lists[l]), int(self.lists[l + 1])) for l in lists]
+        else:
+            ranges = [(0, len(self))]
+
+        rows = np.concatenate([np.arange(s, e) for s, e in ranges if e > s] or [np.empty(0, dtype=np.int64)])
+        if not len(rows):
+            return []
+        scores = np.concatenate([self._score_rows(q, s, e) for s, e in ranges if e > s])
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def payload(self, row: int) -> dict:
+        return json.loads(self._payloads[int(self.offsets[row]):int(self.offsets[row + 1])])
+
+    def close(self) -> None:
+        self._payloads.close()
+
+
+def index_root(vdbs_path: str | None = None) -> str:
+    return LITE_INDEX_PATH or os.path.join(vdbs_path or Config['VDBS_PATH'], 'lite')
+
+
+def collection_dir(collection_name: str, root: str | None = None) -> str:
+    return os.path.join(root or index_root(), collection_name)
@@ -0,0 +1,107 @@
+"""各智能体的模型配置与共享的 HTTP 连接池。
+
+子智能体（查询、检索、搜索、输出）大多只是调用一两个工具再整理结果，不需要和路由智能体用同一个大模型。
+`get_chat_model(agent)` 按智能体名称解析模型与最大输出 token 数：
+    AGENT_MODELS = {'router': {'model': 'qwen-max', 'max_tokens': 2048},
+                    'query': {'model': 'qwen-turbo', 'max_tokens': 512, 'temperature': 0.2}}
+未单独配置的子智能体使用 `SUB_AGENT_MODEL`（未设置时为 `MODEL`），路由智能体默认使用 `MODEL`；
+`LLM_MAX_TOKENS` 为所有智能体的默认最大输出 token 数。条目中其他键原样作为 DashScope 生成参数传入。
+
+所有模型实例共用同一个 aiohttp 连接池（aiohttp 会话绑定事件循环，因此每个事件循环一个），
+连接数上限为 `LLM_HTTP_POOL_SIZE`，空闲连接保留 `LLM_HTTP_KEEPALIVE` 秒，连续的模型调用不必重新握手。
+"""
+import asyncio
+import os
+import sys
+import threading
+import weakref
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+from tools.tracing import TracedDashScopeChatModel
+
+
+AGENT_MODELS = Config.get('AGENT_MODELS', {})                   # 智能体名称 → {'model', 'max_tokens', 其他生成参数}
+SUB_AGENT_MODEL = Config.get('SUB_AGENT_MODEL')                 # 子智能体的默认模型，未设置时为 MODEL
+LLM_MAX_TOKENS = Config.get('LLM_MAX_TOKENS')                   # 默认最大输出 token 数，None 为不限制
+LLM_HTTP_POOL_SIZE = Config.get('LLM_HTTP_POOL_SIZE', 32)       # 连接池的连接数上限
+LLM_HTTP_KEEPALIVE = Config.get('LLM_HTTP_KEEPALIVE', 60)       # 空闲连接保留时间（秒）
+
+# 路由智能体负责最终的整理与回答，其余为子智能体（report 为每日摘要的批量生成）
+ROUTER_AGENT = 'router'
+AGENTS = (ROUTER_AGENT, 'rag', 'query', 'search', 'output', 'report')
+
+
+def model_settings(agent: str) -> dict:
+    """返回智能体的 {'model', 'max_tokens', 'generate_kwargs'}。"""
+    entry = dict(AGENT_MODELS.get(agent) or {})
+    default = Config['MODEL'] if agent == ROUTER_AGENT else (SUB_AGENT_MODEL or Config['MODEL'])
+    model = entry.pop('model', None) or default
+    max_tokens = entry.pop('max_tokens', LLM_MAX_TOKENS)
+    generate_kwargs = {**entry, **({'max_tokens': max_tokens} if max_tokens else {})}
+    return {'model': model, 'max_tokens': max_tokens, 'generate_kwargs': generate_kwargs}
+
+
+_sessions = weakref.WeakKeyDictionary()
+_sessions_lock = threading.Lock()
+
+async def get_http_session():
+    """返回当前事件循环共享的 aiohttp 会话（惰性创建）。"""
+    import aiohttp
+    from dashscope.api_entities.aio_session import get_ssl_context
+
+    loop = asyncio.get_running_loop()
+    with _sessions_lock:
+        session = _sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=LLM_HTTP_POOL_SIZE, keepalive_timeout=LLM_HTTP_KEEPALIVE,
+                                             ssl=get_ssl_context())
+            session = _sessions[loop] = aiohttp.ClientSession(connector=connector, trust_env=True)
+    return session
+
+
+async def close_http_session() -> None:
+    """关闭当前事件循环的连接池（服务停止时调用）。"""
+    with _sessions_lock:
+        session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def pool_snapshot() -> dict:
+    with _sessions_lock:
+        sessions = [s for s in _sessions.values() if not s.closed]
+    return {
+        'size': LLM_HTTP_POOL_SIZE,
+        'sessions': len(sessions),
+        'connections': sum(len(getattr(s.connector, '_acquired', ())) for s in sessions),
+    }
+
+
+class PooledChatModel(TracedDashScopeChatModel):
+    """通过共享连接池发起请求的模型。"""
+
+    async def __call__(self, messages, tools=None, tool_choice=None, structured_model=None, **kwargs):
+        kwargs.setdefault('session', await get_http_session())
+        return await super().__call__(messages, tools=tools, tool_choice=tool_choice,
+                                      structured_model=structured_model, **kwargs)
+
+
+def get_chat_model(agent: str, **kwargs) -> PooledChatModel:
+    """按智能体配置创建模型；kwargs 透传给 TracedDashScopeChatModel（如 emit_deltas）。"""
+    settings = model_settings(agent)
+    return PooledChatModel(
+        model_name=settings['model'],
+        api_key=Config['API_KEY'],
+        generate_kwargs=settings['generate_kwargs'],
+        agent=agent,
+        **kwargs,
+    )
+
+
+def models_snapshot() -> dict:
+    """各智能体实际使用的模型与最大输出 token 数，以及连接池状态，供 /metrics 展示。"""
+    return {
+        'agents': {a: {k: v for k, v in model_settings(a).items() if k != 'generate_kwargs'} for a in AGENTS},
+        'http_pool': pool_snapshot(),
+    }
@@ -0,0 +1,225 @@
+"""输出目录管理：按会话划分子目录，按时间和总容量淘汰旧文件，并为执行日志做滚动切分。
+
+工具生成的图片、音频写入 `OUTPUT_DIR/sessions/<session_id>/`（没有会话时写入 OUTPUT_DIR 根目录），
+Web 端通过 `/output/<相对路径>` 访问：只能访问调用方自己会话的目录（没有会话时为根目录下的文件）和
+`reports/`，并且只提供图片、音频等产物类型；执行日志与数据句柄不放在输出目录中。
+清理在后台线程中按 `OUTPUT_SWEEP_INTERVAL` 节流执行，保证长期运行的主机上输出目录的磁盘占用有上限。
+"""
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+_ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, _ROOT)
+from config import Config
+
+
+OUTPUT_MAX_BYTES = Config.get('OUTPUT_MAX_BYTES', 2 * 1024 ** 3)      # 输出目录总容量上限
+OUTPUT_MAX_AGE = Config.get('OUTPUT_MAX_AGE', 7 * 24 * 3600)          # 文件最长保留时间（秒）
+OUTPUT_SWEEP_INTERVAL = Config.get('OUTPUT_SWEEP_INTERVAL', 600)      # 两次清理的最小间隔（秒）
+EXEC_LOG_MAX_BYTES = Config.get('EXEC_LOG_MAX_BYTES', 5 * 1024 ** 2)  # 执行日志单个文件大小上限
+EXEC_LOG_BACKUPS = Config.get('EXEC_LOG_BACKUPS', 3)
+
+EXEC_LOG_PATH = Config.get('EXEC_LOG_PATH') or os.path.join(_ROOT, 'data', 'logs', 'exec_runs.jsonl')
+
+# 允许通过 /output/ 访问的产物类型
+SERVED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.pdf',
+                     '.mp3', '.wav', '.opus', '.ogg', '.csv', '.xlsx', '.txt'}
+PUBLIC_DIRS = ('reports',)      # 所有会话均可访问的子目录（夜间生成的每日摘要图表与语音）
+MIN_EVICT_AGE = 60      # 最近一分钟内写入的文件可能仍在使用，不参与按容量淘汰
+
+_SESSION_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+current_session: contextvars.ContextVar[str | None] = contextvars.ContextVar('current_session', default=None)
+
+
+def output_root() -> str:
+    return os.path.abspath(Config.get('OUTPUT_DIR') or './output')
+
+
+def valid_session(session_id: str | None) -> str | None:
+    """合法的会话 ID 原样返回，否则返回 None（视为无会话）。"""
+    return session_id if session_id and _SESSION_RE.match(session_id) else None
+
+
+def set_session(session_id: str | None) -> contextvars.Token:
+    """设置当前上下文的会话 ID；不合法的 ID 视为无会话。"""
+    return current_session.set(valid_session(session_id))
+
+
+def session_output_dir(base: str | None = None) -> str:
+    """返回当前会话的输出目录（不存在时创建）。"""
+    base = base or output_root()
+    session_id = current_session.get()
+    directory = os.path.join(base, 'sessions', session_id) if session_id else base
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def resolve_output_path(relative: str, session_id: str | None = None) -> str | None:
+    """把 URL 中的相对路径解析为输出目录内可提供给调用方的文件路径，否则返回 None。
+
+    session_id 为调用方的会话：有会话时只能访问 `sessions/<session_id>/` 下的文件，没有会话时只能访问根目录下的文件；
+    `reports/` 对所有调用方开放。文件扩展名须在 SERVED_EXTENSIONS 中。
+    """
+    session_id = valid_session(session_id)
+    root = os.path.realpath(output_root())
+    path = os.path.realpath(os.path.join(root, relative))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return None
+    if os.path.splitext(path)[1].lower() not in SERVED_EXTENSIONS:
+        return None
+
+    parts = os.path.relpath(path, root).split(os.sep)
+    if parts[0] in PUBLIC_DIRS:
+        return path
+    if session_id:
+        return path if len(parts) > 2 and parts[:2] == ['sessions', session_id] else None
+    return path if len(parts) == 1 else None
+
+
+def artifact_url(path: str) -> str | None:
+    """输出目录内文件的访问地址，目录外的文件返回 None。"""
+    root = os.path.realpath(output_root())
+    path = os.path.realpath(path)
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return '/output/' + os.path.relpath(path, root).replace(os.sep, '/')
+
+
+def link_artifacts(text: str) -> str:
+    """把文本中输出目录下的绝对路径替换为 `/output/...` 访问地址。"""
+    root = output_root()
+    variants = {root, root.replace('\\', '/'), os.path.realpath(root)}
+    for variant in sorted(variants, key=len, reverse=True):
+        pattern = re.escape(variant) + r'[\\/][^\s<>"\'，。；）)]+'
+        text = re.sub(pattern, lambda m: artifact_url(m.group(0)) or m.group(0), text)
+    return text
+
+
+_ARTIFACT_URL_RE = re.compile(r'/output/[^\s<>"\'，。；）)]+')
+
+def find_artifacts(text: str) -> list[str]:
+    """文本中出现的输出文件访问地址（绝对路径会先转换为 `/output/...`），按出现顺序去重。"""
+    return list(dict.fromkeys(_ARTIFACT_URL_RE.findall(link_artifacts(text))))
+
+
+def media_type(url: str) -> str:
+    ext = os.path.splitext(url)[1].lower()
+    if ext in ('.png', '.jpg', '.jpeg', '.gif', '.svg'):
+        return 'image'
+    if ext in ('.mp3', '.wav', '.opus', '.ogg'):
+        return 'audio'
+    return 'file'
+
+
+# ---------------------------------------------------------------- 执行日志
+
+_exec_logger = None
+_exec_logger_lock = threading.Lock()
+
+def get_exec_logger() -> logging.Logger:
+    """执行日志写入 EXEC_LOG_PATH（每次执行一行 JSON，含代码输出与会话 ID，不放在对外提供的输出目录中），
+    按大小滚动，最多保留 EXEC_LOG_BACKUPS 个旧文件。"""
+    global _exec_logger
+    with _exec_logger_lock:
+        if _exec_logger is None:
+            os.makedirs(os.path.dirname(EXEC_LOG_PATH), exist_ok=True)
+            handler = RotatingFileHandler(
+                EXEC_LOG_PATH,
+                maxBytes=EXEC_LOG_MAX_BYTES,
+                backupCount=EXEC_LOG_BACKUPS,
+                encoding='utf-8',
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger = logging.getLogger('exec_subproc')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            _exec_logger = logger
+    return _exec_logger
+
+
+# ---------------------------------------------------------------- 清理
+
+def sweep(root: str | None = None) -> tuple[int, int]:
+    """删除超过 OUTPUT_MAX_AGE 的文件，再按修改时间从旧到新淘汰直到总容量低于 OUTPUT_MAX_BYTES。
+
+    Returns:
+        tuple[int, int]: (删除的文件数, 释放的字节数)。
+    """
+    root = root or output_root()
+    if not os.path.isdir(root):
+        return 0, 0
+    now = time.time()
+    removed, freed = 0, 0
+    entries: list[tuple[float, int, str]] = []
+
+    for dirpath, _, filenames in os.walk(root):
+        for fname in filenames:
+            path = os.path.join(dirpath, fname)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if now - st.st_mtime > OUTPUT_MAX_AGE:
+                try:
+                    os.remove(path)
+                    removed += 1
+                    freed += st.st_size
+                except OSError:
+                    pass
+            else:
+                entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    if total > OUTPUT_MAX_BYTES:
+        for mtime, size, path in sorted(entries):
+            if total <= OUTPUT_MAX_BYTES or now - mtime < MIN_EVICT_AGE:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+                freed += size
+                total -= size
+            except OSError:
+                pass
+
+    # 清除空的会话目录
+    sessions_dir = os.path.join(root, 'sessions')
+    if os.path.isdir(sessions_dir):
+        for name in os.listdir(sessions_dir):
+            try:
+                os.rmdir(os.path.join(sessions_dir, name))
+            except OSError:
+                pass
+    return removed, freed
+
+
+_last_sweep = 0.0
+_sweep_lock = threading.Lock()
+
+def _sweep_once() -> None:
+    if not _sweep_lock.acquire(blocking=False):
+        return
+    try:
+        sweep()
+    except Exception:
+        pass
+    finally:
+        _sweep_lock.release()
+
+
+def schedule_sweep() -> None:
+    """距上次清理超过 OUTPUT_SWEEP_INTERVAL 时在后台线程中清理一次，调用方不等待。"""
+    global _last_sweep
+    now = time.monotonic()
+    if _last_sweep and now - _last_sweep < OUTPUT_SWEEP_INTERVAL:
+        return
+    _last_sweep = now
+    threading.Thread(target=_sweep_once, daemon=True).start()
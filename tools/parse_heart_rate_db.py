@@ -2,82 +2,125 @@ import sqlite3
 from datetime import datetime
 import os
 import sys
-import pandas as pd
 import asyncio
+from typing import TYPE_CHECKING
 from agentscope.message import TextBlock
 from agentscope.tool import ToolResponse
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 from config import Config
+from tools.data_handles import preview_frame, register_frame
+from tools.health_store import health_db_path
 
+if TYPE_CHECKING:
+    import pandas as pd
 
-def _read_heart_rate_db_sync() -> ToolResponse:
-    """同步版本的数据库读取逻辑，便于在线程池中调用。"""
-    db_path = Config['DB_PATH']
+
+HEART_RATE_TABLE = 'XIAOMI_DAILY_SUMMARY_SAMPLE'
+
+HEART_RATE_COLUMN_DESC = {
+    'TIMESTAMP': 'INTEGER - 时间戳（格式化为日期时间）',
+    'DEVICE_ID': 'INTEGER - 设备ID',
+    'USER_ID': 'INTEGER - 用户ID',
+    'TIMEZONE': 'INTEGER - 时区',
+    'STEPS': 'INTEGER - 步数',
+    'HR_RESTING': 'INTEGER - 静息心率',
+    'HR_MAX': 'INTEGER - 最大心率',
+    'HR_MAX_TS': 'INTEGER - 最大心率发生的时间戳（格式化为日期时间）',
+    'HR_MIN': 'INTEGER - 最小心率',
+    'HR_MIN_TS': 'INTEGER - 最小心率发生的时间戳（格式化为日期时间）',
+    'HR_AVG': 'INTEGER - 平均心率'
+}
+
+
+# 更稳健的毫秒 -> 日期字符串转换器，能处理 None/NaN/空字符串/异常值
+def _safe_ms_to_datetime_str(ts_ms, fmt: str = "%Y-%m-%d %H:%M:%S"):
+    import pandas as pd
+
+    try:
+        if ts_ms is None:
+            return None
+        # pandas NA/NaN
+        if pd.isna(ts_ms):
+            return None
+        s = str(ts_ms).strip()
+        if s == '':
+            return None
+        val = int(float(s))
+        return datetime.fromtimestamp(val / 1000.0).strftime(fmt)
+    except Exception:
+        # 如果转换失败，返回 None，这样不会打断整个流程
+        return None
+
+
+def load_heart_rate_df() -> "pd.DataFrame":
+    """读取 XIAOMI_DAILY_SUMMARY_SAMPLE 表并把毫秒时间戳格式化为日期时间字符串。
+
+    数据库文件或表不存在时抛出 LookupError（异常信息可直接返回给用户）。
+    """
+    db_path = health_db_path()
     if not os.path.exists(db_path):
-        return ToolResponse(TextBlock(text=f"数据库文件不存在: {db_path}"))
-
-    col_desc = {
-        'TIMESTAMP': 'INTEGER - 时间戳（格式化为日期时间）',
-        'DEVICE_ID': 'INTEGER - 设备ID',
-        'USER_ID': 'INTEGER - 用户ID',
-        'TIMEZONE': 'INTEGER - 时区',
-        'STEPS': 'INTEGER - 步数',
-        'HR_RESTING': 'INTEGER - 静息心率',
-        'HR_MAX': 'INTEGER - 最大心率',
-        'HR_MAX_TS': 'INTEGER - 最大心率发生的时间戳（格式化为日期时间）',
-        'HR_MIN': 'INTEGER - 最小心率',
-        'HR_MIN_TS': 'INTEGER - 最小心率发生的时间戳（格式化为日期时间）',
-        'HR_AVG': 'INTEGER - 平均心率'
-    }
+        raise LookupError(f"数据库文件不存在: {db_path}")
 
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # 检查表是否存在
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='XIAOMI_DAILY_SUMMARY_SAMPLE'")
-    if not cursor.fetchall():
+    try:
+        cursor = conn.cursor()
+
+        # 检查表是否存在
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (HEART_RATE_TABLE,))
+        if not cursor.fetchall():
+            raise LookupError(f"{HEART_RATE_TABLE} 表不存在。")
+
+        # 获取列信息（只保留前 10 列日汇总字段）
+        cursor.execute(f"PRAGMA table_info({HEART_RATE_TABLE})")
+        cols_info = cursor.fetchall()
+        columns = [c[1] for c in cols_info][0:10]
+
+        # 获取所有数据（存储库按设备、用户聚簇，显式按时间排序；旧导出可能没有这些列）
+        order = [c for c in ('TIMESTAMP', 'DEVICE_ID') if c in {info[1] for info in cols_info}]
+        order_by = f" ORDER BY {', '.join(order)}" if order else ''
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {HEART_RATE_TABLE}{order_by}")
+        rows = cursor.fetchall()
+    finally:
         conn.close()
-        return ToolResponse(TextBlock(text="XIAOMI_DAILY_SUMMARY_SAMPLE 表不存在。"))
-
-    # 获取列信息
-    cursor.execute("PRAGMA table_info(XIAOMI_DAILY_SUMMARY_SAMPLE)")
-    cols_info = cursor.fetchall()
-    columns = [c[1] for c in cols_info][0:10]
-
-    # 获取所有数据
-    cursor.execute("SELECT * FROM XIAOMI_DAILY_SUMMARY_SAMPLE")
-    rows = cursor.fetchall()
-
-    df = pd.DataFrame(rows, columns=columns)[columns]
-
-    # 内嵌一个更稳健的毫秒 -> 日期字符串转换器，能处理 None/NaN/空字符串/异常值
-    def _safe_ms_to_datetime_str(ts_ms, fmt: str = "%Y-%m-%d %H:%M:%S"):
-        try:
-            if ts_ms is None:
-                return None
-            # pandas NA/NaN
-            if pd.isna(ts_ms):
-                return None
-            s = str(ts_ms).strip()
-            if s == '':
-                return None
-            val = int(float(s))
-            return datetime.fromtimestamp(val / 1000.0).strftime(fmt)
-        except Exception:
-            # 如果转换失败，返回 None，这样不会打断整个流程
-            return None
 
+    import pandas as pd
+
+    df = pd.DataFrame(rows, columns=columns)
     if 'TIMESTAMP' in df.columns:
         df['TIMESTAMP'] = df['TIMESTAMP'].apply(_safe_ms_to_datetime_str)
     if 'HR_MAX_TS' in df.columns:
         df['HR_MAX_TS'] = df['HR_MAX_TS'].apply(_safe_ms_to_datetime_str)
     if 'HR_MIN_TS' in df.columns:
         df['HR_MIN_TS'] = df['HR_MIN_TS'].apply(_safe_ms_to_datetime_str)
+    return df
+
+
+def _read_heart_rate_db_sync() -> ToolResponse:
+    """同步版本的数据库读取逻辑，便于在线程池中调用。"""
+    try:
+        df = load_heart_rate_df()
+    except LookupError as e:
+        return ToolResponse(content=[TextBlock(type="text", text=str(e))])
 
     # 不要将列映射（长度为列数）直接赋值给 DataFrame 的列（长度为行数），会导致长度不匹配错误。
     # 我们把列说明保存在一个字典里，并在返回内容中一并提供。
-    column_descriptions = {col: col_desc.get(col, '') for col in df.columns}
-    conn.close()
+    column_descriptions = {col: HEART_RATE_COLUMN_DESC.get(col, '') for col in df.columns}
+
+    # 把结果集登记为数据句柄，作图时由沙箱直接加载，无需 LLM 复制数据
+    # 登记成功时只返回首尾预览与统计，避免整张表进入模型上下文；登记失败时才返回完整表格
+    blocks = []
+    table_text = None
+    try:
+        handle = register_frame(df, 'heart_rate')
+        table_text = preview_frame(df, handle)
+        blocks.append(
+            TextBlock(
+                type="text",
+                text=f"数据句柄: <data_handle>{handle}</data_handle>（作图时把该句柄传给 data_handles 参数，脚本中可直接使用同名 DataFrame 变量）",
+            )
+        )
+    except Exception:
+        pass
 
     # 返回 DataFrame 的文本表示和列说明字典
     return ToolResponse(
@@ -88,12 +131,13 @@ def _read_heart_rate_db_sync() -> ToolResponse:
             ),
             TextBlock(
                 type="text",
-                text=df.to_string(),
+                text=table_text or df.to_string(),
             ),
             TextBlock(
                 type="text",
                 text=f"列说明: {column_descriptions}",
             ),
+            *blocks,
         ]
     )
 
@@ -107,7 +151,7 @@ async def read_heart_rate_db() -> ToolResponse:
         无
 
     Returns:
-        ToolResponse: 包含若干 TextBlock。第一条为记录数统计，第二条为 DataFrame 的字符串表示，第三条为列说明；在出错或找不到数据库/表时返回包含错误信息的 TextBlock。
+        ToolResponse: 包含若干 TextBlock。第一条为记录数统计，第二条为数据表（已登记句柄时为首尾若干行与数值列统计，完整数据通过句柄读取），第三条为列说明，第四条为可供作图沙箱直接加载的数据句柄；在出错或找不到数据库/表时返回包含错误信息的 TextBlock。
     """
     return await asyncio.to_thread(_read_heart_rate_db_sync)
         
@@ -3,82 +3,125 @@ import json
 from datetime import datetime
 import os
 import sys
-import pandas as pd
 import asyncio
+from typing import TYPE_CHECKING
 from agentscope.message import TextBlock
 from agentscope.tool import ToolResponse
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 from config import Config
+from tools.data_handles import preview_frame, register_frame
+from tools.health_store import health_db_path
 
+if TYPE_CHECKING:
+    import pandas as pd
 
-def _read_sleep_db_sync() -> ToolResponse:
-    """同步版本的数据库读取逻辑，便于在线程池中调用。"""
-    db_path = Config['DB_PATH']
+
+SLEEP_TABLE = 'XIAOMI_SLEEP_TIME_SAMPLE'
+
+SLEEP_COLUMN_DESC = {
+    'SLEEP_TIME': 'DATETIME - 时间戳（格式化为日期时间）',
+    'DEVICE_ID': 'INTEGER - 设备ID',
+    'USER_ID': 'INTEGER - 用户ID',
+    'WAKEUP_TIME': 'DATETIME - 醒来时间（格式化为日期时间）',
+    'IS_AWAKE': 'INTEGER - 是否醒着（布尔/标志）',
+    'TOTAL_DURATION': 'INTEGER - 总时长（分钟）',
+    'DEEP_SLEEP_DURATION': 'INTEGER - 深度睡眠时长（分钟）',
+    'LIGHT_SLEEP_DURATION': 'INTEGER - 浅睡时长（分钟）',
+    'REM_SLEEP_DURATION': 'INTEGER - 快速眼动睡眠时长（分钟）',
+    'AWAKE_DURATION': 'INTEGER - 清醒时长（分钟）',
+}
+
+
+# 更稳健的毫秒 -> 日期字符串转换器，能处理 None/NaN/空字符串/异常值
+def _safe_ms_to_datetime_str(ts_ms, fmt: str = "%Y-%m-%d %H:%M:%S"):
+    import pandas as pd
+
+    try:
+        if ts_ms is None:
+            return None
+        # pandas NA/NaN
+        if pd.isna(ts_ms):
+            return None
+        s = str(ts_ms).strip()
+        if s == '':
+            return None
+        val = int(float(s))
+        return datetime.fromtimestamp(val / 1000.0).strftime(fmt)
+    except Exception:
+        # 如果转换失败，返回 None，这样不会打断整个流程
+        return None
+
+
+def load_sleep_df() -> "pd.DataFrame":
+    """读取 XIAOMI_SLEEP_TIME_SAMPLE 表并把毫秒时间戳格式化为日期时间字符串。
+
+    数据库文件或表不存在时抛出 LookupError（异常信息可直接返回给用户）。
+    """
+    db_path = health_db_path()
     if not os.path.exists(db_path):
-        return ToolResponse(TextBlock(text=f"数据库文件不存在: {db_path}"))
-
-    col_desc = {
-        'SLEEP_TIME': 'DATETIME - 时间戳（格式化为日期时间）',
-        'DEVICE_ID': 'INTEGER - 设备ID',
-        'USER_ID': 'INTEGER - 用户ID',
-        'WAKEUP_TIME': 'DATETIME - 醒来时间（格式化为日期时间）',
-        'IS_AWAKE': 'INTEGER - 是否醒着（布尔/标志）',
-        'TOTAL_DURATION': 'INTEGER - 总时长（分钟）',
-        'DEEP_SLEEP_DURATION': 'INTEGER - 深度睡眠时长（分钟）',
-        'LIGHT_SLEEP_DURATION': 'INTEGER - 浅睡时长（分钟）',
-        'REM_SLEEP_DURATION': 'INTEGER - 快速眼动睡眠时长（分钟）',
-        'AWAKE_DURATION': 'INTEGER - 清醒时长（分钟）',
-    }
+        raise LookupError(f"数据库文件不存在: {db_path}")
 
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # 检查表是否存在
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='XIAOMI_SLEEP_TIME_SAMPLE'")
-    if not cursor.fetchall():
+    try:
+        cursor = conn.cursor()
+
+        # 检查表是否存在
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (SLEEP_TABLE,))
+        if not cursor.fetchall():
+            raise LookupError(f"{SLEEP_TABLE} 表不存在。")
+
+        # 获取列信息
+        cursor.execute(f"PRAGMA table_info({SLEEP_TABLE})")
+        cols_info = cursor.fetchall()
+        columns = [c[1] for c in cols_info]
+
+        # 获取所有数据（存储库按设备、用户聚簇，显式按时间排序；旧导出可能没有这些列）
+        order = [c for c in ('TIMESTAMP', 'DEVICE_ID') if c in {info[1] for info in cols_info}]
+        order_by = f" ORDER BY {', '.join(order)}" if order else ''
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {SLEEP_TABLE}{order_by}")
+        rows = cursor.fetchall()
+    finally:
         conn.close()
-        return ToolResponse(TextBlock(text="XIAOMI_SLEEP_TIME_SAMPLE 表不存在。"))
-
-    # 获取列信息
-    cursor.execute("PRAGMA table_info(XIAOMI_SLEEP_TIME_SAMPLE)")
-    cols_info = cursor.fetchall()
-    columns = [c[1] for c in cols_info]
 
-    # 获取所有数据
-    cursor.execute("SELECT * FROM XIAOMI_SLEEP_TIME_SAMPLE")
-    rows = cursor.fetchall()
+    import pandas as pd
 
     df = pd.DataFrame(rows, columns=columns)
     # 如果存在 TIMESTAMP 列，重命名为 SLEEP_TIME
     if 'TIMESTAMP' in df.columns and 'SLEEP_TIME' not in df.columns:
         df.rename(columns={'TIMESTAMP': 'SLEEP_TIME'}, inplace=True)
-
-    # 内嵌一个更稳健的毫秒 -> 日期字符串转换器，能处理 None/NaN/空字符串/异常值
-    def _safe_ms_to_datetime_str(ts_ms, fmt: str = "%Y-%m-%d %H:%M:%S"):
-        try:
-            if ts_ms is None:
-                return None
-            # pandas NA/NaN
-            if pd.isna(ts_ms):
-                return None
-            s = str(ts_ms).strip()
-            if s == '':
-                return None
-            val = int(float(s))
-            return datetime.fromtimestamp(val / 1000.0).strftime(fmt)
-        except Exception:
-            # 如果转换失败，返回 None，这样不会打断整个流程
-            return None
-
     if 'SLEEP_TIME' in df.columns:
         df['SLEEP_TIME'] = df['SLEEP_TIME'].apply(_safe_ms_to_datetime_str)
     if 'WAKEUP_TIME' in df.columns:
         df['WAKEUP_TIME'] = df['WAKEUP_TIME'].apply(_safe_ms_to_datetime_str)
+    return df
+
+
+def _read_sleep_db_sync() -> ToolResponse:
+    """同步版本的数据库读取逻辑，便于在线程池中调用。"""
+    try:
+        df = load_sleep_df()
+    except LookupError as e:
+        return ToolResponse(content=[TextBlock(type="text", text=str(e))])
 
     # 不要将列映射（长度为列数）直接赋值给 DataFrame 的列（长度为行数），会导致长度不匹配错误。
     # 我们把列说明保存在一个字典里，并在返回内容中一并提供。
-    column_descriptions = {col: col_desc.get(col, '') for col in df.columns}
-    conn.close()
+    column_descriptions = {col: SLEEP_COLUMN_DESC.get(col, '') for col in df.columns}
+
+    # 把结果集登记为数据句柄，作图时由沙箱直接加载，无需 LLM 复制数据
+    # 登记成功时只返回首尾预览与统计，避免整张表进入模型上下文；登记失败时才返回完整表格
+    blocks = []
+    table_text = None
+    try:
+        handle = register_frame(df, 'sleep')
+        table_text = preview_frame(df, handle)
+        blocks.append(
+            TextBlock(
+                type="text",
+                text=f"数据句柄: <data_handle>{handle}</data_handle>（作图时把该句柄传给 data_handles 参数，脚本中可直接使用同名 DataFrame 变量）",
+            )
+        )
+    except Exception:
+        pass
 
     # 返回 DataFrame 的文本表示和列说明字典（不写入 last_*.json）
     return ToolResponse(
@@ -89,12 +132,13 @@ def _read_sleep_db_sync() -> ToolResponse:
             ),
             TextBlock(
                 type="text",
-                text=df.to_string(),
+                text=table_text or df.to_string(),
             ),
             TextBlock(
                 type="text",
                 text=f"列说明: {column_descriptions}",
             ),
+            *blocks,
         ]
     )
 
@@ -108,7 +152,7 @@ async def read_sleep_db() -> ToolResponse:
         无
 
     Returns:
-        ToolResponse: 包含若干 TextBlock。第一条为记录数统计，第二条为 DataFrame 的字符串表示，第三条为列说明；在出错或找不到数据库/表时返回包含错误信息的 TextBlock。
+        ToolResponse: 包含若干 TextBlock。第一条为记录数统计，第二条为数据表（已登记句柄时为首尾若干行与数值列统计，完整数据通过句柄读取），第三条为列说明，第四条为可供作图沙箱直接加载的数据句柄；在出错或找不到数据库/表时返回包含错误信息的 TextBlock。
     """
     return await asyncio.to_thread(_read_sleep_db_sync)
         
@@ -0,0 +1,290 @@
+"""按页码与章节结构切分指南类 PDF：片段不跨越章节 / 推荐意见 / 表格的边界，并记录页码与所属章节。
+
+流程：
+1. 逐页提取文本，去掉在多数页面重复出现的页眉页脚与页码行；
+2. 识别标题行（第X章、一、（一）、1.1 / 1.1.1、1.、（1）以及“推荐意见 N”“表 N”等边界），
+   按标题层级维护章节路径，把正文划分为章节；参考文献部分不入库；
+3. 合并过短的章节（只有标题或一两句话）与同级的相邻短章节，过长的章节按句子打包为不超过
+   CHUNK_SIZE 的片段，相邻片段保留约 CHUNK_OVERLAP 字的重叠；
+4. 合并断行、去掉中文字符之间由排版产生的空格。
+
+每个片段的 metadata 包含 source、file、title、page / page_end（从 1 开始）、section 与
+chunker（切分版本，规则变化时递增 CHUNKER_VERSION，已入库的文件会被重新切分）。
+文本提取（pypdf，纯 Python、CPU 密集）按页段分配到 spawn 进程池并行执行（`PDF_PARSE_WORKERS`），
+大文件也能分摊到多个进程。
+"""
+import multiprocessing
+import os
+import re
+import sys
+from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+from tools.vdbs_utils import CHUNK_OVERLAP, CHUNK_SIZE
+
+
+CHUNKER_VERSION = 3
+MIN_SECTION_CHARS = 100     # 短于该长度的章节并入下一章节
+PAGES_PER_TASK = 8          # 并行提取时每个任务的页数
+PDF_PARSE_WORKERS = Config.get('PDF_PARSE_WORKERS', min(4, os.cpu_count() or 1))
+
+_CN_NUM = '一二三四五六七八九十'
+_CJK = '一-鿿'
+
+# (正则, 层级)；层级越小越靠上，边界类（推荐意见、表）层级最低
+_HEADINGS = [
+    (re.compile(rf'^第[{_CN_NUM}百]+[章节部分篇]'), 1),
+    (re.compile(rf'^[{_CN_NUM}]+[、．.]\s*(?=[{_CJK}])'), 2),
+    (re.compile(rf'^[（(][{_CN_NUM}]+[)）]\s*(?=[{_CJK}])'), 3),
+    (re.compile(rf'^\d{{1,2}}[、．.]\s*(?=[{_CJK}])'), 8),
+    (re.compile(rf'^[（(]\d{{1,2}}[)）]\s*(?=[{_CJK}])'), 9),
+    (re.compile(r'^推荐意见\s*\d+'), 10),
+    (re.compile(r'^[表图]\s*\d+(?=\s)'), 10),
+]
+_DOTTED = re.compile(rf'^(\d{{1,2}}(?:\.\d{{1,2}}){{1,3}})\s*(?=[{_CJK}A-Z])')
+_INTEGER = re.compile(rf'^(\d{{1,2}})\s+(?=[{_CJK}])')
+_BARE_NUMBER = re.compile(r'^\d{1,2}(\.\d{1,2}){0,3}$')
+_REFERENCES = re.compile(r'^(参考文献|References)[:：]?$', re.I)
+_UNITS = set('年月周日天次项例个种组倍岁分秒小')
+_TITLE_END = re.compile(r'[，。：:；,;（(]')
+_TOC_LEADER = re.compile(r'…{3,}|\.{6,}|·{6,}')
+_PAGE_NUMBER = re.compile(r'^[•·\-–—\s]*(第\s*)?\d{1,4}(\s*页)?[•·\-–—\s]*$')
+_SENTENCE = re.compile(r'[^。！？；!?;]*[。！？；!?;]+|[^。！？；!?;]+$')
+_SPACE_CJK = re.compile(rf'(?<=[{_CJK}，。；：、！？（）《》“”])\s+|\s+(?=[{_CJK}，。；：、！？（）《》“”])')
+
+
+def _clean_pages(pages: list[str]) -> list[list[str]]:
+    """按页拆行，去掉目录行、重复出现的页眉页脚与页首 / 页尾的页码行。"""
+    lines = [[l.strip() for l in text.splitlines() if l.strip() and not _TOC_LEADER.search(l)] for text in pages]
+    key = lambda l: re.sub(r'\d+', '#', l.replace(' ', ''))
+    counts = Counter(k for page in lines for k in {key(l) for l in page[:3] + page[-3:]})
+    repeated = {k for k, n in counts.items() if len(pages) >= 4 and n >= max(2, 0.3 * len(pages))}
+
+    cleaned = []
+    for page in lines:
+        edge = set(range(min(2, len(page)))) | set(range(max(0, len(page) - 2), len(page)))
+        cleaned.append([
+            l for i, l in enumerate(page)
+            if not (i in edge and (_PAGE_NUMBER.match(l) or key(l) in repeated))
+        ])
+    return cleaned
+
+
+def _title(line: str, marker: str) -> str:
+    """编号 + 标题文字：标题截至标点或空白，但至少包含两个汉字（“第四章 2 型糖尿病…”中的空格由排版产生）。"""
+    title = ''
+    for token in line[len(marker):].split():
+        end = _TITLE_END.search(token)
+        title += token[:end.start()] if end else token
+        if end or len(re.findall(f'[{_CJK}]', title)) >= 2:
+            break
+    return (re.sub(r'\s', '', marker) + title)[:30]
+
+
+class _HeadingParser:
+    """识别标题行并返回 (层级, 标题)。
+
+    带点的编号（1.2、1.2.3）需带至少两个字的标题，排除正文中的小数；不带点的整数编号（“4 安全性讨论”）
+    容易与“3 项研究”混淆，只接受紧接上一个带点编号的下一个章节号。
+    """
+
+    def __init__(self):
+        self.last_dotted: tuple[int, ...] | None = None
+
+    def parse(self, line: str) -> tuple[int, str] | None:
+        if len(line) > 60:
+            return None
+        m = _DOTTED.match(line) or _INTEGER.match(line)
+        if m:
+            number = tuple(int(n) for n in m.group(1).split('.'))
+            title = _title(line, m.group(0))
+            if len(title) - len(m.group(1)) < 2:
+                return None
+            if len(number) == 1 and (self.last_dotted is None or number[0] != self.last_dotted[0] + 1
+                                     or len(title) - len(m.group(1)) < 3 or title[len(m.group(1))] in _UNITS):
+                return None
+            self.last_dotted = number
+            return 3 + len(number), title
+        for pattern, level in _HEADINGS:
+            m = pattern.match(line)
+            if m:
+                if level == 10:
+                    return level, (m.group(0) if line.startswith('推荐') else line)[:30]
+                title = _title(line, m.group(0))
+                return (level, title) if len(title) > len(m.group(0).strip()) else None
+        return None
+
+
+def _sections(pages: list[list[str]]) -> list[dict]:
+    """划分章节：[{headings: [(层级, 标题)], lines: [(行, 页号)]}, ...]"""
+    parser = _HeadingParser()
+    stack: list[tuple[int, str]] = []
+    sections = [{'headings': [], 'lines': []}]
+    skipping = False
+    lines = [(line, page_no) for page_no, page in enumerate(pages) for line in page]
+    i = 0
+    while i < len(lines):
+        line, page_no = lines[i]
+        i += 1
+        if _REFERENCES.match(re.sub(r'\s', '', line)):
+            skipping = True
+            continue
+        heading = None
+        # 编号与标题被提取为两行时（“2.1” / “检索策略”，“4” / “安全性讨论”）合并后再识别
+        if _BARE_NUMBER.match(line) and i < len(lines):
+            heading = parser.parse(f'{line} {lines[i][0]}')
+            if heading:
+                line = f'{line} {lines[i][0]}'
+                i += 1
+        heading = heading or parser.parse(line)
+        if heading:
+            level = heading[0]
+            if skipping and level > 1:
+                continue
+            skipping = False
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append(heading)
+            if level == 1:
+                parser.last_dotted = None
+            sections.append({'headings': list(stack), 'lines': []})
+        if not skipping:
+            sections[-1]['lines'].append((line, page_no))
+    return [s for s in sections if s['lines']]
+
+
+def _section_text(section: dict) -> tuple[str, list[int], list[int]]:
+    """合并断行并返回章节文本、各行在文本中的起始位置与对应页号（用于把片段映射回页码）。
+
+    两侧都是字母数字时补一个空格，其余直接相连；行内中文之间由排版产生的空格一并去掉。
+    """
+    text, starts, page_nos = '', [], []
+    for line, page_no in section['lines']:
+        line = _SPACE_CJK.sub('', line)
+        if text and text[-1].isascii() and text[-1].isalnum() and line[0].isascii() and line[0].isalnum():
+            text += ' '
+        starts.append(len(text))
+        page_nos.append(page_no)
+        text += line
+    return text, starts, page_nos
+
+
+def _merged_headings(a: list, b: list) -> list:
+    """合并两个章节后的章节路径：b 是 a 的下级时沿用 b，否则取共同的上级。"""
+    if b[:len(a)] == a:
+        return b
+    n = 0
+    while n < min(len(a), len(b)) and a[n] == b[n]:
+        n += 1
+    return a[:n]
+
+
+def _merge_small(sections: list[dict]) -> list[dict]:
+    """过短的章节并入下一章节；同一上级下相邻的章节合并后不超过 CHUNK_SIZE 时合为一段。"""
+    size = lambda s: sum(len(l) for l, _ in s['lines'])
+    merged: list[dict] = []
+    carry = None
+    for s in sections:
+        if carry:
+            s = {'headings': _merged_headings(carry['headings'], s['headings']), 'lines': carry['lines'] + s['lines']}
+            carry = None
+        if size(s) < MIN_SECTION_CHARS:
+            carry = s
+            continue
+        prev = merged[-1] if merged else None
+        if prev and prev['headings'][:-1] == s['headings'][:-1] and size(prev) + size(s) <= CHUNK_SIZE:
+            merged[-1] = {'headings': _merged_headings(prev['headings'], s['headings']),
+                          'lines': prev['lines'] + s['lines']}
+        else:
+            merged.append(s)
+    if carry:
+        if merged:
+            merged[-1] = {'headings': _merged_headings(merged[-1]['headings'], carry['headings']),
+                          'lines': merged[-1]['lines'] + carry['lines']}
+        else:
+            merged.append(carry)
+    return merged
+
+
+def _pack(text: str) -> list[tuple[int, str]]:
+    """按句子把长文本打包为不超过 CHUNK_SIZE 的片段，返回 [(起始位置, 片段)]；相邻片段保留句子级重叠。"""
+    sentences = []
+    for m in _SENTENCE.finditer(text):
+        s = m.group(0)
+        # 超长的句子（如表格内容）按长度硬切
+        for i in range(0, len(s), CHUNK_SIZE):
+            sentences.append((m.start() + i, s[i:i + CHUNK_SIZE]))
+    chunks, current = [], []
+    for start, s in sentences:
+        if current and sum(len(x) for _, x in current) + len(s) > CHUNK_SIZE:
+            chunks.append((current[0][0], ''.join(x for _, x in current)))
+            # 重叠既不超过 CHUNK_OVERLAP，也要给下一句留出位置；整个片段都能放进重叠时不重叠，
+            # 否则短片段会原样重复出现在下一个片段里
+            budget = min(CHUNK_OVERLAP, CHUNK_SIZE - len(s))
+            overlap, overlap_len = [], 0
+            for item in reversed(current[1:]):
+                if overlap_len + len(item[1]) > budget:
+                    break
+                overlap.insert(0, item)
+                overlap_len += len(item[1])
+            current = overlap
+        current.append((start, s))
+    if current:
+        chunks.append((current[0][0], ''.join(x for _, x in current)))
+    return chunks
+
+
+def chunk_pages(path: str, pages: list[str]) -> list[tuple[str, dict]]:
+    """切分一个 PDF 的逐页文本，返回 [(片段文本, metadata), ...]。"""
+    fname = os.path.basename(path)
+    base = {'source': path, 'file': fname, 'title': os.path.splitext(fname)[0], 'chunker': CHUNKER_VERSION}
+
+    chunks = []
+    for section in _merge_small(_sections(_clean_pages(pages))):
+        text, starts, page_nos = _section_text(section)
+        for offset, chunk in _pack(text):
+            end = offset + len(chunk) - 1
+            chunks.append((chunk, {
+                **base,
+                'page': page_nos[bisect_right(starts, offset) - 1] + 1,
+                'page_end': page_nos[bisect_right(starts, end) - 1] + 1,
+                'section': ' > '.join(t for _, t in section['headings']),
+            }))
+    return chunks
+
+
+def _page_count(path: str) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(path).pages)
+
+
+def _extract_pages(path: str, start: int, end: int) -> list[str]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or '' for i in range(start, end)]
+
+
+def chunk_pdfs(paths: list[str], workers: int = PDF_PARSE_WORKERS) -> list[list[tuple[str, dict]]]:
+    """解析并切分多个 PDF，结果顺序与 paths 一致。
+
+    文本提取按 PAGES_PER_TASK 页一段并行执行；结果只包含普通对象，跨进程传递开销小。
+    """
+    tasks = [(path, start, min(start + PAGES_PER_TASK, n))
+             for path, n in zip(paths, map(_page_count, paths))
+             for start in range(0, n, PAGES_PER_TASK)]
+    if workers <= 1 or len(tasks) <= 1:
+        texts = [_extract_pages(*t) for t in tasks]
+    else:
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=ctx) as pool:
+            texts = list(pool.map(_extract_pages, *zip(*tasks)))
+
+    pages: dict[str, list[str]] = {path: [] for path in paths}
+    for (path, _, _), text in zip(tasks, texts):
+        pages[path].extend(text)
+    return [chunk_pages(path, pages[path]) for path in paths]
@@ -1,42 +1,278 @@
 import asyncio
 import json
-from biomcp.articles.search import search_articles, PubmedRequest
+import os
+import sqlite3
+import sys
+import threading
+import time
+
 from agentscope.message import TextBlock
 from agentscope.tool import ToolResponse
 
-async def pubmed_search(diseases: str, keywords: str = '') -> ToolResponse:
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+from tools.build_literature_vdbs import ingest_pubmed_articles, search_local_literature
+from tools.vdbs_utils import run_blocking
+
+
+_ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+
+# 缓存与输出预算（均可在 Config 中覆盖）
+PUBMED_CACHE_PATH = Config.get('PUBMED_CACHE_PATH') or os.path.join(_ROOT, 'data', 'cache', 'pubmed_cache.sqlite')
+PUBMED_QUERY_TTL = Config.get('PUBMED_QUERY_TTL', 7 * 24 * 3600)     # 查询 -> PMID 列表的有效期（秒）
+PUBMED_FETCH_LIMIT = Config.get('PUBMED_FETCH_LIMIT', 20)            # 单次向 PubMed 拉取的候选文章数
+PUBMED_MAX_RESULTS = Config.get('PUBMED_MAX_RESULTS', 5)             # 最终返回给 LLM 的文章数
+PUBMED_ABSTRACT_CHARS = Config.get('PUBMED_ABSTRACT_CHARS', 800)     # 每篇摘要的字符上限
+PUBMED_RERANK = Config.get('PUBMED_RERANK', False)                   # 是否使用 embedding 对摘要重排
+LITERATURE_MIN_SCORE = Config.get('LITERATURE_MIN_SCORE', 0.6)       # 本地文献库命中的相似度阈值
+LITERATURE_MIN_HITS = Config.get('LITERATURE_MIN_HITS', 3)           # 本地命中文章数达到该值时不再联网
+
+# 后台入库任务的引用，防止任务在完成前被回收
+_background_tasks = set()
+
+
+# 模块级单例：SQLite 连接在多个线程间共享，由锁保证串行访问
+_cache_conn = None
+_cache_lock = threading.Lock()
+
+def _get_cache_conn() -> sqlite3.Connection:
+    global _cache_conn
+    if _cache_conn is None:
+        os.makedirs(os.path.dirname(PUBMED_CACHE_PATH), exist_ok=True)
+        conn = sqlite3.connect(PUBMED_CACHE_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS articles (
+                pmid TEXT PRIMARY KEY,
+                title TEXT,
+                journal TEXT,
+                abstract TEXT,
+                payload TEXT,
+                embedding BLOB,
+                fetched_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS queries (
+                query_key TEXT PRIMARY KEY,
+                pmids TEXT,
+                created_at REAL
+            );
+            """
+        )
+        _cache_conn = conn
+    return _cache_conn
+
+
+def _query_key(diseases: str, keywords: str) -> str:
+    """规范化查询条件，作为 queries 表的主键。"""
+    return json.dumps([diseases.strip().lower(), keywords.strip().lower()], ensure_ascii=False)
+
+
+def _load_cached_query(query_key: str) -> list[dict] | None:
+    """返回未过期查询对应的文章列表（保持原有顺序）；缓存缺失或不完整时返回 None。"""
+    with _cache_lock:
+        conn = _get_cache_conn()
+        row = conn.execute(
+            "SELECT pmids, created_at FROM queries WHERE query_key = ?", (query_key,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > PUBMED_QUERY_TTL:
+            return None
+        pmids = json.loads(row[0])
+        if not pmids:
+            return []
+        placeholders = ','.join('?' * len(pmids))
+        rows = conn.execute(
+            f"SELECT pmid, payload FROM articles WHERE pmid IN ({placeholders})", pmids
+        ).fetchall()
+
+    by_pmid = {pmid: json.loads(payload) for pmid, payload in rows}
+    if len(by_pmid) != len(pmids):
+        return None
+    return [by_pmid[p] for p in pmids]
+
+
+def _store_query(query_key: str, articles: list[dict]) -> None:
+    """批量写入文章缓存（按 PMID 去重更新），并记录查询结果。"""
+    now = time.time()
+    with _cache_lock:
+        conn = _get_cache_conn()
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO articles (pmid, title, journal, abstract, payload, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(pmid) DO UPDATE SET
+                    title = excluded.title,
+                    journal = excluded.journal,
+                    abstract = excluded.abstract,
+                    payload = excluded.payload,
+                    fetched_at = excluded.fetched_at
+                """,
+                [
+                    (str(a['pmid']), a.get('title', ''), a.get('journal', ''), a.get('abstract', ''),
+                     json.dumps(a, ensure_ascii=False), now)
+                    for a in articles
+                ],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO queries (query_key, pmids, created_at) VALUES (?, ?, ?)",
+                (query_key, json.dumps([str(a['pmid']) for a in articles]), now),
+            )
+
+
+def _rerank_sync(query: str, articles: list[dict]) -> list[dict]:
+    """用 embedding 计算摘要与查询的余弦相似度并降序排列；文章向量缓存在 articles 表中。"""
+    import dashscope
+    import numpy as np
+    from langchain_dashscope import DashScopeEmbeddings
+
+    dashscope.api_key = Config['API_KEY']
+    embeddings = DashScopeEmbeddings(model=Config['EMBEDDING_MODEL'])
+
+    pmids = [str(a['pmid']) for a in articles]
+    placeholders = ','.join('?' * len(pmids))
+    with _cache_lock:
+        rows = _get_cache_conn().execute(
+            f"SELECT pmid, embedding FROM articles WHERE pmid IN ({placeholders}) AND embedding IS NOT NULL",
+            pmids,
+        ).fetchall()
+    cached = {pmid: np.frombuffer(blob, dtype=np.float32) for pmid, blob in rows}
+
+    # 仅对缺失向量的文章发起一次批量 embedding 请求
+    missing = [a for a in articles if str(a['pmid']) not in cached]
+    if missing:
+        vectors = embeddings.embed_documents(
+            [f"{a.get('title', '')}\n{a.get('abstract', '')}" for a in missing]
+        )
+        new_rows = []
+        for a, vec in zip(missing, vectors):
+            arr = np.asarray(vec, dtype=np.float32)
+            cached[str(a['pmid'])] = arr
+            new_rows.append((arr.tobytes(), str(a['pmid'])))
+        with _cache_lock:
+            conn = _get_cache_conn()
+            with conn:
+                conn.executemany("UPDATE articles SET embedding = ? WHERE pmid = ?", new_rows)
+
+    q = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+    matrix = np.stack([cached[p] for p in pmids])
+    scores = matrix @ q / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(q) + 1e-12)
+    order = np.argsort(-scores)
+    return [articles[i] for i in order]
+
+
+def _truncate(text: str, limit: int) -> str:
+    text = (text or '').strip()
+    if len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + '……（摘要已截断）'
+
+
+def _local_response(articles: list[dict], note: str) -> ToolResponse:
+    """把本地文献库的检索结果格式化为与联网检索一致的 TextBlock 列表。"""
+    blocks = [TextBlock(type="text", text=f"{note}，返回 {len(articles)} 篇文章。")]
+    for p in articles:
+        blocks.append(
+            TextBlock(
+                type="text",
+                text=f"PMID: {p['pmid']}\n标题: {p['title']}\n期刊: {p['journal']}\n"
+                     f"摘要: {_truncate(' '.join(p['snippets']), PUBMED_ABSTRACT_CHARS)}"
+            )
+        )
+    return ToolResponse(content=blocks)
+
+
+def _schedule_ingest(articles: list[dict]) -> None:
+    """在后台线程中把新文章写入本地文献知识库，不阻塞本次回答。"""
+    async def _ingest():
+        try:
+            await run_blocking(ingest_pubmed_articles, articles)
+        except Exception:
+            pass
+
+    task = asyncio.create_task(_ingest())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def pubmed_search(diseases: str, keywords: str = '', max_results: int = PUBMED_MAX_RESULTS) -> ToolResponse:
     """
     使用 BioMCP 提供的 PubMed 文章搜索功能，针对用户的查询需求进行文献检索，并返回搜索结果。
+    优先检索本地文献知识库，本地命中不足时才联网；联网结果按 PMID 缓存在本地 SQLite 中并写入本地文献知识库。
 
     Args:
         diseases (str): 疾病或主题关键字（字符串），用于 PubMed 检索。
         keywords (str, optional): 额外检索关键词，默认为空字符串。
+        max_results (int, optional): 返回的文章数量上限，已默认配置，调用工具时通常不需要提供。
 
     Returns:
-        ToolResponse: 包含若干 TextBlock，第一条为统计信息，后续为每篇文章的 PMID/标题/期刊/摘要；出错时返回描述错误的 TextBlock。
+        ToolResponse: 包含若干 TextBlock，第一条为统计信息，后续为每篇文章的 PMID/标题/期刊/摘要（摘要按字符预算截断）；出错时返回描述错误的 TextBlock。
     """
-    article_request = PubmedRequest(
-        diseases=[diseases],
-        keywords=[keywords],
-    )
-    
-    articles_result = await search_articles(article_request, output_json=True)
-    articles_result = json.loads(articles_result)
-    
+    query = f"{diseases} {keywords}".strip()
+
+    # 先查本地文献知识库，命中足够时直接返回
+    try:
+        local = await run_blocking(search_local_literature, query, max_results * 2)
+    except Exception:
+        local = []
+    confident = [a for a, score in local if score >= LITERATURE_MIN_SCORE]
+    if len(confident) >= min(LITERATURE_MIN_HITS, max_results):
+        return _local_response(confident[:max_results], "已从本地文献知识库检索到相关文献")
+
+    query_key = _query_key(diseases, keywords)
+    articles = await asyncio.to_thread(_load_cached_query, query_key)
+
+    if articles is None:
+        from biomcp.articles.search import search_articles, PubmedRequest
+
+        article_request = PubmedRequest(
+            diseases=[diseases],
+            keywords=[keywords] if keywords else [],
+        )
+        try:
+            articles_result = await search_articles(article_request, output_json=True, limit=PUBMED_FETCH_LIMIT)
+            articles_result = json.loads(articles_result)
+        except Exception as e:
+            # 离线或网络异常时退回本地文献库中的最佳结果
+            if local:
+                return _local_response([a for a, _ in local[:max_results]], f"PubMed 联网检索失败（{e}），已改用本地文献知识库")
+            return ToolResponse(content=[TextBlock(type="text", text=f"PubMed 检索失败: {e}")])
+
+        # biomcp 出错时返回 [{"error": ...}]
+        errors = [p['error'] for p in articles_result if 'error' in p]
+        if errors:
+            if local:
+                return _local_response([a for a, _ in local[:max_results]], f"PubMed 联网检索失败（{errors[0]}），已改用本地文献知识库")
+            return ToolResponse(content=[TextBlock(type="text", text=f"PubMed 检索失败: {errors[0]}")])
+
+        articles = [p for p in articles_result if p.get('pmid')]
+        await asyncio.to_thread(_store_query, query_key, articles)
+        _schedule_ingest(articles)
+
+    total = len(articles)
+    if PUBMED_RERANK and len(articles) > max_results:
+        try:
+            articles = await asyncio.to_thread(_rerank_sync, f"{diseases} {keywords}".strip(), articles)
+        except Exception:
+            # 重排失败时退回 PubMed 原始排序
+            pass
+    articles = articles[:max_results]
+
     # 第一条 TextBlock：统计信息
     blocks = [
         TextBlock(
             type="text",
-            text=f"已完成搜索，找到 {len(articles_result)} 篇文章。"
+            text=f"已完成搜索，找到 {total} 篇文章，返回最相关的 {len(articles)} 篇。"
         )
     ]
 
     # 循环生成每条结果
-    for p in articles_result:
+    for p in articles:
         blocks.append(
             TextBlock(
                 type="text",
-                text=f"PMID: {p['pmid']}\n标题: {p['title']}\n期刊: {p['journal']}\n摘要: {p['abstract']}"
+                text=f"PMID: {p['pmid']}\n标题: {p.get('title', '')}\n期刊: {p.get('journal', '')}\n"
+                     f"摘要: {_truncate(p.get('abstract', ''), PUBMED_ABSTRACT_CHARS)}"
             )
         )
 
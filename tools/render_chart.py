@@ -0,0 +1,246 @@
+"""声明式图表渲染：根据紧凑的 JSON 图表描述直接读取健康数据库并在进程内作图。
+
+常用图表（睡眠分期、静息心率趋势、步数柱状图）不再需要 LLM 编写 matplotlib 脚本，
+也不需要启动子进程；Figure 对象按图表类型缓存复用，渲染结果是确定的。
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+from typing import TYPE_CHECKING
+
+import shortuuid
+
+from agentscope.message import TextBlock
+from agentscope.tool import ToolResponse
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+from tools.exec_pool import register_chinese_font
+from tools.data_handles import load_frame, resolve_handle
+from tools.output_store import schedule_sweep, session_output_dir
+from tools.parse_sleep_db import load_sleep_df
+from tools.parse_heart_rate_db import load_heart_rate_df
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from matplotlib.figure import Figure
+
+
+# 预置图表：数据源、图表类型、横轴列与纵轴列
+CHART_PRESETS = {
+    'sleep_stages': {
+        'source': 'sleep',
+        'kind': 'stacked_bar',
+        'x': 'SLEEP_TIME',
+        'y': ['DEEP_SLEEP_DURATION', 'LIGHT_SLEEP_DURATION', 'REM_SLEEP_DURATION', 'AWAKE_DURATION'],
+        'title': '每晚睡眠分期',
+        'ylabel': '时长（分钟）',
+    },
+    'resting_hr': {
+        'source': 'heart_rate',
+        'kind': 'line',
+        'x': 'TIMESTAMP',
+        'y': ['HR_RESTING'],
+        'title': '静息心率趋势',
+        'ylabel': '心率（次/分钟）',
+    },
+    'steps': {
+        'source': 'heart_rate',
+        'kind': 'bar',
+        'x': 'TIMESTAMP',
+        'y': ['STEPS'],
+        'title': '每日步数',
+        'ylabel': '步数',
+    },
+}
+
+SERIES_LABELS = {
+    'DEEP_SLEEP_DURATION': '深睡',
+    'LIGHT_SLEEP_DURATION': '浅睡',
+    'REM_SLEEP_DURATION': '快速眼动',
+    'AWAKE_DURATION': '清醒',
+    'TOTAL_DURATION': '总时长',
+    'HR_RESTING': '静息心率',
+    'HR_AVG': '平均心率',
+    'HR_MAX': '最大心率',
+    'HR_MIN': '最小心率',
+    'STEPS': '步数',
+}
+
+DATA_LOADERS = {
+    'sleep': load_sleep_df,
+    'heart_rate': load_heart_rate_df,
+}
+
+CHART_KINDS = ('line', 'bar', 'stacked_bar')
+
+
+# 模块级缓存：每种图表类型复用一个 Figure，渲染时加锁避免并发修改
+_figures: dict[str, "Figure"] = {}
+_render_lock = threading.Lock()
+_font_ready = False
+
+def _get_figure(kind: str) -> "Figure":
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    global _font_ready
+    if not _font_ready:
+        register_chinese_font()
+        _font_ready = True
+    fig = _figures.get(kind)
+    if fig is None:
+        fig = Figure(figsize=(10, 5), dpi=120, layout='constrained')
+        FigureCanvasAgg(fig)
+        _figures[kind] = fig
+    return fig
+
+
+def _resolve_spec(spec: dict) -> dict:
+    """合并预置图表与用户提供的字段，并校验必需字段。"""
+    preset = spec.get('chart')
+    if preset and preset != 'custom':
+        if preset not in CHART_PRESETS:
+            raise ValueError(f"未知的预置图表: {preset}，可选值为 {', '.join(CHART_PRESETS)} 或 custom")
+        resolved = {**CHART_PRESETS[preset], **spec}
+    else:
+        resolved = dict(spec)
+
+    if resolved.get('data_handle'):
+        resolved.pop('source', None)
+    elif resolved.get('source') and resolved['source'] not in DATA_LOADERS:
+        raise ValueError(f"未知的数据源: {resolved['source']}，可选值为 {', '.join(DATA_LOADERS)}")
+    for key in ('kind', 'x', 'y'):
+        if not resolved.get(key):
+            raise ValueError(f"图表描述缺少字段: {key}")
+    if not resolved.get('data_handle') and not resolved.get('source'):
+        raise ValueError("图表描述缺少字段: source 或 data_handle")
+    if resolved['kind'] not in CHART_KINDS:
+        raise ValueError(f"未知的图表类型: {resolved['kind']}，可选值为 {', '.join(CHART_KINDS)}")
+    if isinstance(resolved['y'], str):
+        resolved['y'] = [resolved['y']]
+    return resolved
+
+
+def _select_rows(df: "pd.DataFrame", spec: dict) -> "pd.DataFrame":
+    """按用户、日期范围和最近 N 条记录筛选数据。"""
+    import pandas as pd
+
+    missing = [c for c in [spec['x'], *spec['y']] if c not in df.columns]
+    if missing:
+        raise ValueError(f"数据中不存在列: {', '.join(missing)}")
+
+    df = df.copy()
+    df[spec['x']] = pd.to_datetime(df[spec['x']], errors='coerce')
+    df = df.dropna(subset=[spec['x']]).sort_values(spec['x'])
+
+    if spec.get('user_id') is not None and 'USER_ID' in df.columns:
+        df = df[df['USER_ID'] == int(spec['user_id'])]
+    if spec.get('start'):
+        df = df[df[spec['x']] >= pd.to_datetime(spec['start'])]
+    if spec.get('end'):
+        df = df[df[spec['x']] <= pd.to_datetime(spec['end']) + pd.Timedelta(days=1)]
+    last_n = spec.get('last_n', 14)
+    if last_n:
+        df = df.tail(int(last_n))
+    return df
+
+
+def _draw(fig: "Figure", df: "pd.DataFrame", spec: dict) -> None:
+    fig.clear()
+    ax = fig.add_subplot()
+    x_labels = df[spec['x']].dt.strftime('%m-%d').tolist()
+    positions = range(len(df))
+
+    if spec['kind'] == 'line':
+        for col in spec['y']:
+            ax.plot(positions, df[col].astype(float), marker='o', label=SERIES_LABELS.get(col, col))
+    elif spec['kind'] == 'bar':
+        width = 0.8 / len(spec['y'])
+        for i, col in enumerate(spec['y']):
+            offsets = [p + (i - (len(spec['y']) - 1) / 2) * width for p in positions]
+            ax.bar(offsets, df[col].astype(float), width=width, label=SERIES_LABELS.get(col, col))
+    else:
+        bottom = [0.0] * len(df)
+        for col in spec['y']:
+            values = df[col].fillna(0).astype(float).tolist()
+            ax.bar(positions, values, bottom=bottom, label=SERIES_LABELS.get(col, col))
+            bottom = [b + v for b, v in zip(bottom, values)]
+
+    ax.set_xticks(list(positions))
+    ax.set_xticklabels(x_labels, rotation=45, ha='right')
+    ax.set_title(spec.get('title', ''))
+    ax.set_ylabel(spec.get('ylabel', ''))
+    ax.grid(axis='y', alpha=0.3)
+    if len(spec['y']) > 1 or spec['kind'] == 'stacked_bar':
+        ax.legend()
+
+
+def _render_chart_sync(spec: dict, output_dir: str) -> ToolResponse:
+    try:
+        spec = _resolve_spec(spec)
+        if spec.get('data_handle'):
+            df = load_frame(resolve_handle(spec['data_handle']))
+        else:
+            df = DATA_LOADERS[spec['source']]()
+        df = _select_rows(df, spec)
+    except (LookupError, ValueError, TypeError, AttributeError) as e:
+        return ToolResponse(content=[TextBlock(type="text", text=f"图表生成失败: {e}")])
+
+    if df.empty:
+        return ToolResponse(content=[TextBlock(type="text", text="图表生成失败: 筛选条件下没有可用数据。")])
+
+    # 字段类型不对（如 y 不是列表、filename 不是字符串）时在作图阶段才暴露，同样作为图表描述错误返回
+    try:
+        filename = os.path.basename(spec.get('filename') or '') or f"chart_{spec.get('chart', spec['kind'])}_{shortuuid.uuid()[:8]}.png"
+        if not filename.lower().endswith('.png'):
+            filename += '.png'
+        file_path = os.path.join(output_dir, filename)
+        with _render_lock:
+            fig = _get_figure(spec['kind'])
+            _draw(fig, df, spec)
+            fig.savefig(file_path)
+    except (LookupError, ValueError, TypeError, AttributeError) as e:
+        return ToolResponse(content=[TextBlock(type="text", text=f"图表生成失败: {type(e).__name__}: {e}")])
+    schedule_sweep()
+
+    return ToolResponse(
+        content=[
+            TextBlock(
+                type="text",
+                text=f"已生成图表（{len(df)} 个数据点）。<saved_files>{os.path.abspath(file_path)}</saved_files>",
+            ),
+        ],
+    )
+
+
+async def render_chart(spec: str, output_dir: str | None = None) -> ToolResponse:
+    """
+    根据 JSON 图表描述直接读取用户的健康数据库并生成 PNG 图表，无需编写 Python 代码。
+    常用图表优先使用本工具，只有本工具无法满足时才编写作图代码。
+
+    Args:
+        spec (str):
+            JSON 格式的图表描述。可用字段：
+            chart: 预置图表，可选 "sleep_stages"（每晚睡眠分期堆叠柱状图）、"resting_hr"（静息心率趋势折线图）、"steps"（每日步数柱状图）或 "custom"；
+            last_n: 只绘制最近 N 条记录，默认 14；start / end: 日期范围（YYYY-MM-DD）；user_id: 只绘制指定用户；title: 图表标题；filename: 输出文件名；
+            chart 为 "custom" 时还需提供 source（"sleep" 或 "heart_rate"）、kind（"line"、"bar" 或 "stacked_bar"）、x（横轴列名）与 y（纵轴列名列表）；
+            data_handle: 查询工具返回的数据句柄，提供时用句柄中的数据代替 source 指定的数据表。
+            例如 {"chart": "sleep_stages", "last_n": 7}。
+        output_dir (str | None):
+            图表保存目录，已默认配置，调用工具时通常不需要提供。
+
+    Returns:
+        ToolResponse: 包含一个 TextBlock，给出数据点数量和以 <saved_files> 标记的图片绝对路径；出错时返回错误说明。
+    """
+    try:
+        parsed = json.loads(spec) if isinstance(spec, str) else dict(spec)
+    except (TypeError, ValueError) as e:
+        return ToolResponse(content=[TextBlock(type="text", text=f"图表描述不是合法的 JSON: {e}")])
+    if not isinstance(parsed, dict):
+        return ToolResponse(content=[TextBlock(type="text", text=f"图表描述不是合法的 JSON: 应为对象，实际为 {type(parsed).__name__}")])
+
+    out_dir = session_output_dir(output_dir or Config.get('OUTPUT_DIR') or os.path.abspath('./output'))
+    return await asyncio.to_thread(_render_chart_sync, parsed, out_dir)
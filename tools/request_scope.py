@@ -0,0 +1,127 @@
+"""请求作用域：客户端断开后，把取消传递到路由智能体、子智能体与工具。
+
+agentscope 的 ReActAgent 与 Toolkit 会捕获 `asyncio.CancelledError` 并把它变成“被用户中断”的普通回复，
+所以仅靠取消任务无法结束整条推理链：子智能体返回后，上层智能体还会继续发起下一轮模型调用。
+这里用 ContextVar 保存当前请求的作用域，取消后置位标记；模型调用与工具调用在开始前、工具返回后检查
+标记并重新抛出 CancelledError，直到整条链路退出。
+
+作用域还可以携带事件接收器（sink）：工具开始/结束、模型增量输出、生成的文件等通过 `emit()` 推送给
+HTTP 层，由它编码为 SSE / NDJSON 事件。
+
+智能体是进程级单例，记忆默认由所有请求共用；`isolated=True` 的作用域（批量问答）中，使用 `ScopedMemory`
+的智能体改为使用该作用域独立的记忆，并发的问题之间互不可见，也不会留在共用的对话记忆中。
+"""
+import asyncio
+import contextvars
+import threading
+from typing import Any, Awaitable, Callable
+
+from agentscope.memory import InMemoryMemory, MemoryBase
+
+
+class RequestScope:
+    __slots__ = ('cancelled', 'sink', 'loop', 'thread_id', 'memories')
+
+    def __init__(self, sink: Callable[[dict], None] | None = None, isolated: bool = False):
+        self.cancelled = False
+        self.sink = sink
+        self.memories = {} if isolated else None
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+
+
+_current_scope: contextvars.ContextVar[RequestScope | None] = contextvars.ContextVar('request_scope', default=None)
+
+
+def is_cancelled() -> bool:
+    scope = _current_scope.get()
+    return scope is not None and scope.cancelled
+
+
+def raise_if_cancelled() -> None:
+    """当前请求已被取消时抛出 CancelledError；不在请求作用域内时不做任何事。"""
+    if is_cancelled():
+        raise asyncio.CancelledError('request cancelled by client')
+
+
+def emit(event_type: str, **data) -> None:
+    """向当前请求的事件接收器推送一个事件；没有接收器或请求已取消时忽略。可在工作线程中调用。"""
+    scope = _current_scope.get()
+    if scope is None or scope.sink is None or scope.cancelled:
+        return
+    event = {'type': event_type, **data}
+    if threading.get_ident() == scope.thread_id:
+        scope.sink(event)
+    else:
+        scope.loop.call_soon_threadsafe(scope.sink, event)
+
+
+def _consume_result(task: asyncio.Task) -> None:
+    # 调用方已放弃等待，取走结果避免 "exception was never retrieved" 警告
+    if not task.cancelled():
+        task.exception()
+
+
+async def run_cancellable(awaitable: Awaitable[Any], sink: Callable[[dict], None] | None = None,
+                          isolated: bool = False) -> Any:
+    """在新的请求作用域中运行 awaitable（通常是一次智能体调用）。
+
+    调用方被取消（例如客户端断开）时立即置位作用域并取消内部任务，随后把 CancelledError 继续向上抛出，
+    不等待内部任务把中断处理完。`sink` 接收作用域内 `emit()` 推送的事件；`isolated=True` 时智能体使用
+    本作用域独立的记忆。
+    """
+    scope = RequestScope(sink, isolated)
+    token = _current_scope.set(scope)
+    try:
+        task = asyncio.ensure_future(awaitable)     # 任务复制当前上下文，内部的所有调用都能看到该作用域
+    finally:
+        _current_scope.reset(token)
+
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        scope.cancelled = True
+        task.cancel()
+        task.add_done_callback(_consume_result)
+        raise
+
+
+class ScopedMemory(MemoryBase):
+    """智能体记忆：普通请求共用同一份记忆，isolated 作用域内每个请求使用独立的记忆。"""
+
+    def __init__(self):
+        super().__init__()
+        self._shared = InMemoryMemory()
+
+    def _memory(self) -> InMemoryMemory:
+        scope = _current_scope.get()
+        if scope is None or scope.memories is None:
+            return self._shared
+        memory = scope.memories.get(id(self))
+        if memory is None:
+            memory = scope.memories[id(self)] = InMemoryMemory()
+        return memory
+
+    async def add(self, *args, **kwargs) -> None:
+        return await self._memory().add(*args, **kwargs)
+
+    async def delete(self, *args, **kwargs) -> int:
+        return await self._memory().delete(*args, **kwargs)
+
+    async def delete_by_mark(self, *args, **kwargs) -> int:
+        return await self._memory().delete_by_mark(*args, **kwargs)
+
+    async def size(self) -> int:
+        return await self._memory().size()
+
+    async def clear(self) -> None:
+        return await self._memory().clear()
+
+    async def get_memory(self, *args, **kwargs) -> list:
+        return await self._memory().get_memory(*args, **kwargs)
+
+    async def update_messages_mark(self, *args, **kwargs) -> int:
+        return await self._memory().update_messages_mark(*args, **kwargs)
+
+    async def update_compressed_summary(self, summary: str) -> None:
+        return await self._memory().update_compressed_summary(summary)
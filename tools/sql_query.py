@@ -0,0 +1,158 @@
+"""只读 SQL 查询工具：让查询智能体用一条 SELECT 完成筛选、聚合与跨表关联，而不是把整张表交给 LLM。
+
+执行前后的保护：
+    - 数据库以只读 URI 打开并设置 `PRAGMA query_only`；
+    - 授权回调只允许 SELECT、读取白名单中的表（`SQL_ALLOWED_TABLES`）和调用函数，PRAGMA、ATTACH、
+      写入以及读取 sqlite_master 等都会被拒绝；
+    - 只接受一条以 SELECT / WITH 开头的语句，外层自动包一层 LIMIT（`SQL_MAX_ROWS`）；
+    - 进度回调限制执行时间（`SQL_TIMEOUT` 秒），请求被取消时也会中断查询。
+"""
+import asyncio
+import os
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from agentscope.message import TextBlock
+from agentscope.tool import ToolResponse
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+from tools.data_handles import register_frame
+from tools.health_store import health_db_path
+from tools.parse_heart_rate_db import HEART_RATE_TABLE
+from tools.parse_sleep_db import SLEEP_TABLE
+from tools.request_scope import is_cancelled
+
+
+SQL_ALLOWED_TABLES = Config.get('SQL_ALLOWED_TABLES', [SLEEP_TABLE, HEART_RATE_TABLE])
+SQL_MAX_ROWS = Config.get('SQL_MAX_ROWS', 200)          # 自动追加的 LIMIT
+SQL_TIMEOUT = Config.get('SQL_TIMEOUT', 2.0)            # 单次查询的执行时间上限（秒）
+MAX_CELL_CHARS = 200
+
+_ALLOWED = {t.upper() for t in SQL_ALLOWED_TABLES}
+_LEADING = re.compile(r'^\s*(?:(?:--[^\n]*(?:\n|$)|/\*.*?\*/)\s*)*(select|with)\b', re.IGNORECASE | re.DOTALL)
+
+
+def _authorizer(action, arg1, arg2, db_name, trigger):
+    if action in (sqlite3.SQLITE_SELECT, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE):
+        return sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_READ:
+        # db_name 为 None 时读取的是 CTE，而不是数据库中的表
+        if db_name is None or (db_name == 'main' and (arg1 or '').upper() in _ALLOWED):
+            return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+
+def _validate(sql: str) -> str:
+    """返回去掉结尾分号的语句；不是单条 SELECT / WITH 查询时抛出 ValueError。"""
+    sql = sql.strip().rstrip(';').strip()
+    if not sql:
+        raise ValueError('查询语句为空')
+    if not _LEADING.match(sql):
+        raise ValueError('只允许 SELECT / WITH 查询')
+    if not sqlite3.complete_statement(sql + '\n;'):
+        raise ValueError('查询语句不完整')
+    return sql
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True, check_same_thread=False)
+    conn.execute('PRAGMA query_only = ON')
+    conn.set_authorizer(_authorizer)
+    return conn
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ''
+    text = str(value)
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS] + '…'
+
+
+def run_sql(sql: str, max_rows: int = SQL_MAX_ROWS, timeout: float = SQL_TIMEOUT) -> tuple[list[str], list[tuple], bool]:
+    """执行只读查询，返回 (列名, 行, 是否被截断)。
+
+    语句不合法时抛出 ValueError；数据库不存在时抛出 LookupError；超时、被拒绝或 SQL 错误时抛出 sqlite3.Error。
+    """
+    sql = _validate(sql)
+    db_path = health_db_path()
+    if not os.path.exists(db_path):
+        raise LookupError(f"数据库文件不存在: {db_path}")
+
+    deadline = time.monotonic() + timeout
+    conn = _connect(db_path)
+    try:
+        # 返回非 0 时 SQLite 中断当前语句（OperationalError: interrupted）
+        conn.set_progress_handler(lambda: time.monotonic() > deadline or is_cancelled(), 1000)
+        # 换行后再闭合括号，避免语句末尾的行注释吞掉外层查询
+        cursor = conn.execute(f'SELECT * FROM (\n{sql}\n) LIMIT ?', (max_rows + 1,))
+        columns = [d[0] for d in cursor.description]
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+    return columns, rows[:max_rows], len(rows) > max_rows
+
+
+def _error_text(e: sqlite3.Error) -> str:
+    message = str(e)
+    if 'interrupted' in message:
+        return f'查询超过 {SQL_TIMEOUT} 秒被中断，请缩小时间范围或简化查询。'
+    if 'not authorized' in message or 'prohibited' in message:
+        return f"查询被拒绝：只能读取 {', '.join(SQL_ALLOWED_TABLES)}，不允许 PRAGMA、ATTACH 或写入。"
+    return f'SQL 执行失败: {message}'
+
+
+def _sql_query_sync(sql: str) -> ToolResponse:
+    try:
+        columns, rows, truncated = run_sql(sql)
+    except (ValueError, LookupError) as e:
+        return ToolResponse(content=[TextBlock(type="text", text=f'查询未执行: {e}')])
+    except sqlite3.Error as e:
+        return ToolResponse(content=[TextBlock(type="text", text=_error_text(e))])
+
+    summary = f"查询返回 {len(rows)} 行" + (f"（已截断为前 {SQL_MAX_ROWS} 行，请增加筛选或聚合条件）" if truncated else '') + '。'
+    table = '\n'.join([' | '.join(columns), *(' | '.join(_cell(v) for v in row) for row in rows)])
+    blocks = [TextBlock(type="text", text=summary), TextBlock(type="text", text=table)]
+
+    if rows:
+        try:
+            import pandas as pd
+
+            handle = register_frame(pd.DataFrame(rows, columns=columns), 'sql')
+            blocks.append(
+                TextBlock(
+                    type="text",
+                    text=f"数据句柄: <data_handle>{handle}</data_handle>（作图时把该句柄传给 data_handles 参数，脚本中可直接使用同名 DataFrame 变量）",
+                )
+            )
+        except Exception:
+            pass
+    return ToolResponse(content=blocks)
+
+
+async def sql_query(sql: str) -> ToolResponse:
+    """
+    对用户健康数据库执行一条只读 SQLite 查询（SELECT / WITH），适合需要筛选、聚合或关联睡眠与日常数据的问题。
+    返回行数与执行时间有上限（超出时会提示），只能读取以下两张表：
+
+    XIAOMI_SLEEP_TIME_SAMPLE（每晚一条睡眠记录）: TIMESTAMP 入睡时间, WAKEUP_TIME 醒来时间,
+    TOTAL_DURATION / DEEP_SLEEP_DURATION / LIGHT_SLEEP_DURATION / REM_SLEEP_DURATION / AWAKE_DURATION 各时长（分钟）,
+    IS_AWAKE, DEVICE_ID, USER_ID。
+    XIAOMI_DAILY_SUMMARY_SAMPLE（每天一条汇总）: TIMESTAMP 日期, STEPS 步数, HR_RESTING 静息心率,
+    HR_MAX / HR_MIN / HR_AVG 心率, HR_MAX_TS / HR_MIN_TS 发生时间, STRESS_AVG, CALORIES, TIMEZONE, DEVICE_ID, USER_ID。
+
+    所有时间列都是毫秒时间戳，按日期比较或输出时用 date(TIMESTAMP / 1000, 'unixepoch', 'localtime')。
+    例：步数超过 1 万的次日夜间深睡不足 60 分钟：
+    SELECT date(s.TIMESTAMP/1000,'unixepoch','localtime') AS night, s.DEEP_SLEEP_DURATION, d.STEPS
+    FROM XIAOMI_SLEEP_TIME_SAMPLE s JOIN XIAOMI_DAILY_SUMMARY_SAMPLE d
+    ON date(d.TIMESTAMP/1000,'unixepoch','localtime') = date(s.TIMESTAMP/1000,'unixepoch','localtime','-1 day')
+    WHERE d.STEPS > 10000 AND s.DEEP_SLEEP_DURATION < 60
+
+    Args:
+        sql (str):
+            一条 SQLite SELECT 查询语句，只选择需要的列，尽量在 SQL 中完成筛选与聚合。
+    """
+    return await asyncio.to_thread(_sql_query_sync, sql)
@@ -0,0 +1,415 @@
+"""请求级追踪：记录路由/子智能体的 LLM 调用、各工具函数的耗时、token 数与载荷大小。
+
+- `span()`：上下文管理器，嵌套关系通过 ContextVar 传递（asyncio 任务与 `asyncio.to_thread` 会自动继承）。
+- `traced_tool()`：包装注册到 Toolkit 的工具函数（同步 / 异步均可），保留原函数签名与文档字符串；
+  请求已被取消时不再执行工具，并把被吞掉的取消重新抛出（见 `tools.request_scope`）。
+- 工具的开始/结束（含耗时）、工具结果中的输出文件、以及 `emit_deltas=True` 的模型的增量文本，
+  会作为事件推送给当前请求（`tools.request_scope.emit`），供 `/stream` 的 SSE / NDJSON 模式使用。
+- `TracedDashScopeChatModel`：DashScopeChatModel 的子类，流式与非流式调用都会记录首包耗时与 token 用量，
+  并受 `tools.limits` 中 llm 并发上限的约束。
+
+结束的 span 经后台线程写入 `TRACE_PATH`（JSON lines 或 OTLP/JSON 格式），同时在内存中按名称聚合，
+由 `/metrics` 路由输出汇总。
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from agentscope.model import DashScopeChatModel
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+from tools import limits
+from tools.request_scope import emit, raise_if_cancelled
+from tools.output_store import find_artifacts, media_type
+
+
+_ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+
+TRACE_ENABLED = Config.get('TRACE_ENABLED', True)
+TRACE_PATH = Config.get('TRACE_PATH') or os.path.join(_ROOT, 'data', 'traces', 'spans.jsonl')
+TRACE_FORMAT = Config.get('TRACE_FORMAT', 'jsonl')                   # jsonl / otlp
+TRACE_MAX_BYTES = Config.get('TRACE_MAX_BYTES', 20 * 1024 ** 2)      # 单个追踪文件大小上限，超过后滚动
+TRACE_WINDOW = Config.get('TRACE_WINDOW', 1000)                      # 每个 span 名称保留用于计算分位数的最近样本数
+SERVICE_NAME = 'health-agent'
+
+
+class Span:
+    __slots__ = ('name', 'kind', 'trace_id', 'span_id', 'parent_id', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, name: str, kind: str, parent: 'Span | None', attributes: dict):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.end = None
+        self.attributes = dict(attributes)
+        self.error = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.time()) - self.start) * 1000
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'start': self.start,
+            'duration_ms': round(self.duration_ms, 3),
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+    def to_otlp(self) -> dict:
+        """单个 span 的 OTLP/JSON（ExportTraceServiceRequest）表示。"""
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1,
+            'startTimeUnixNano': str(int(self.start * 1e9)),
+            'endTimeUnixNano': str(int((self.end or time.time()) * 1e9)),
+            'attributes': _otlp_attributes({'span.kind': self.kind, **self.attributes}),
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 1},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': _otlp_attributes({'service.name': SERVICE_NAME})},
+                'scopeSpans': [{'scope': {'name': 'tools.tracing'}, 'spans': [span]}],
+            }],
+        }
+
+
+def _otlp_attributes(attributes: dict) -> list[dict]:
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            v = {'boolValue': value}
+        elif isinstance(value, int):
+            v = {'intValue': str(value)}
+        elif isinstance(value, float):
+            v = {'doubleValue': value}
+        else:
+            v = {'stringValue': str(value)}
+        result.append({'key': key, 'value': v})
+    return result
+
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar('current_span', default=None)
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+# ---------------------------------------------------------------- 导出
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+def _get_exporter() -> logging.Logger:
+    """span 先放入内存队列，由 QueueListener 的后台线程写文件，调用方不做磁盘 IO。"""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            os.makedirs(os.path.dirname(TRACE_PATH), exist_ok=True)
+            handler = RotatingFileHandler(TRACE_PATH, maxBytes=TRACE_MAX_BYTES, backupCount=3, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            q = queue.SimpleQueue()
+            listener = QueueListener(q, handler)
+            listener.start()
+            logger = logging.getLogger('tracing')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(QueueHandler(q))
+            _exporter = logger
+    return _exporter
+
+
+# ---------------------------------------------------------------- 聚合
+
+class _Stats:
+    __slots__ = ('count', 'errors', 'total_ms', 'durations', 'input_tokens', 'output_tokens', 'ttft')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.durations = deque(maxlen=TRACE_WINDOW)
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.ttft = deque(maxlen=TRACE_WINDOW)
+
+
+_stats: dict[tuple[str, str], _Stats] = {}
+_stats_lock = threading.Lock()
+
+
+def _percentile(values, q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return round(ordered[idx], 2)
+
+
+def _record(span: Span) -> None:
+    with _stats_lock:
+        stats = _stats.get((span.kind, span.name))
+        if stats is None:
+            stats = _stats[(span.kind, span.name)] = _Stats()
+        stats.count += 1
+        stats.errors += span.error is not None
+        stats.total_ms += span.duration_ms
+        stats.durations.append(span.duration_ms)
+        stats.input_tokens += span.attributes.get('input_tokens', 0) or 0
+        stats.output_tokens += span.attributes.get('output_tokens', 0) or 0
+        if 'ttft_ms' in span.attributes:
+            stats.ttft.append(span.attributes['ttft_ms'])
+
+
+def metrics_summary() -> dict:
+    """按 (kind, name) 汇总调用次数、错误数、耗时分位数与 token 用量。"""
+    result = {}
+    with _stats_lock:
+        for (kind, name), s in sorted(_stats.items()):
+            entry = {
+                'count': s.count,
+                'errors': s.errors,
+                'mean_ms': round(s.total_ms / s.count, 2) if s.count else None,
+                'p50_ms': _percentile(s.durations, 0.5),
+                'p95_ms': _percentile(s.durations, 0.95),
+                'p99_ms': _percentile(s.durations, 0.99),
+                'max_ms': round(max(s.durations), 2) if s.durations else None,
+            }
+            if kind == 'llm':
+                entry.update(
+                    input_tokens=s.input_tokens,
+                    output_tokens=s.output_tokens,
+                    ttft_p50_ms=_percentile(s.ttft, 0.5),
+                    ttft_p95_ms=_percentile(s.ttft, 0.95),
+                )
+            result.setdefault(kind, {})[name] = entry
+    return result
+
+
+def reset_metrics() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+# ---------------------------------------------------------------- span API
+
+def start_span(name: str, kind: str = 'internal', **attributes) -> Span:
+    """创建 span 但不设为当前 span，用于跨越多次 yield 的流式调用，需配合 finish_span。"""
+    return Span(name, kind, _current_span.get(), attributes)
+
+
+# 收集当前上下文（含其中创建的任务与线程）结束的 span，批量问答据此统计各阶段耗时
+_collector: contextvars.ContextVar[list | None] = contextvars.ContextVar('span_collector', default=None)
+
+@contextmanager
+def collect_spans():
+    """`with collect_spans() as spans: ...`，块内开始的 span 结束时追加到 spans（不受 TRACE_ENABLED 影响）。"""
+    spans = []
+    token = _collector.set(spans)
+    try:
+        yield spans
+    finally:
+        _collector.reset(token)
+
+
+def finish_span(span: Span, error: BaseException | str | None = None) -> None:
+    span.end = time.time()
+    if error is not None:
+        span.error = error if isinstance(error, str) else f'{type(error).__name__}: {error}'
+    spans = _collector.get()
+    if spans is not None:
+        spans.append(span)
+    if not TRACE_ENABLED:
+        return
+    _record(span)
+    try:
+        payload = span.to_otlp() if TRACE_FORMAT == 'otlp' else span.to_dict()
+        _get_exporter().info(json.dumps(payload, ensure_ascii=False, default=str))
+    except Exception:
+        pass
+
+
+@contextmanager
+def span(name: str, kind: str = 'internal', **attributes):
+    """`with span('similarity_search', 'internal', k=4) as s: ...`，嵌套的 span 自动成为子 span。"""
+    s = start_span(name, kind, **attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        finish_span(s, e)
+        raise
+    else:
+        finish_span(s)
+    finally:
+        _current_span.reset(token)
+
+
+def _payload_size(value) -> int:
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str))
+    except Exception:
+        return len(str(value))
+
+
+def _response_text(res) -> str:
+    content = getattr(res, 'content', None)
+    if not content:
+        return ''
+    return ''.join(block.get('text', '') for block in content if isinstance(block, dict))
+
+
+def _response_size(res) -> int:
+    return len(_response_text(res))
+
+
+def _emit_tool_end(s: Span, res, error: BaseException | None = None) -> None:
+    emit('tool_end', id=s.span_id, name=s.name, kind=s.kind, duration_ms=round(s.duration_ms, 1),
+         error=f'{type(error).__name__}: {error}' if error is not None else None)
+    if res is not None:
+        for url in find_artifacts(_response_text(res)):
+            emit('artifact', url=url, media=media_type(url))
+
+
+def traced_tool(func=None, *, kind: str = 'tool'):
+    """包装工具函数：记录耗时、参数与返回内容大小。Toolkit 通过 __wrapped__ 读取原函数的签名与文档。
+
+    子智能体会把取消转成普通回复返回，因此工具返回后还要再检查一次请求是否已取消。
+    """
+    if func is None:
+        return functools.partial(traced_tool, kind=kind)
+
+    name = func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            raise_if_cancelled()
+            with span(name, kind, args_chars=_payload_size(kwargs)) as s:
+                emit('tool_start', id=s.span_id, name=name, kind=kind)
+                try:
+                    res = await func(*args, **kwargs)
+                except BaseException as e:
+                    _emit_tool_end(s, None, e)
+                    raise
+                raise_if_cancelled()
+                s.set(response_chars=_response_size(res))
+                _emit_tool_end(s, res)
+                return res
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        raise_if_cancelled()
+        with span(name, kind, args_chars=_payload_size(kwargs)) as s:
+            emit('tool_start', id=s.span_id, name=name, kind=kind)
+            try:
+                res = func(*args, **kwargs)
+            except BaseException as e:
+                _emit_tool_end(s, None, e)
+                raise
+            s.set(response_chars=_response_size(res))
+            _emit_tool_end(s, res)
+            return res
+    return wrapper
+
+
+class TracedDashScopeChatModel(DashScopeChatModel):
+    """记录每次模型调用的耗时、首包耗时（流式）、token 用量和请求/响应字符数。
+
+    调用前先获取 llm 并发槽位（等待时间记为 queue_ms，不计入 span 耗时），流式响应读完后才释放。
+    `emit_deltas=True` 时把流式响应的增量文本作为 delta 事件推送给当前请求（只用于路由智能体）。
+    `agent` 为所属智能体名称，记录在 span 上，便于区分各智能体的模型用量。
+    """
+
+    def __init__(self, *args, emit_deltas: bool = False, agent: str = '', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.emit_deltas = emit_deltas
+        self.agent = agent
+
+    async def __call__(self, messages, tools=None, tool_choice=None, structured_model=None, **kwargs):
+        # 请求已取消时不再发起新的模型调用，ReActAgent 会把它当作中断处理并结束推理循环
+        raise_if_cancelled()
+        queued = time.time()
+        await limits.acquire('llm')
+        s = start_span(self.model_name, 'llm', request_chars=_payload_size(messages), tools=len(tools or []),
+                       queue_ms=round((time.time() - queued) * 1000, 2), **({'agent': self.agent} if self.agent else {}))
+        try:
+            res = await super().__call__(messages, tools=tools, tool_choice=tool_choice,
+                                         structured_model=structured_model, **kwargs)
+        except BaseException as e:
+            limits.release('llm')
+            finish_span(s, e)
+            raise
+
+        if not inspect.isasyncgen(res):
+            limits.release('llm')
+            self._annotate(s, res)
+            finish_span(s)
+            return res
+        return self._trace_stream(s, res)
+
+    @staticmethod
+    def _annotate(s: Span, res) -> None:
+        usage = getattr(res, 'usage', None)
+        if usage is not None:
+            s.set(input_tokens=usage.input_tokens, output_tokens=usage.output_tokens)
+        s.set(
+            response_chars=_payload_size(getattr(res, 'content', '')),
+            tool_calls=sum(1 for b in (getattr(res, 'content', None) or []) if b.get('type') == 'tool_use'),
+        )
+
+    async def _trace_stream(self, s: Span, stream):
+        last = None
+        error = None
+        emitted = 0
+        try:
+            async for chunk in stream:
+                if last is None:
+                    s.set(ttft_ms=round((time.time() - s.start) * 1000, 2))
+                last = chunk
+                if self.emit_deltas:
+                    # 分片是累积结果，只推送新增的部分
+                    text = _response_text(chunk)
+                    if len(text) > emitted:
+                        emit('delta', text=text[emitted:])
+                        emitted = len(text)
+                yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            # 流式响应的每个分片都是累积结果，最后一个分片携带完整内容与用量
+            limits.release('llm')
+            if last is not None:
+                self._annotate(s, last)
+            finish_span(s, error)
@@ -0,0 +1,192 @@
+"""向量知识库的公共逻辑：睡眠/心率/文献知识库共用同一套文本切分参数、入库与检索流程。
+
+PDF 按页码与章节结构切分（`tools.pdf_chunker`），片段记录页码与章节，检索结果据此给出出处。
+
+检索中的阻塞操作（PDF 哈希与解析、Embedding 请求、Qdrant 读写）统一通过 `run_blocking`
+提交到一个有上限的专用线程池，不占用事件循环，也不挤占 `asyncio.to_thread` 的默认线程池。
+向量的读写经由 `tools.vector_store` 的后端完成（嵌入式 / Qdrant 服务）。
+"""
+import asyncio
+import contextvars
+import functools
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
+KNOWLEDGE_WORKERS = Config.get('KNOWLEDGE_WORKERS', 4)     # 知识库线程池大小
+
+
+def split_text(text: str, metadata: dict) -> list["Document"]:
+    """把一段长文本切分为若干 Document，并为每个片段附加同一份 metadata。"""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = splitter.create_documents([text])
+    for c in chunks:
+        c.metadata = {**(c.metadata or {}), **metadata}
+    return chunks
+
+
+# ---------------------------------------------------------------- 线程池
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=KNOWLEDGE_WORKERS, thread_name_prefix='knowledge')
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """在知识库线程池中执行阻塞函数；与 asyncio.to_thread 一样把当前上下文（追踪 span、请求作用域）带入线程。"""
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), call)
+
+
+# ---------------------------------------------------------------- Embedding
+
+_embeddings = None
+
+def get_embeddings():
+    """进程内共用的 DashScope Embedding 客户端。"""
+    global _embeddings
+    if _embeddings is None:
+        import dashscope
+        from langchain_dashscope import DashScopeEmbeddings
+
+        dashscope.api_key = Config['API_KEY']
+        _embeddings = DashScopeEmbeddings(model=Config['EMBEDDING_MODEL'])
+    return _embeddings
+
+
+# ---------------------------------------------------------------- PDF 知识库
+
+# {文件路径: (mtime_ns, size, sha256)}：文件未变化时不再重复读取计算哈希
+_hash_cache: dict[str, tuple[int, int, str]] = {}
+
+def _file_hash(path: str) -> str:
+    st = os.stat(path)
+    cached = _hash_cache.get(path)
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _hash_cache[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def load_index(index_file: str) -> set[str]:
+    if not os.path.exists(index_file):
+        return set()
+    with open(index_file, 'r', encoding='utf-8') as f:
+        return set(json.load(f))
+
+
+def save_index(index_file: str, indexed: set[str]) -> None:
+    """原子地写入索引文件：不持有入库锁的读取方不会读到写了一半的 JSON。"""
+    os.makedirs(os.path.dirname(index_file), exist_ok=True)
+    tmp = f'{index_file}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(sorted(indexed), f, ensure_ascii=False, indent=2)
+    os.replace(tmp, index_file)
+
+
+def _file_of(metadata: dict) -> str:
+    """片段所属的文件名；早期入库的片段只记录了 source 路径（可能是 Windows 路径）。"""
+    return metadata.get('file') or re.split(r'[\\/]', metadata.get('source', ''))[-1]
+
+
+def sync_pdf_collection(pdf_dir: str, vdbs_path: str, collection_name: str) -> int:
+    """把 pdf_dir 中尚未入库的 PDF 切分后写入集合，返回新入库的文件数。
+
+    索引记录“文件哈希:切分版本”：文件内容变化或 CHUNKER_VERSION 升级后重新切分入库，
+    新片段写入后再删除该文件旧版本的片段。
+    """
+    from langchain_core.documents import Document
+
+    from tools.pdf_chunker import CHUNKER_VERSION, chunk_pdfs
+    from tools.vector_store import get_source_store, ingest_lock
+
+    pdfs = [f for f in os.listdir(pdf_dir) if f.lower().endswith('.pdf')]
+    file_hashes = {fname: _file_hash(os.path.join(pdf_dir, fname)) for fname in pdfs}
+    file_keys = {fname: f'{h}:{CHUNKER_VERSION}' for fname, h in file_hashes.items()}
+    index_file = os.path.join(vdbs_path, 'indexed_files.json')
+
+    # 快速路径：没有新文件时不获取跨进程入库锁，检索之间互不等待
+    if set(file_keys.values()) <= load_index(index_file):
+        return 0
+
+    with ingest_lock(vdbs_path):
+        # 持有锁后重新读取索引，其他进程可能已完成入库
+        indexed = load_index(index_file)
+        new_files = [fname for fname, key in file_keys.items() if key not in indexed]
+        if not new_files:
+            return 0
+
+        docs = []
+        for fname, chunks in zip(new_files, chunk_pdfs([os.path.join(pdf_dir, f) for f in new_files])):
+            docs.extend(Document(page_content=text, metadata={**metadata, 'sha256': file_hashes[fname]})
+                        for text, metadata in chunks)
+
+        store = get_source_store(vdbs_path)
+        store.add_documents(collection_name, docs)
+        current = {fname: file_hashes[fname] for fname in new_files}
+        stale = store.delete_documents(collection_name, lambda m: _file_of(m) in current and (
+            m.get('sha256') != current[_file_of(m)] or m.get('chunker') != CHUNKER_VERSION))
+
+        # 更新 index file：去掉已删除片段对应的旧记录
+        indexed -= {f"{m['sha256']}:{m.get('chunker')}" for m in stale if m.get('sha256')}
+        indexed -= set(current.values())      # 早期版本只记录文件哈希
+        indexed.update(file_keys[f] for f in new_files)
+        save_index(index_file, indexed)
+        return len(new_files)
+
+
+def search_by_vector(vector: list[float], vdbs_path: str, collection_name: str, k: int = 4) -> list["Document"]:
+    """用已计算好的查询向量检索集合。"""
+    from tools.vector_store import get_vector_store
+
+    return [doc for doc, _ in get_vector_store(vdbs_path).search(collection_name, vector, k)]
+
+
+def format_knowledge(doc: "Document") -> str:
+    """检索结果的紧凑表示：出处（文件名与页码）、所属章节与正文，供智能体引用。"""
+    metadata = doc.metadata or {}
+    source = metadata.get('title') or os.path.splitext(_file_of(metadata))[0]
+    page, page_end = metadata.get('page'), metadata.get('page_end')
+    if page:
+        source += f' 第{page}页' if page_end in (None, page) else f' 第{page}-{page_end}页'
+    hit = {'source': source}
+    if metadata.get('section'):
+        hit['section'] = metadata['section']
+    hit['page_content'] = doc.page_content
+    return json.dumps(hit, ensure_ascii=False)
+
+
+async def search_pdf_knowledge(demands: str, pdf_dir: str, vdbs_path: str, collection_name: str, k: int = 4) -> list["Document"]:
+    """检查并入库新 PDF（VDBS_INGEST_ON_QUERY 关闭或后端只读时跳过）、计算查询向量、检索 top-k 片段，
+    每一步都在知识库线程池中执行。"""
+    from tools.vector_store import VDBS_INGEST_ON_QUERY, get_vector_store
+
+    if VDBS_INGEST_ON_QUERY and not get_vector_store(vdbs_path).read_only:
+        await run_blocking(sync_pdf_collection, pdf_dir, vdbs_path, collection_name)
+    vector = await run_blocking(get_embeddings().embed_query, demands)
+    return await run_blocking(search_by_vector, vector, vdbs_path, collection_name, k)
@@ -0,0 +1,306 @@
+"""向量库后端：统一知识库的检索与写入入口，支持单进程桌面版与多进程部署。
+
+- `embedded`（默认）：嵌入式 Qdrant（`VDBS_PATH`）。存储目录同一时间只能被一个客户端打开，
+  打开前先获取跨进程文件锁，多个工作进程会排队而不是报错；打开后保留 `VDBS_EMBEDDED_KEEP_OPEN`
+  秒，连续的检索不必每次重新加载集合，空闲后关闭并释放文件锁，让其他进程使用。
+- `server`：独立的 Qdrant 服务（`VDBS_URL`，可选 `VDBS_API_KEY`）。客户端在进程内共享，
+  各工作进程并发检索，吞吐随进程数增长。
+- `lite`：只读的量化内存映射索引（`tools.lite_index`），打开只需几毫秒、常驻内存小，多个进程可同时
+  检索，适合桌面版与边缘设备。索引由 `python tools/ingest.py --export-lite` 从嵌入式存储或
+  Qdrant 服务导出；知识库更新后重新导出，正在运行的进程在下一次检索时自动加载新索引。
+
+写入（PDF / 文献入库）统一经过 `ingest_lock()`：跨进程互斥，同一批文件只会被一个进程入库。
+可以用 `python tools/ingest.py` 在部署前离线入库，并设置 `VDBS_INGEST_ON_QUERY = False`
+让检索路径只读。
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+from config import Config
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+
+VDBS_URL = Config.get('VDBS_URL')
+VDBS_BACKEND = Config.get('VDBS_BACKEND') or ('server' if VDBS_URL else 'embedded')
+VDBS_LOCK_TIMEOUT = Config.get('VDBS_LOCK_TIMEOUT', 60)       # 等待跨进程文件锁的上限（秒）
+VDBS_INGEST_ON_QUERY = Config.get('VDBS_INGEST_ON_QUERY', True)  # 检索前是否检查并入库新 PDF
+VDBS_EMBEDDED_KEEP_OPEN = Config.get('VDBS_EMBEDDED_KEEP_OPEN', 2.0)  # 嵌入式存储空闲多久后关闭（秒）
+
+# 进程内的锁；跨进程部分由 portalocker 文件锁负责
+_ingest_lock = threading.Lock()
+
+
+def _new_file_lock(path: str):
+    import portalocker
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return portalocker.Lock(path, mode='a', timeout=VDBS_LOCK_TIMEOUT)
+
+
+@contextmanager
+def _file_lock(path: str):
+    with _new_file_lock(path):
+        yield
+
+
+@contextmanager
+def ingest_lock(vdbs_path: str | None = None):
+    """入库操作（读写索引文件并写入向量）的互斥锁，对同一主机上的所有进程生效。"""
+    vdbs_path = vdbs_path or Config['VDBS_PATH']
+    with _ingest_lock, _file_lock(os.path.join(vdbs_path, 'ingest.lock')):
+        yield
+
+
+class VectorStore:
+    """知识库集合的检索与写入；Document 的存储格式与 langchain_qdrant 一致。"""
+
+    backend = ''
+    read_only = False
+
+    @contextmanager
+    def client(self):
+        raise NotImplementedError
+
+    def collection_exists(self, collection_name: str) -> bool:
+        with self.client() as client:
+            return client.collection_exists(collection_name)
+
+    def search(self, collection_name: str, vector: list[float], k: int = 4) -> list[tuple["Document", float]]:
+        """用查询向量检索 top-k，返回 [(Document, 相似度), ...]；集合不存在时返回空列表。"""
+        from langchain_core.documents import Document
+
+        with self.client() as client:
+            if not client.collection_exists(collection_name):
+                return []
+            points = client.query_points(collection_name, query=vector, limit=k, with_payload=True).points
+        return [
+            (Document(page_content=p.payload.get('page_content', ''), metadata=p.payload.get('metadata') or {}), p.score)
+            for p in points
+        ]
+
+    def add_documents(self, collection_name: str, docs: list["Document"], batch_size: int = 10) -> None:
+        """计算 embedding 并写入文档（集合不存在时创建）；调用方应持有 ingest_lock。"""
+        import uuid
+
+        from qdrant_client.models import Distance, PointStruct, VectorParams
+
+        from tools.vdbs_utils import get_embeddings
+
+        if not docs:
+            return
+        # Embedding 请求在打开向量库之前完成，嵌入式模式下不会因此长时间占用存储目录
+        embeddings = get_embeddings()
+        vectors = []
+        for i in range(0, len(docs), batch_size):
+            vectors.extend(embeddings.embed_documents([d.page_content for d in docs[i:i + batch_size]]))
+
+        points = [
+            PointStruct(id=uuid.uuid4().hex, vector=v, payload={'page_content': d.page_content, 'metadata': d.metadata})
+            for d, v in zip(docs, vectors)
+        ]
+        with self.client() as client:
+            if not client.collection_exists(collection_name):
+                client.create_collection(
+                    collection_name, vectors_config=VectorParams(size=len(vectors[0]), distance=Distance.COSINE),
+                )
+            for i in range(0, len(points), 256):
+                client.upsert(collection_name, points=points[i:i + 256])
+
+    def delete_documents(self, collection_name: str, match) -> list[dict]:
+        """删除 metadata 满足 match(metadata) 的点，返回被删除点的 metadata；调用方应持有 ingest_lock。"""
+        from qdrant_client.models import PointIdsList
+
+        deleted, ids = [], []
+        with self.client() as client:
+            if not client.collection_exists(collection_name):
+                return []
+            offset = None
+            while True:
+                points, offset = client.scroll(collection_name, limit=256, offset=offset,
+                                               with_payload=True, with_vectors=False)
+                for p in points:
+                    metadata = (p.payload or {}).get('metadata') or {}
+                    if match(metadata):
+                        ids.append(p.id)
+                        deleted.append(metadata)
+                if offset is None:
+                    break
+            for i in range(0, len(ids), 256):
+                client.delete(collection_name, points_selector=PointIdsList(points=ids[i:i + 256]))
+        return deleted
+
+    def iter_points(self, collection_name: str, batch: int = 256):
+        """逐批导出集合中的点（含向量与 payload），用于迁移到其他后端或导出快照。"""
+        with self.client() as client:
+            offset = None
+            while True:
+                points, offset = client.scroll(collection_name, limit=batch, offset=offset,
+                                               with_payload=True, with_vectors=True)
+                yield from points
+                if offset is None:
+                    break
+
+
+class EmbeddedStore(VectorStore):
+    backend = 'embedded'
+
+    def __init__(self, path: str, keep_open: float = VDBS_EMBEDDED_KEEP_OPEN):
+        self.path = path
+        self.keep_open = keep_open
+        self._lock = threading.Lock()
+        self._file_lock = None
+        self._client = None
+        self._last_used = 0.0
+        self._closer = None
+
+    @contextmanager
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from qdrant_client import QdrantClient
+
+                os.makedirs(self.path, exist_ok=True)
+                self._file_lock = _new_file_lock(os.path.join(self.path, 'access.lock'))
+                self._file_lock.acquire()
+                try:
+                    self._client = QdrantClient(path=self.path)
+                except BaseException:
+                    self._file_lock.release()
+                    raise
+            try:
+                yield self._client
+            finally:
+                self._last_used = time.monotonic()
+                if self.keep_open <= 0:
+                    self._close()
+                elif self._closer is None:
+                    self._schedule_close(self.keep_open)
+
+    def _schedule_close(self, delay: float) -> None:
+        self._closer = threading.Timer(delay, self._close_if_idle)
+        self._closer.daemon = True
+        self._closer.start()
+
+    def _close_if_idle(self) -> None:
+        with self._lock:
+            self._closer = None
+            if self._client is None:
+                return
+            idle = time.monotonic() - self._last_used
+            if idle < self.keep_open:
+                self._schedule_close(self.keep_open - idle)
+            else:
+                self._close()
+
+    def _close(self) -> None:
+        try:
+            self._client.close()
+        finally:
+            self._client = None
+            self._file_lock.release()
+            self._file_lock = None
+
+
+class ServerStore(VectorStore):
+    backend = 'server'
+
+    def __init__(self, url: str, api_key: str | None = None):
+        from qdrant_client import QdrantClient
+
+        self.url = url
+        self._client = QdrantClient(url=url, api_key=api_key, timeout=Config.get('VDBS_TIMEOUT', 10))
+
+    @contextmanager
+    def client(self):
+        # 远程客户端线程安全，检索无需加锁
+        yield self._client
+
+
+class LiteStore(VectorStore):
+    backend = 'lite'
+    read_only = True
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._indexes = {}
+
+    def _index(self, collection_name: str):
+        """返回集合的索引；导出目录被替换（meta.json 修改时间变化）后重新打开。"""
+        from tools.lite_index import LiteIndex, collection_dir
+
+        directory = collection_dir(collection_name, self.root)
+        try:
+            mtime = os.path.getmtime(os.path.join(directory, 'meta.json'))
+        except OSError:
+            return None
+        with self._lock:
+            index = self._indexes.get(collection_name)
+            if index is None or index.mtime != mtime:
+                # 旧索引不主动关闭：其他线程可能仍在使用，引用释放后映射随之回收
+                index = self._indexes[collection_name] = LiteIndex(directory)
+        return index
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return self._index(collection_name) is not None
+
+    def search(self, collection_name: str, vector: list[float], k: int = 4) -> list[tuple["Document", float]]:
+        from langchain_core.documents import Document
+
+        index = self._index(collection_name)
+        if index is None:
+            return []
+        results = []
+        for row, score in index.search(vector, k):
+            payload = index.payload(row)
+            results.append((Document(page_content=payload.get('page_content', ''),
+                                     metadata=payload.get('metadata') or {}), score))
+        return results
+
+    def add_documents(self, collection_name: str, docs: list["Document"], batch_size: int = 10) -> None:
+        raise RuntimeError('lite 后端只读：请在嵌入式存储或 Qdrant 服务上入库后运行 tools/ingest.py --export-lite')
+
+    def delete_documents(self, collection_name: str, match) -> list[dict]:
+        raise RuntimeError('lite 后端只读')
+
+    def iter_points(self, collection_name: str, batch: int = 256):
+        raise RuntimeError('lite 后端不支持导出点')
+
+
+_stores: dict[str, VectorStore] = {}
+_stores_lock = threading.Lock()
+
+def get_vector_store(vdbs_path: str | None = None, backend: str | None = None) -> VectorStore:
+    """返回进程内共享的向量库后端（默认按 VDBS_BACKEND）；embedded / lite 模式按存储目录区分。"""
+    backend = backend or VDBS_BACKEND
+    vdbs_path = os.path.abspath(vdbs_path or Config['VDBS_PATH'])
+    key = backend if backend == 'server' else f'{backend}:{vdbs_path}'
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            if backend == 'server':
+                store = ServerStore(VDBS_URL, Config.get('VDBS_API_KEY'))
+            elif backend == 'embedded':
+                store = EmbeddedStore(vdbs_path)
+            elif backend == 'lite':
+                from tools.lite_index import index_root
+
+                store = LiteStore(index_root(vdbs_path))
+            else:
+                raise ValueError(f'unknown VDBS_BACKEND: {backend!r}')
+            _stores[key] = store
+    return store
+
+
+def get_source_store(vdbs_path: str | None = None) -> VectorStore:
+    """可写入的后端：lite 模式下为导出索引所用的来源（配置了 VDBS_URL 时为 Qdrant 服务，否则为嵌入式存储）。"""
+    if VDBS_BACKEND != 'lite':
+        return get_vector_store(vdbs_path)
+    return get_vector_store(vdbs_path, 'server' if VDBS_URL else 'embedded')